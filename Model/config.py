@@ -10,13 +10,47 @@ DB_PATH = os.path.join(BASE_DIR, "db", "anpr.db")
 # YOLO model weights (after training)
 MODEL_PATH = os.path.join(BASE_DIR, "models", "yolov8n-plates.pt")
 
+# Exported detector (scripts/export_detector.py) and how to run it.
+# DETECTOR_BACKEND: "ultralytics" (.pt, needs torch), "onnxruntime" or "openvino"
+DETECTOR_BACKEND = "ultralytics"
+ONNX_MODEL_PATH = os.path.join(BASE_DIR, "models", "yolov8n-plates.onnx")
+ONNX_INT8_MODEL_PATH = os.path.join(BASE_DIR, "models", "yolov8n-plates-int8.onnx")
+OPENVINO_MODEL_PATH = os.path.join(BASE_DIR, "models", "yolov8n-plates_openvino_model", "yolov8n-plates.xml")
+ONNX_PROVIDERS = ("CPUExecutionProvider",)   # or ("OpenVINOExecutionProvider", "CPUExecutionProvider")
+DETECTOR_THREADS = 0                         # Inference threads (0 = runtime default)
+DETECT_IMGSZ = 640
+
 # Dataset config for training
 DATA_YAML = os.path.join(BASE_DIR, "datasets", "plates", "data.yaml")
 
+# Detector training (scripts/train_detector.py)
+TRAIN_BASE_WEIGHTS = "yolov8n.pt"   # COCO start point when MODEL_PATH does not exist yet
+TRAIN_RUNS_DIR = os.path.join(BASE_DIR, "runs", "detect")
+TRAIN_RUN_NAME = "anpr-plates"
+TRAIN_EPOCHS = 100
+TRAIN_PATIENCE = 15     # Early stop after this many epochs without val improvement
+TRAIN_BATCH = 16
+TRAIN_CACHE = "ram"     # Decoded images kept between epochs: "ram", "disk" (.npy) or "none"
+TRAIN_WORKERS = 4       # Dataloader processes
+TRAIN_DEVICE = "cpu"    # or "0" for the first CUDA GPU
+
+# Dataset preparation (scripts/prepare_dataset.py): validates labels, drops
+# duplicate images and writes train/val/test.txt + data.yaml in DATASET_DIR
+DATASET_DIR = os.path.dirname(DATA_YAML)
+DATASET_CLASSES = ("plate",)
+DATASET_SPLIT = (0.7, 0.2, 0.1)     # train / val / test
+DATASET_SEED = 0                    # Same seed -> same split, even as images are added
+DATASET_DUP_MAX_DISTANCE = 2        # dHash bits two images may differ by and still be duplicates
+DATASET_WORKERS = 0                 # Scan processes (0 = one per CPU core)
+DATASET_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
 # Snapshots directory (vehicle snapshot at detection time)
 SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
 os.makedirs(SNAPSHOT_DIR, exist_ok=True)
 
+# JSON results of scripts/bench_anpr.py
+BENCH_DIR = os.path.join(BASE_DIR, "bench_results")
+
 # Detection / OCR thresholds
 DETECTION_CONFIDENCE = 0.25      # was 0.5
 IOU_THRESHOLD = 0.4              # was 0.5
@@ -25,14 +59,120 @@ OCR_CONFIDENCE_THRESHOLD = 0.4   # was 0.5
                   # was 5 (process more frames)
   # Min avg OCR confidence
 
+# Plate OCR for YOLO crops: "easyocr" (general scene text) or "crnn" (compact
+# A-Z0-9 recognizer trained by scripts/train_ocr.py, run on ONNX Runtime).
+OCR_BACKEND = "easyocr"
+CRNN_MODEL_PATH = os.path.join(BASE_DIR, "models", "plate-crnn.onnx")
+CRNN_DATA_DIR = os.path.join(BASE_DIR, "datasets", "plate_text")  # crops + labels.csv
+CRNN_IMG_HEIGHT = 32
+CRNN_IMG_WIDTH = 160
+# Whole-ROI OCR when YOLO finds no plate. It needs EasyOCR's text detector,
+# so turn it off to run without EasyOCR/torch on the crnn backend.
+OCR_ROI_FALLBACK = True
+OCR_ROI_FALLBACK_INTERVAL = 5.0   # Per camera: at most one whole-ROI OCR per this many seconds
+
 # Frame handling
 FRAME_SKIP = 3        # Process every Nth frame to save compute
 COOLDOWN_SECONDS = 20   # Ignore re-detections of same plate within this time
 
+# Motion gate (replaces FRAME_SKIP in the pipeline): skip detection on an empty
+# gate scene, process every frame while something moves in the ROI.
+# A camera can opt out with "motion": False and keep its fixed frame_skip.
+MOTION_GATE = True
+MOTION_WIDTH = 160              # ROI is shrunk to this width before differencing
+MOTION_PIXEL_THRESHOLD = 25     # Gray-level change that counts as a changed pixel
+MOTION_MIN_AREA = 0.01          # Fraction of changed pixels that means activity
+MOTION_BG_ALPHA = 0.05          # Background learning rate (stopped cars fade in)
+MOTION_HOLD_SEC = 1.0           # Keep processing this long after motion stops
+MOTION_IDLE_SKIP = 15           # Idle: one heartbeat frame every N frames
+MOTION_ACTIVE_SKIP = 1          # Active: process every Nth frame
+
+# Pipeline (capture -> detect -> OCR pool -> persist), joined by bounded queues
+PIPELINE_QUEUE_SIZE = 8             # Max items waiting between two stages
+PIPELINE_DROP_POLICY = "drop_oldest"  # block, drop_oldest, drop_newest (live cameras)
+OCR_WORKERS = 2                     # OCR threads (EasyOCR releases the GIL in torch)
+STATS_INTERVAL = 10                 # Seconds between stage stats reports (0 = off)
+
+# Logging and metrics for run_anpr / anpr_daemon / run_realtime
+LOG_LEVEL = "INFO"                  # DEBUG = per-frame/per-track detail; WARNING for production
+METRICS_HOST = "127.0.0.1"          # /metrics is local only unless this is changed
+METRICS_PORT = 9108                 # Prometheus text endpoint (0 = off)
+
+# Micro-batched YOLO inference (ROIs from several frames / cameras per predict call)
+DETECT_BATCH_SIZE = 4               # Max ROIs per model.predict call (1 = no batching)
+DETECT_BATCH_MAX_WAIT_MS = 15       # Max time the first ROI waits for a batch to fill
+DETECT_TIMEOUT_SEC = 30.0           # A detect worker gives up on a ROI after this (model hung)
+
+# Plate tracking: link boxes across frames, OCR a few best crops, one event per vehicle
+TRACK_IOU_THRESHOLD = 0.3       # Min IoU to continue a track
+TRACK_MAX_CENTROID_DIST = 1.0   # Else max centroid jump, in plate diagonals
+TRACK_MAX_AGE = 1.0             # Seconds unseen before a track ends
+TRACK_MAX_DURATION = 3.0        # Decide anyway after this long (vehicle waiting at gate)
+TRACK_MIN_HITS = 2              # Ignore one-frame flickers
+TRACK_OCR_TOP_K = 3             # Crops per track sent to OCR
+QUALITY_MIN_SCORE = 0.35        # Crops scoring below this (scripts/quality.py) are never OCR'd
+
+# Correction registry: plates from the vehicles table, refreshed when it changes.
+# Visitors are excluded so past misreads never become correction targets.
+REGISTRY_STATUSES = ("allowed", "blacklisted")
+REGISTRY_POLL_SEC = 2.0   # How often to check PRAGMA data_version
+STATUS_CACHE_FLUSH_SEC = 1.0   # Write-behind interval for newly seen visitors
+
+# Persistence: logs + snapshots are written by a background thread in batches
+SQLITE_SYNCHRONOUS = "NORMAL"   # With WAL: no fsync per commit, still crash-safe
+LOG_BATCH_SIZE = 50             # Rows per transaction
+LOG_FLUSH_SEC = 1.0             # Max delay before a partial batch is written
+LOG_QUEUE_SIZE = 1000           # Pending rows before log() blocks
+
+# Retention (scripts/retention.py): logs rows and snapshots older than this are deleted
+RETENTION_DAYS = 90             # ~3 months
+RETENTION_CHUNK_ROWS = 500      # Rows deleted per transaction (keeps write locks short)
+RETENTION_CHUNK_PAUSE = 0.05    # Seconds between chunks so the live writer gets in
+RETENTION_VACUUM_PAGES = 1000   # Pages released per incremental_vacuum step
+RETENTION_INTERVAL_SEC = 6 * 3600   # --loop: time between runs
+
 # Camera info: we don't infer direction; you set it per camera
 CAMERA_ID = "gate_cam_1"
 CAMERA_MODE = "entry"   # or "exit"
 
+# Camera list for the multi-camera daemon (scripts/anpr_daemon.py).
+# roi is (top, bottom, left, right) as fractions of the frame.
+# Override with --cameras cameras.json (a JSON list of the same dicts).
+CAMERAS = [
+    {
+        "id": CAMERA_ID,
+        "source": "0",
+        "direction": CAMERA_MODE,
+        "roi": (0.40, 0.95, 0.25, 0.75),
+        "frame_skip": FRAME_SKIP,
+    },
+]
+CAMERA_QUEUE_SIZE = 4   # Per-camera frames waiting for the shared detector
+
+# Live sources (camera index, rtsp://, http://, /dev/video*) are decoded on
+# their own thread (scripts/capture.py) so processing always gets fresh frames
+LIVE_BUFFER_SIZE = 1        # Newest frames kept per camera (1 = only the latest)
+RECONNECT_MIN_SEC = 1.0     # Backoff between reconnect attempts, doubling up to
+RECONNECT_MAX_SEC = 30.0    # this when a stream stays down
+CAPTURE_TIMEOUT_SEC = 10.0  # Open/read timeout for network streams
+
+# Decoding: "opencv" (cv2.VideoCapture) or "pyav" (FFmpeg via PyAV, can
+# convert straight to a smaller BGR frame). Hardware decode is used by
+# OpenCV when the build and GPU support it, otherwise it silently stays on CPU.
+VIDEO_DECODER = "opencv"
+VIDEO_HW_ACCEL = True
+# Camera low-res substream (e.g. rtsp://.../stream2) for the motion gate;
+# the main stream is then only converted to BGR for frames that get detected
+CAMERA_SUBSTREAM = None
+MOTION_DECODE_WIDTH = 640   # pyav: substream frames are converted at this width
+
+# Offline bulk processing of recordings (scripts/bulk_anpr.py)
+BULK_SEGMENT_SEC = 300      # A worker process takes one segment of this length at a time
+BULK_OVERLAP_SEC = 10       # Segments overlap so a vehicle on a boundary is seen whole once
+BULK_WORKERS = 0            # Worker processes (0 = one per CPU core)
+BULK_WORKER_THREADS = 1     # Inference/OpenCV threads per worker (more workers scale better)
+BULK_VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".ts", ".m4v")
+
 # For demo: hardware hooks (you will replace with GPIO / relay code)
 def trigger_gate_open(plate):
     print(f"[GATE] OPEN for {plate}")
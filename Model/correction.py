@@ -1,9 +1,53 @@
 # correction.py
 
 import re
-from difflib import SequenceMatcher
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
 from known_plates import KNOWN_PLATES
 
+# Characters OCR commonly mixes up on plates. Substituting inside a group
+# costs half an edit; distances are kept as integers in half-edits.
+CONFUSION_GROUPS = ["0ODQU", "1IJLT7", "2Z", "5S", "6G", "8B", "4A", "MN", "UV", "VY"]
+EDIT_COST = 2
+CONFUSION_COST = 1
+
+# Distance thresholds in half-edits (see correct_plate)
+MAX_DISTANCE = 4                # any registry plate: two wrong characters (or four confusions)
+WINDOW_BONUS = 2                # plates expected at this time count one edit closer
+WINDOW_MAX_DISTANCE = 6         # and are accepted with up to three wrong characters
+
+# Time windows are bucketed by this many seconds for O(1) lookups
+WINDOW_BUCKET_SEC = 60
+
+# n-gram index: how many top candidates seed the nearest-plate bound, and
+# grams shared by more than this fraction of the registry are not counted
+NGRAM_CANDIDATES = 32
+NGRAM_MAX_SHARE = 0.2
+
+_CONFUSABLE = set()
+_CANONICAL = {}
+_SUB_COST = defaultdict(dict)  # char -> {confusable char: CONFUSION_COST}
+_NO_CONFUSION = {}
+_classes = []
+for _group in CONFUSION_GROUPS:
+    for _a in _group:
+        for _b in _group:
+            if _a != _b:
+                _CONFUSABLE.add((_a, _b))
+                _SUB_COST[_a][_b] = CONFUSION_COST
+    # Overlapping groups (0ODQU, UV, VY) share one canonical character, so
+    # a confusable pair always canonicalises to the same character
+    _merged = set(_group)
+    for _cls in [c for c in _classes if c & _merged]:
+        _merged |= _cls
+        _classes.remove(_cls)
+    _classes.append(_merged)
+for _cls in _classes:
+    _root = min(_cls)
+    for _a in _cls:
+        _CANONICAL[_a] = _root
+
 
 def time_to_seconds(t: str) -> int:
     """Convert 'HH:MM:SS' to total seconds."""
@@ -18,9 +62,329 @@ def is_in_window(current_sec: float, t_start: str, t_end: str) -> bool:
     return ts <= current_sec <= te
 
 
-def similarity(a: str, b: str) -> float:
-    """Simple string similarity."""
-    return SequenceMatcher(None, a, b).ratio()
+def plate_distance(a: str, b: str, limit: int | None = None) -> int:
+    """
+    OCR-confusion-aware edit distance in half-edits: insert/delete and
+    ordinary substitutions cost EDIT_COST, confusable pairs CONFUSION_COST.
+    With limit, only a diagonal band is computed and limit + 1 is returned
+    as soon as the distance must exceed it.
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if limit is not None and abs(la - lb) * EDIT_COST > limit:
+        return limit + 1
+    if not la or not lb:
+        return max(la, lb) * EDIT_COST
+
+    # Cells more than `band` off the diagonal already cost more than limit
+    band = max(la, lb) if limit is None else limit // EDIT_COST
+    big = (la + lb) * EDIT_COST + 1
+    prev = [j * EDIT_COST if j <= band else big for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        ca = a[i - 1]
+        sub_row = _SUB_COST.get(ca, _NO_CONFUSION)
+        lo = max(1, i - band)
+        hi = min(lb, i + band)
+        cur = [big] * (lb + 1)
+        if i <= band:
+            cur[0] = i * EDIT_COST
+        for j in range(lo, hi + 1):
+            cb = b[j - 1]
+            v = prev[j - 1] + (0 if ca == cb else sub_row.get(cb, EDIT_COST))
+            t = prev[j] + EDIT_COST
+            if t < v:
+                v = t
+            t = cur[j - 1] + EDIT_COST
+            if t < v:
+                v = t
+            cur[j] = v
+        if limit is not None and min(cur[lo - 1:hi + 1]) > limit:
+            return limit + 1
+        prev = cur
+
+    d = prev[lb]
+    if limit is not None and d > limit:
+        return limit + 1
+    return d
+
+
+def aligned_distance(a: str, b: str) -> int:
+    """
+    Position-by-position cost for equal-length strings. It is an upper bound
+    on plate_distance, cheap enough to order candidates and seed the limit.
+    """
+    cost = 0
+    for ca, cb in zip(a, b):
+        if ca != cb:
+            cost += CONFUSION_COST if (ca, cb) in _CONFUSABLE else EDIT_COST
+    return cost
+
+
+def canonical(plate: str) -> str:
+    """plate with every confusable character replaced by its group's canonical one."""
+    return "".join(_CANONICAL.get(ch, ch) for ch in plate)
+
+
+def plate_grams(plate: str):
+    """Positional bigrams over confusion-canonical characters."""
+    t = canonical(plate)
+    return [(i, t[i:i + 2]) for i in range(len(t) - 1)]
+
+
+def count_bound(a: str, b: str) -> int:
+    """
+    Lower bound on plate_distance for canonical strings a and b: a full edit
+    adds or removes at most one character of each one's character counts, a
+    confusion none. Much cheaper than the distance itself.
+    """
+    rest = list(b)
+    missing = 0
+    for ch in a:
+        try:
+            rest.remove(ch)
+        except ValueError:
+            missing += 1
+    return max(missing, len(rest)) * EDIT_COST
+
+
+class NgramIndex:
+    """Inverted index of positional bigrams, used to find likely neighbours fast."""
+
+    def __init__(self):
+        self.postings = defaultdict(list)  # (pos, gram) -> [plate]
+        self.canonical = {}  # plate -> canonical(plate)
+        self.size = 0
+
+    def add(self, plate):
+        self.size += 1
+        self.canonical[plate] = canonical(plate)
+        for g in plate_grams(plate):
+            self.postings[g].append(plate)
+
+    def remove(self, plate):
+        self.size -= 1
+        del self.canonical[plate]
+        for g in plate_grams(plate):
+            plates = self.postings.get(g)
+            if plates and plate in plates:
+                plates.remove(plate)
+                if not plates:
+                    del self.postings[g]
+
+    def candidates(self, query, limit):
+        """
+        Plates sharing the most bigrams with query, best first. Each query
+        bigram also matches one position either side, so a dropped or extra
+        character does not hide the right plate.
+        """
+        max_share = max(1, int(self.size * NGRAM_MAX_SHARE))
+        lists = []
+        for pos, gram in plate_grams(query):
+            for shift in (0, -1, 1):
+                plates = self.postings.get((pos + shift, gram))
+                if plates and len(plates) <= max_share:
+                    lists.append(plates)
+        if not lists:
+            return []
+        counts = Counter(chain.from_iterable(lists))
+        return [p for p, _ in counts.most_common(limit)]
+
+    def within(self, query, distance):
+        """
+        Every plate that can be within distance (half-edits) of query, or
+        None when the bigram count cannot rule any plate out.
+
+        A full edit changes at most two positional bigrams and a confusion
+        none (confusable characters share a canonical form), so such a plate
+        shares at least len(query) - 1 - distance of query's bigrams, each
+        moved by at most distance // EDIT_COST inserts/deletes. Bigrams too
+        common to count lower that bound instead.
+        """
+        max_share = max(1, int(self.size * NGRAM_MAX_SHARE))
+        shift = distance // EDIT_COST
+        grams = plate_grams(query)
+        need = len(grams) - distance
+        lists = []
+        for pos, gram in grams:
+            plates = [self.postings.get((pos + s, gram), ()) for s in range(-shift, shift + 1)]
+            if any(len(p) > max_share for p in plates):
+                need -= 1
+                continue
+            lists.extend(plates)
+        if need <= 0:
+            return None
+        # A plate can be counted twice for one query bigram; that only adds candidates
+        counts = Counter(chain.from_iterable(lists))
+        return [p for p, c in counts.items() if c >= need]
+
+
+class PlateMatcher:
+    """
+    Registry plates indexed once for fast correction:
+      - an n-gram index over confusion-canonical bigrams: the likely
+        neighbours bound the nearest distance, then every plate that shares
+        enough bigrams to be that close gets an exact plate_distance,
+      - time windows bucketed by WINDOW_BUCKET_SEC for the time-aware bias.
+    Small registries (<= NGRAM_CANDIDATES plates) are simply scanned.
+
+    Plates can be added/removed later (see registry.py); a lock keeps those
+    updates from racing with match(). Plates given at construction (with
+    their time windows) are pinned and never removed.
+    """
+
+    def __init__(self, known_plates):
+        self.grams = NgramIndex()
+        self.plates = {}  # plate -> registry order (first occurrence)
+        self.pinned = set()
+        self.windows = defaultdict(list)  # bucket -> [(start, end, order, plate)]
+        self._lock = threading.Lock()
+
+        for order, kp in enumerate(known_plates):
+            plate = kp["plate"]
+            self.pinned.add(plate)
+            if plate not in self.plates:
+                self.plates[plate] = order
+                self.grams.add(plate)
+
+            if kp.get("t_start") and kp.get("t_end"):
+                ts = time_to_seconds(kp["t_start"])
+                te = time_to_seconds(kp["t_end"])
+                for bucket in range(ts // WINDOW_BUCKET_SEC, te // WINDOW_BUCKET_SEC + 1):
+                    self.windows[bucket].append((ts, te, order, plate))
+        self._next_order = len(known_plates)
+
+    def add_plate(self, plate):
+        with self._lock:
+            if plate in self.plates:
+                return False
+            self.plates[plate] = self._next_order
+            self._next_order += 1
+            self.grams.add(plate)
+            return True
+
+    def remove_plate(self, plate):
+        with self._lock:
+            if plate in self.pinned or plate not in self.plates:
+                return False
+            del self.plates[plate]
+            self.grams.remove(plate)
+            return True
+
+    def registry_plates(self):
+        """Plates that came from add_plate (i.e. not pinned)."""
+        with self._lock:
+            return set(self.plates) - self.pinned
+
+    def nearest(self, cleaned, max_distance=None):
+        """
+        Closest registry plate by plate_distance (ties: registry order), or
+        None if none is within max_distance. Same result as a linear scan.
+        """
+        if cleaned in self.plates:
+            return cleaned
+        if len(self.plates) <= NGRAM_CANDIDATES:
+            return self._closest(cleaned, self.plates, max_distance)[0]
+
+        # Without max_distance, the best of the likely neighbours bounds the
+        # answer's distance; only plates sharing enough bigrams can be that close
+        limit = max_distance
+        if limit is None:
+            _, best_key = self._closest(cleaned, self.grams.candidates(cleaned, NGRAM_CANDIDATES))
+            if best_key is not None:
+                limit = best_key[0]
+        candidates = None if limit is None else self.grams.within(cleaned, limit)
+        if candidates is None:
+            candidates = self.plates
+        return self._closest(cleaned, candidates, limit)[0]
+
+    def _closest(self, cleaned, candidates, max_distance=None):
+        """(plate, (distance, order)) of the closest candidate within max_distance, or (None, None)."""
+        # Try the best-aligned candidates first so the early-exit limit is
+        # tight and most other distances stop after a few rows
+        n = len(cleaned)
+        query = canonical(cleaned)
+        canon = self.grams.canonical
+        ranked = []
+        for cand in candidates:
+            if len(cand) == n:
+                bound = aligned_distance(cleaned, cand)
+            else:
+                bound = max(n, len(cand)) * EDIT_COST
+            ranked.append((bound, self.plates[cand], cand))
+        ranked.sort()
+
+        best = None
+        best_key = None
+        for bound, order, cand in ranked:
+            # bound is an upper bound for this candidate, so it is a safe limit
+            limit = min(best_key[0], bound) if best_key else bound
+            if max_distance is not None and max_distance < limit:
+                limit = max_distance
+            if count_bound(query, canon[cand]) > limit:
+                continue
+            d = plate_distance(cleaned, cand, limit)
+            if d > limit:
+                continue
+            key = (d, order)
+            if best_key is None or key < best_key:
+                best, best_key = cand, key
+        return best, best_key
+
+    def plates_in_window(self, current_sec):
+        """Plates whose window contains current_sec, in registry order."""
+        hits = [(order, plate)
+                for ts, te, order, plate in self.windows.get(int(current_sec) // WINDOW_BUCKET_SEC, ())
+                if ts <= current_sec <= te]
+        hits.sort()
+        return [plate for _, plate in hits]
+
+    def match(self, cleaned, current_sec):
+        """Best registry plate for a cleaned OCR string at current_sec, or None."""
+        with self._lock:
+            return self._match(cleaned, current_sec)
+
+    def _match(self, cleaned, current_sec):
+        in_window = self.plates_in_window(current_sec)
+        window_set = set(in_window)
+
+        # 1) Nearest plate overall within MAX_DISTANCE. Only it can beat the
+        #    window plates without the bonus, so one search is enough.
+        best = self.nearest(cleaned, MAX_DISTANCE)
+        best_key = None
+        if best is not None:
+            d = plate_distance(cleaned, best)
+            if best in window_set:
+                d -= WINDOW_BONUS
+            best_key = (d, self.plates[best])
+
+        # 2) If we are in the time window where a plate is known to appear,
+        #    it counts WINDOW_BONUS closer and may be up to WINDOW_MAX_DISTANCE away
+        for plate in window_set:
+            d = plate_distance(cleaned, plate, WINDOW_MAX_DISTANCE)
+            if d > WINDOW_MAX_DISTANCE:
+                continue
+            key = (d - WINDOW_BONUS, self.plates[plate])
+            if best_key is None or key < best_key:
+                best, best_key = plate, key
+
+        return best
+
+
+_matcher = None
+
+
+def get_matcher() -> PlateMatcher:
+    global _matcher
+    if _matcher is None:
+        _matcher = PlateMatcher(KNOWN_PLATES)
+    return _matcher
+
+
+def set_matcher(matcher: PlateMatcher):
+    """Install a matcher (e.g. one backed by the vehicles table)."""
+    global _matcher
+    _matcher = matcher
 
 
 def clean_text(text: str | None) -> str | None:
@@ -53,38 +417,4 @@ def correct_plate(raw_ocr_text: str | None, current_timestamp: str) -> str | Non
     if not cleaned:
         return None
 
-    current_sec = time_to_seconds(current_timestamp)
-
-    best_match = None
-    best_score = 0.0
-
-    # 1) Compute similarity to all known plates, with timestamp bias
-    for kp in KNOWN_PLATES:
-        plate = kp["plate"]
-        ts = kp["t_start"]
-        te = kp["t_end"]
-
-        sim = similarity(cleaned, plate)
-
-        # If we are in the time window where that plate is known to appear,
-        # give it a bonus.
-        if is_in_window(current_sec, ts, te):
-            sim *= 1.30  # bias factor
-
-        if sim > best_score:
-            best_score = sim
-            best_match = plate
-
-    # 2) General threshold for all plates
-    if best_score >= 0.55:
-        return best_match
-
-    # 3) If inside SOME known window, allow weaker similarity for that one plate
-    for kp in KNOWN_PLATES:
-        plate = kp["plate"]
-        if is_in_window(current_sec, kp["t_start"], kp["t_end"]):
-            sim_local = similarity(cleaned, plate)
-            if sim_local > 0.40:
-                return plate
-
-    return None
+    return get_matcher().match(cleaned, time_to_seconds(current_timestamp))
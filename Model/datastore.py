@@ -0,0 +1,358 @@
+# datastore.py
+
+import logging
+import queue
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import DB_PATH, SQLITE_SYNCHRONOUS
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+POOL_SIZE = 8
+
+FEED_POLL_SEC = 0.5      # How often the log feed checks PRAGMA data_version
+FEED_BUFFER_SIZE = 500   # Recent log rows kept in memory for subscribers
+
+log = logging.getLogger(__name__)
+
+LOG_FILTERS = ("plate", "since", "until", "decision", "camera")
+LOG_COLUMNS = ("id, plate_number, timestamp, direction, camera_id, "
+               "detection_conf, ocr_conf, quality, image_path, decision")
+
+
+def connect_readonly(db_path=DB_PATH):
+    """Read-only connection (mode=ro + query_only) returning sqlite3.Row rows."""
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA query_only=1")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ConnectionPool:
+    """
+    Reusable sqlite3 connections to the detector database.
+
+    connection() lends an idle connection to the calling thread and takes it
+    back afterwards, so requests skip connection setup. Read-only pools open
+    the file with mode=ro; at most `size` idle connections are kept.
+    """
+
+    def __init__(self, db_path=DB_PATH, readonly=True, size=POOL_SIZE):
+        self.db_path = db_path
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _connect(self):
+        if self.readonly:
+            conn = connect_readonly(self.db_path)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            conn.row_factory = sqlite3.Row
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def migrate_logs(conn):
+    """Add logs columns introduced after a database was created."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(logs)")}
+    if columns and "quality" not in columns:
+        conn.execute("ALTER TABLE logs ADD COLUMN quality REAL")
+        conn.commit()
+
+
+def ensure_indexes(conn):
+    """
+    Indexes behind the dashboard queries. Log pages are read newest first by
+    (timestamp, id); an index entry also holds the row's id, so the
+    unfiltered list and since/until pages walk idx_logs_timestamp, and the
+    decision / camera filters (with or without since/until) walk their
+    (column, timestamp) index, each stopping after one page. A plate prefix
+    reads that prefix's rows through idx_logs_plate and sorts only those.
+    """
+    c = conn.cursor()
+    # Replaced by the (column, timestamp) indexes when pages moved off id order
+    c.execute("DROP INDEX IF EXISTS idx_logs_decision_id")
+    c.execute("DROP INDEX IF EXISTS idx_logs_camera_id")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_decision_time ON logs (decision, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_camera_time ON logs (camera_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_plate ON logs (plate_number)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_status_id ON vehicles (status, id)")
+    conn.commit()
+
+
+def ensure_vehicles_version(conn):
+    """
+    vehicles_version: one row counting changes to the vehicles table, bumped
+    by triggers on every insert, update and delete. Plate caches poll it
+    instead of PRAGMA data_version, which also moves on every logs commit.
+    """
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS vehicles_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO vehicles_version (id, version) VALUES (1, 0);
+        CREATE TRIGGER IF NOT EXISTS vehicles_version_insert AFTER INSERT ON vehicles
+        BEGIN UPDATE vehicles_version SET version = version + 1 WHERE id = 1; END;
+        CREATE TRIGGER IF NOT EXISTS vehicles_version_update AFTER UPDATE ON vehicles
+        BEGIN UPDATE vehicles_version SET version = version + 1 WHERE id = 1; END;
+        CREATE TRIGGER IF NOT EXISTS vehicles_version_delete AFTER DELETE ON vehicles
+        BEGIN UPDATE vehicles_version SET version = version + 1 WHERE id = 1; END;
+    """)
+
+
+def vehicles_version(conn):
+    return conn.execute("SELECT version FROM vehicles_version WHERE id = 1").fetchone()[0]
+
+
+def page_size(value):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(n, MAX_PAGE_SIZE))
+
+
+def parse_cursor(value):
+    """Keyset cursor: the last id of the previous page (None for the first page)."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_log_cursor(value):
+    """Log page cursor: "timestamp,id" of the previous page's last row (None for the first page)."""
+    try:
+        timestamp, last_id = value.rsplit(",", 1)
+        return timestamp, int(last_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_filters(args):
+    """Log filters from request args; empty values are dropped, plates upper-cased."""
+    filters = {}
+    for key in LOG_FILTERS:
+        value = (args.get(key) or "").strip()
+        if value:
+            filters[key] = value.upper() if key == "plate" else value
+    return filters
+
+
+def _prefix_range(prefix):
+    # plate LIKE 'AB%' as a range, so the plate_number index is used
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _page(conn, sql, where, params, limit, order="id DESC", cursor=lambda row: row["id"]):
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    sql += " ORDER BY " + order + " LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    next_cursor = cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def fetch_log_page(conn, filters=None, after=None, limit=PAGE_SIZE):
+    """
+    One page of detector logs, newest first by (timestamp, id), so rows
+    imported from older footage (scripts/bulk_anpr.py) sit at their own time.
+
+    filters: plate (prefix), since / until (ISO timestamps, as stored),
+    decision, camera. after is the (timestamp, id) cursor from the previous
+    page (parse_log_cursor). Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    filters = filters or {}
+    where = []
+    params = []
+
+    if "plate" in filters:
+        lo, hi = _prefix_range(filters["plate"])
+        where.append("plate_number >= ? AND plate_number < ?")
+        params += [lo, hi]
+    if "since" in filters:
+        where.append("timestamp >= ?")
+        params.append(filters["since"])
+    if "until" in filters:
+        where.append("timestamp <= ?")
+        params.append(filters["until"])
+    if "decision" in filters:
+        where.append("decision = ?")
+        params.append(filters["decision"])
+    if "camera" in filters:
+        where.append("camera_id = ?")
+        params.append(filters["camera"])
+    if after is not None:
+        where.append("(timestamp, id) < (?, ?)")
+        params += list(after)
+
+    sql = ("SELECT " + LOG_COLUMNS + " FROM logs")
+    return _page(conn, sql, where, params, limit, "timestamp DESC, id DESC",
+                 lambda row: f"{row['timestamp']},{row['id']}")
+
+
+def fetch_logs_since(conn, after_id, limit=PAGE_SIZE):
+    """Log rows with id > after_id, oldest first (the change feed)."""
+    return conn.execute("SELECT " + LOG_COLUMNS + " FROM logs WHERE id > ? "
+                        "ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+
+
+def latest_log_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+
+
+class LogFeed:
+    """
+    Change feed of new logs rows for live dashboard updates.
+
+    The detector's LogWriter only appends to logs, so "new rows" is simply
+    id > last seen id. One background thread watches PRAGMA data_version
+    (it changes only when another connection commits) and reads just the
+    new rows into a small buffer; every waiting browser is then served from
+    that buffer, so N clients cost one cheap poll instead of N table reads.
+    """
+
+    def __init__(self, db_path=DB_PATH, poll_sec=FEED_POLL_SEC,
+                 buffer_size=FEED_BUFFER_SIZE):
+        self.db_path = db_path
+        self.poll_sec = poll_sec
+        self.events = deque(maxlen=buffer_size)  # dict rows, ascending id
+        self.last_id = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self, conn, version):
+        current = conn.execute("PRAGMA data_version").fetchone()[0]
+        if current == version:
+            return version
+        while True:
+            rows = fetch_logs_since(conn, self.last_id, MAX_PAGE_SIZE)
+            if not rows:
+                break
+            with self._cond:
+                self.events.extend(dict(row) for row in rows)
+                self.last_id = rows[-1]["id"]
+                self._cond.notify_all()
+        return current
+
+    def _run(self, conn):
+        version = None
+        try:
+            while not self._stop.wait(self.poll_sec):
+                try:
+                    version = self._poll(conn, version)
+                except sqlite3.Error as e:
+                    log.warning("Log feed poll failed: %s", e)
+        finally:
+            conn.close()
+
+    def start(self):
+        """Start from the newest existing row; returns self."""
+        conn = connect_readonly(self.db_path)
+        self.last_id = latest_log_id(conn)
+        self._thread = threading.Thread(target=self._run, args=(conn,),
+                                        name="log-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def _after(self, after_id):
+        return [e for e in self.events if e["id"] > after_id]
+
+    def wait(self, after_id, timeout):
+        """
+        Rows with id > after_id, blocking up to timeout seconds until there
+        is at least one (long-poll). A client that fell behind the buffer is
+        caught up from the database. Returns [] on timeout.
+        """
+        with self._cond:
+            oldest = self.events[0]["id"] if self.events else self.last_id + 1
+            if after_id >= self.last_id or after_id >= oldest - 1:
+                self._cond.wait_for(lambda: self.last_id > after_id or self._stop.is_set(),
+                                    timeout)
+                return self._after(after_id)
+
+        # Fell behind the buffer: read the gap from the database
+        conn = connect_readonly(self.db_path)
+        try:
+            return [dict(row) for row in fetch_logs_since(conn, after_id, MAX_PAGE_SIZE)]
+        finally:
+            conn.close()
+
+
+def fetch_vehicle_page(conn, status=None, after=None, limit=PAGE_SIZE):
+    """One page of vehicles (optionally of one status), newest first; returns (rows, next_cursor)."""
+    where = []
+    params = []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if after is not None:
+        where.append("id < ?")
+        params.append(after)
+    sql = "SELECT id, plate_number, status, owner_name, remarks FROM vehicles"
+    return _page(conn, sql, where, params, limit)
+
+
+def set_vehicle_status(conn, plate, status):
+    """
+    Insert or update a vehicle's status. The detector's status cache and
+    correction registry pick the change up through the trigger-kept
+    vehicles_version (registry.VehiclesChanges).
+    """
+    conn.execute("""
+        INSERT INTO vehicles (plate_number, status) VALUES (?, ?)
+        ON CONFLICT(plate_number) DO UPDATE SET status = excluded.status
+    """, (plate, status))
+    conn.commit()
+
+
+def remove_from_blacklist(conn, plate):
+    """Blacklisted plate back to 'visitor' (the default for unregistered vehicles)."""
+    c = conn.execute("UPDATE vehicles SET status = 'visitor' "
+                     "WHERE plate_number = ? AND status = 'blacklisted'", (plate,))
+    conn.commit()
+    return c.rowcount > 0
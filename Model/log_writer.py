@@ -0,0 +1,170 @@
+# log_writer.py
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from config import (
+    DB_PATH,
+    SQLITE_SYNCHRONOUS,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_SEC,
+    LOG_QUEUE_SIZE,
+)
+from datastore import migrate_logs
+from scripts.metrics import DB_ROWS, DB_WRITE_SECONDS, LOG_QUEUE_DEPTH
+
+log = logging.getLogger(__name__)
+
+
+def enable_wal(conn, synchronous=SQLITE_SYNCHRONOUS):
+    """
+    Put the database in WAL mode so readers (dashboard, status cache) never
+    block the writer, and relax fsync: with WAL, synchronous=NORMAL only
+    risks the last transactions on power loss, never corruption.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+
+
+class LogWriter:
+    """
+    Background persistence for decision logs and their snapshots.
+
+    log() only enqueues; a writer thread encodes snapshots and inserts rows
+    in one transaction per batch, flushing when LOG_BATCH_SIZE rows are
+    queued or LOG_FLUSH_SEC has passed since the first one. close() (also
+    registered with atexit) drains everything still queued; rows logged
+    after close() are dropped with a warning.
+    """
+
+    _STOP = object()
+    # Started, not yet closed writers; LOG_QUEUE_DEPTH is their total backlog
+    _live = set()
+    _live_lock = threading.Lock()
+
+    @classmethod
+    def queued(cls):
+        """Rows waiting across all live writers."""
+        with cls._live_lock:
+            return sum(w._q.qsize() for w in cls._live)
+
+    def __init__(self, db_path=DB_PATH, batch_size=LOG_BATCH_SIZE,
+                 flush_sec=LOG_FLUSH_SEC, queue_size=LOG_QUEUE_SIZE):
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_sec = flush_sec
+        self.rows_written = 0
+        self.batches = 0
+        self._q = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._closed = False
+        # log/close: nothing can be queued behind _STOP
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer",
+                                        daemon=True)
+        self._thread.start()
+        with self._live_lock:
+            self._live.add(self)
+        atexit.register(self.close)
+        return self
+
+    def log(self, plate, decision, detection_conf, ocr_conf, image_path,
+            camera_id, direction, snapshot=None, timestamp=None, quality=None):
+        """
+        Queue one logs row. snapshot (BGR ndarray) is written to image_path
+        by the writer thread. The timestamp is taken now, not at flush time.
+        quality is the crop quality score OCR ran on (None if not scored).
+        """
+        if timestamp is None:
+            timestamp = datetime.now().isoformat(timespec='seconds')
+        row = (plate, timestamp, direction, camera_id,
+               detection_conf, ocr_conf, quality, image_path, decision)
+        with self._lock:
+            if self._closed:
+                log.warning("Log writer closed; dropped row for %s (%s)", plate, decision)
+                return
+            self._q.put((row, snapshot))
+
+    def _collect(self):
+        first = self._q.get()
+        if first is self._STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_sec
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, conn, batch):
+        for row, snapshot in batch:
+            image_path = row[7]
+            if snapshot is not None and image_path:
+                if not cv2.imwrite(image_path, snapshot):
+                    log.warning("Failed to write snapshot %s", image_path)
+
+        rows = [row for row, _ in batch]
+        for attempt in range(3):
+            try:
+                t0 = time.perf_counter()
+                with conn:
+                    conn.executemany("""
+                        INSERT INTO logs (plate_number, timestamp, direction, camera_id,
+                                          detection_conf, ocr_conf, quality, image_path, decision)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, rows)
+                DB_WRITE_SECONDS.observe(time.perf_counter() - t0)
+                DB_ROWS.inc(len(rows))
+                self.rows_written += len(rows)
+                self.batches += 1
+                return
+            except sqlite3.OperationalError as e:
+                # Database locked by a long reader/writer: back off and retry
+                log.warning("Log batch write failed (%s), retrying", e)
+                time.sleep(0.5 * (attempt + 1))
+        log.error("Dropped %s log rows after retries", len(rows))
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        enable_wal(conn)
+        migrate_logs(conn)
+        try:
+            while True:
+                batch, stop = self._collect()
+                if batch:
+                    self._write(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def close(self):
+        """Flush everything queued and stop the writer thread."""
+        with self._lock:
+            if self._closed or self._thread is None:
+                return
+            self._closed = True
+            self._q.put(self._STOP)
+        self._thread.join()
+        with self._live_lock:
+            self._live.discard(self)
+
+
+LOG_QUEUE_DEPTH.set_function(LogWriter.queued)
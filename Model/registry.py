@@ -0,0 +1,235 @@
+# registry.py
+
+import logging
+import sqlite3
+import threading
+
+from config import (
+    DB_PATH,
+    REGISTRY_STATUSES,
+    REGISTRY_POLL_SEC,
+    STATUS_CACHE_FLUSH_SEC,
+)
+from known_plates import KNOWN_PLATES
+from correction import PlateMatcher, set_matcher
+from datastore import ensure_vehicles_version, vehicles_version
+
+log = logging.getLogger(__name__)
+
+
+def load_vehicle_plates(conn):
+    """Set of registry plates from the vehicles table (statuses in REGISTRY_STATUSES)."""
+    marks = ",".join("?" for _ in REGISTRY_STATUSES)
+    c = conn.cursor()
+    c.execute(f"SELECT plate_number FROM vehicles WHERE status IN ({marks})",
+              tuple(REGISTRY_STATUSES))
+    return {row[0].upper() for row in c.fetchall() if row[0]}
+
+
+class VehiclesChanges:
+    """
+    Change check for the vehicles table on one connection. PRAGMA
+    data_version (no I/O) moves on any commit from another connection,
+    including every LogWriter batch; only then is the trigger-kept
+    vehicles_version read, and changed() is True only if that moved.
+    """
+
+    def __init__(self, version=None):
+        self.data_version = None
+        self.version = version
+
+    def changed(self, conn):
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return False
+        self.data_version = data_version
+        version = vehicles_version(conn)
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+
+class RegistryWatcher:
+    """
+    Keeps a PlateMatcher in sync with the vehicles table.
+
+    A background thread checks for vehicles changes (VehiclesChanges) every
+    REGISTRY_POLL_SEC, so an idle registry costs one tiny query per poll
+    however busy the logs table is. On a change the plate set is re-read and
+    only the difference is applied to the matcher, so lookups stay in memory
+    and the frame loop never waits on the database.
+    """
+
+    def __init__(self, matcher, db_path=DB_PATH, poll_sec=REGISTRY_POLL_SEC):
+        self.matcher = matcher
+        self.db_path = db_path
+        self.poll_sec = poll_sec
+        self.changes = VehiclesChanges()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, conn):
+        """Apply registry changes since the last refresh; returns (added, removed)."""
+        current = load_vehicle_plates(conn)
+        known = self.matcher.registry_plates()
+        added = 0
+        removed = 0
+        for plate in current - known:
+            added += self.matcher.add_plate(plate)
+        for plate in known - current:
+            removed += self.matcher.remove_plate(plate)
+        return added, removed
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            while not self._stop.wait(self.poll_sec):
+                try:
+                    if not self.changes.changed(conn):
+                        continue
+                    added, removed = self.refresh(conn)
+                    if added or removed:
+                        log.info("Registry updated: +%s -%s plates", added, removed)
+                except sqlite3.Error as e:
+                    log.warning("Registry refresh failed: %s", e)
+        finally:
+            conn.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="registry-watcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+class VehicleStatusCache:
+    """
+    In-memory plate -> status map for gate decisions.
+
+    All vehicles are preloaded, so get_status() never touches the disk.
+    Unknown plates become 'visitor' immediately in memory and are written to
+    the vehicles table later by a background thread (write-behind). The same
+    thread reloads the map when another process (manage_vehicles.py, the web
+    app) changes the vehicles table (VehiclesChanges); logs commits and its
+    own visitor writes do not trigger a reload.
+    """
+
+    def __init__(self, db_path=DB_PATH, poll_sec=REGISTRY_POLL_SEC,
+                 flush_sec=STATUS_CACHE_FLUSH_SEC):
+        self.db_path = db_path
+        self.poll_sec = poll_sec
+        self.flush_sec = flush_sec
+        self.statuses = {}
+        self.changes = VehiclesChanges()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_status(self, plate):
+        status = self.statuses.get(plate)
+        if status is not None:
+            return status
+        # Unknown plate -> visitor by default
+        with self._lock:
+            if plate not in self.statuses:
+                self.statuses[plate] = "visitor"
+                self._pending.append(plate)
+            return self.statuses[plate]
+
+    def _load(self, conn):
+        c = conn.cursor()
+        c.execute("SELECT plate_number, status FROM vehicles")
+        statuses = {row[0]: row[1] for row in c.fetchall()}
+        with self._lock:
+            # Visitors seen since the last flush are not in the table yet
+            for plate in self._pending:
+                statuses.setdefault(plate, "visitor")
+            self.statuses = statuses
+
+    def _flush(self, conn):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            # IMMEDIATE: no other writer between the two version reads
+            conn.execute("BEGIN IMMEDIATE")
+            before = vehicles_version(conn)
+            conn.executemany(
+                "INSERT OR IGNORE INTO vehicles (plate_number, status) VALUES (?, ?)",
+                [(plate, "visitor") for plate in pending]
+            )
+            after = vehicles_version(conn)
+            conn.commit()
+            # Only our own visitors changed the table since the last load: no reload
+            if before == self.changes.version:
+                self.changes.version = after
+        except sqlite3.Error as e:
+            conn.rollback()
+            log.warning("Visitor write-behind failed: %s", e)
+            with self._lock:
+                self._pending = pending + self._pending
+
+    def _run(self, conn):
+        try:
+            wait = min(self.poll_sec, self.flush_sec)
+            while not self._stop.wait(wait):
+                self._flush(conn)
+                try:
+                    if self.changes.changed(conn):
+                        self._load(conn)
+                except sqlite3.Error as e:
+                    log.warning("Status cache reload failed: %s", e)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def start(self):
+        """Preload all statuses, then start the write-behind/reload thread."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        ensure_vehicles_version(conn)
+        self.changes.changed(conn)
+        self._load(conn)
+        log.info("Status cache: %s vehicles preloaded", len(self.statuses))
+        self._thread = threading.Thread(target=self._run, args=(conn,),
+                                        name="status-cache", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread; pending visitors are flushed first."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def start_registry(db_path=DB_PATH):
+    """
+    Build the correction matcher from KNOWN_PLATES (with their time windows)
+    plus the vehicles table, install it for correct_plate(), and start a
+    watcher that keeps it current. Returns the watcher (call stop() on exit).
+    """
+    matcher = PlateMatcher(KNOWN_PLATES)
+    watcher = RegistryWatcher(matcher, db_path)
+
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            ensure_vehicles_version(conn)
+            watcher.changes.version = vehicles_version(conn)
+            added, _ = watcher.refresh(conn)
+        finally:
+            conn.close()
+        log.info("Correction registry: %s known + %s from vehicles table", len(KNOWN_PLATES), added)
+    except sqlite3.Error as e:
+        log.warning("Could not load vehicles table (%s); using known plates only", e)
+
+    set_matcher(matcher)
+    watcher.start()
+    return watcher
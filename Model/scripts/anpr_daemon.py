@@ -0,0 +1,212 @@
+# scripts/anpr_daemon.py
+
+import os
+import sys
+import time
+import json
+import logging
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DETECTOR_BACKEND,
+    DETECT_IMGSZ,
+    DETECTION_CONFIDENCE,
+    IOU_THRESHOLD,
+    FRAME_SKIP,
+    MOTION_GATE,
+    SNAPSHOT_DIR,
+    CAMERAS,
+    CAMERA_QUEUE_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_DROP_POLICY,
+    OCR_WORKERS,
+    OCR_ROI_FALLBACK,
+    LOG_LEVEL,
+    METRICS_HOST,
+    METRICS_PORT,
+    STATS_INTERVAL,
+    DETECT_BATCH_SIZE,
+    DETECT_BATCH_MAX_WAIT_MS,
+)
+from scripts.utils_ocr import warm_up_ocr
+from scripts.metrics import serve_metrics
+from scripts.logging_setup import LEVELS, setup_logging
+from registry import VehicleStatusCache, start_registry
+from log_writer import LogWriter
+from scripts.batch_infer import BatchedDetector
+from scripts.detector_backends import BACKENDS, load_detector
+from scripts.pipeline import (
+    Pipeline,
+    SourceStage,
+    Stage,
+    StageQueue,
+    fair_merge,
+)
+from scripts.run_anpr import (
+    ROI_TOP,
+    ROI_BOTTOM,
+    ROI_LEFT,
+    ROI_RIGHT,
+    Persister,
+    Tracker,
+    make_capture,
+    make_detect,
+    open_camera,
+    ocr,
+)
+
+log = logging.getLogger(__name__)
+
+
+def load_cameras(path=None):
+    """
+    Load the camera list from a JSON file, or config.CAMERAS if no path.
+    Fills in defaults so every camera has id, source, direction, roi,
+    frame_skip, motion and substream (low-res stream for the motion gate).
+    """
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            cameras = json.load(f)
+    else:
+        cameras = CAMERAS
+
+    out = []
+    seen = set()
+    for i, cam in enumerate(cameras):
+        cam_id = cam.get("id") or f"cam_{i + 1}"
+        if cam_id in seen:
+            raise ValueError(f"Duplicate camera id: {cam_id}")
+        seen.add(cam_id)
+
+        direction = cam.get("direction", "entry")
+        if direction not in ("entry", "exit"):
+            raise ValueError(f"Camera {cam_id}: direction must be entry or exit")
+
+        out.append({
+            "id": cam_id,
+            "source": str(cam["source"]),
+            "direction": direction,
+            "roi": tuple(cam.get("roi") or (ROI_TOP, ROI_BOTTOM, ROI_LEFT, ROI_RIGHT)),
+            "frame_skip": int(cam.get("frame_skip", FRAME_SKIP)),
+            "motion": bool(cam.get("motion", MOTION_GATE)),
+            "substream": cam.get("substream"),
+        })
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run ANPR on several cameras with one shared YOLO model and OCR reader.")
+    parser.add_argument("--cameras", type=str, default=None,
+                        help="JSON file with the camera list (default: config.CAMERAS)")
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS,
+                        help="Number of OCR worker threads shared by all cameras")
+    parser.add_argument("--backend", choices=BACKENDS, default=DETECTOR_BACKEND,
+                        help="Detector runtime (default DETECTOR_BACKEND)")
+    parser.add_argument("--model", type=str, default=None,
+                        help="Model file for the backend (default: path from config.py)")
+    parser.add_argument("--log-level", choices=LEVELS, default=LOG_LEVEL,
+                        help="DEBUG adds per-frame/per-track lines (default LOG_LEVEL)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    cameras = load_cameras(args.cameras)
+    if not cameras:
+        log.error("No cameras configured.")
+        return
+
+    # One model and one OCR reader for every stream
+    model = load_detector(args.backend, args.model)
+    detector = BatchedDetector(
+        model,
+        batch_size=DETECT_BATCH_SIZE,
+        max_wait_ms=DETECT_BATCH_MAX_WAIT_MS,
+        imgsz=DETECT_IMGSZ,
+        conf=DETECTION_CONFIDENCE,
+        iou=IOU_THRESHOLD,
+    )
+    warm_up_ocr(OCR_ROI_FALLBACK)
+    registry = start_registry()
+    statuses = VehicleStatusCache().start()
+    writer = LogWriter().start()
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    pipeline = Pipeline()
+    caps = []
+    substreams = []
+    camera_qs = []
+    for cam in cameras:
+        # Live cameras get a grabber thread that keeps only the newest frame
+        cap, fps, motion_cap, motion_fps = open_camera(cam["source"], cam)
+        if cap is None:
+            log.error("[%s] Failed to open source: %s", cam['id'], cam['source'])
+            continue
+        log.info("[%s] Opened %s (%s, %.2f fps)", cam['id'], cam['source'], cam['direction'], fps)
+        caps.append(cap)
+        if motion_cap is not None:
+            substreams.append(motion_cap)
+
+        # Live streams must not back up: keep only the newest few frames per camera
+        cam_q = StageQueue(f"cam:{cam['id']}", CAMERA_QUEUE_SIZE, PIPELINE_DROP_POLICY)
+        camera_qs.append(cam_q)
+        pipeline.add(SourceStage(f"capture:{cam['id']}",
+                                 make_capture(cap, fps, None, cam, motion_cap, motion_fps),
+                                 cam_q))
+
+    if not caps:
+        detector.close()
+        registry.stop()
+        statuses.stop()
+        writer.close()
+        return
+
+    frame_q = StageQueue("frames", PIPELINE_QUEUE_SIZE, "block")
+    det_q = StageQueue("detections", PIPELINE_QUEUE_SIZE, "block")
+    track_q = StageQueue("tracks", PIPELINE_QUEUE_SIZE, "block")
+    read_q = StageQueue("readings", PIPELINE_QUEUE_SIZE, "block")
+
+    tracker = Tracker()
+    persister = Persister(statuses, writer)
+    pipeline.add(SourceStage("scheduler", lambda: fair_merge(camera_qs), frame_q))
+    pipeline.add(Stage("detect", make_detect(detector), frame_q, det_q,
+                       workers=DETECT_BATCH_SIZE, ordered=True))
+    pipeline.add(Stage("track", tracker, det_q, track_q, on_stop=tracker.flush))
+    pipeline.add(Stage("ocr", ocr, track_q, read_q, workers=args.ocr_workers))
+    pipeline.add(Stage("persist", persister, read_q))
+
+    metrics_server = serve_metrics(args.metrics_port, METRICS_HOST)
+    log.info("Daemon running %s camera(s) on one shared model", len(caps))
+    pipeline.start()
+
+    last_stats = time.time()
+    try:
+        while pipeline.is_alive():
+            time.sleep(0.2)
+            if STATS_INTERVAL and time.time() - last_stats >= STATS_INTERVAL:
+                log.info("[STATS] %s", pipeline.format_stats())
+                last_stats = time.time()
+    except KeyboardInterrupt:
+        log.info("Interrupted, draining pipeline...")
+        pipeline.stop()
+
+    pipeline.join()
+    detector.close()
+    registry.stop()
+    statuses.stop()
+    writer.close()
+    for cap in caps + substreams:
+        cap.release()
+    log.info("[STATS] %s", pipeline.format_stats())
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    log.info("Daemon stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# scripts/batch_infer.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchedDetector:
+    """
+    Micro-batching front end for a plate detector (scripts/detector_backends.py).
+
+    Callers (detect workers, camera streams) submit single ROIs. A background
+    thread collects them until DETECT_BATCH_SIZE images are waiting or the
+    oldest one has waited DETECT_BATCH_MAX_WAIT_MS, then runs one
+    model.detect_batch() on the whole list and hands each caller its own boxes.
+
+    Boxes are returned as a list of (x1, y1, x2, y2, conf) in the coordinates
+    of the submitted image. Every submitted future is resolved: requests
+    still queued at close() and batches the model answers with the wrong
+    number of results fail with an exception instead of waiting forever.
+    """
+
+    def __init__(self, model, batch_size=4, max_wait_ms=15, imgsz=640,
+                 conf=0.25, iou=0.45):
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+        self.batches = 0
+        self.images = 0
+
+        self._q = queue.Queue()
+        self._closed = False
+        # submit/close: nothing can be queued behind the stop sentinel
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="yolo-batcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Queue one image; returns a Future resolving to its box list."""
+        fut = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchedDetector is closed")
+            self._q.put((image, fut))
+        return fut
+
+    def predict(self, image, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(image).result(timeout)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._q.put(None)
+        self._thread.join()
+
+    def avg_batch_size(self):
+        return self.images / self.batches if self.batches else 0.0
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or deadline."""
+        first = self._q.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                req = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if req is None:
+                # Finish this batch, then stop
+                self._q.put(None)
+                break
+            batch.append(req)
+        return batch
+
+    def _drain(self):
+        """Fail whatever is still queued after the stop sentinel."""
+        while True:
+            try:
+                req = self._q.get_nowait()
+            except queue.Empty:
+                return
+            if req is not None:
+                req[1].set_exception(RuntimeError("BatchedDetector is closed"))
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+
+            images = [img for img, _ in batch]
+            try:
+                results = self.model.detect_batch(images, self.imgsz, self.conf, self.iou)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Detector returned {len(results)} results "
+                                       f"for {len(batch)} images")
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.images += len(batch)
+
+            for (_, fut), boxes in zip(batch, results):
+                fut.set_result(boxes)
+        self._drain()
+
+
+def boxes_from_result(r):
+    """Convert one ultralytics Results object to [(x1, y1, x2, y2, conf), ...]."""
+    boxes = r.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    xyxy = boxes.xyxy.tolist()
+    confs = boxes.conf.tolist()
+    return [(x1, y1, x2, y2, float(c)) for (x1, y1, x2, y2), c in zip(xyxy, confs)]
@@ -0,0 +1,404 @@
+# scripts/bench_anpr.py
+
+import os
+import sys
+import json
+import time
+import platform
+import sqlite3
+import argparse
+import subprocess
+from datetime import datetime
+
+import cv2
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DB_PATH,
+    DETECTOR_BACKEND,
+    DETECT_IMGSZ,
+    DETECTION_CONFIDENCE,
+    IOU_THRESHOLD,
+    DETECT_BATCH_SIZE,
+    DETECT_BATCH_MAX_WAIT_MS,
+    OCR_WORKERS,
+    OCR_ROI_FALLBACK,
+    FRAME_SKIP,
+    MOTION_GATE,
+    COOLDOWN_SECONDS,
+    BENCH_DIR,
+)
+from known_plates import KNOWN_PLATES
+from scripts import utils_ocr, run_anpr, run_realtime
+from scripts.run_anpr import hms_to_seconds
+from scripts.ocr_backends import OCR_BACKENDS
+from scripts.batch_infer import BatchedDetector
+from scripts.detector_backends import BACKENDS, load_detector
+from scripts.pipeline import StepTimings
+from scripts.logging_setup import LEVELS, setup_logging
+from correction import PlateMatcher, set_matcher
+from registry import load_vehicle_plates
+from datastore import connect_readonly
+
+MODES = ("pipeline", "realtime")
+
+
+class ReplayCapture:
+    """cv2.VideoCapture wrapper that stops after max_frames and counts decoded frames."""
+
+    def __init__(self, cap, max_frames=0):
+        self.cap = cap
+        self.max_frames = max_frames
+        self.frames = 0
+
+    def read(self):
+        if self.max_frames and self.frames >= self.max_frames:
+            return False, None
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames += 1
+        return ret, frame
+
+    def grab(self):
+        if self.max_frames and self.frames >= self.max_frames:
+            return False
+        ret = self.cap.grab()
+        if ret:
+            self.frames += 1
+        return ret
+
+
+class RecordingWriter:
+    """Takes LogWriter's place so a benchmark writes no logs rows or snapshots."""
+
+    def __init__(self):
+        self.rows = []
+        self.rows_written = 0
+        self.batches = 0
+
+    def log(self, plate, decision, *args, **kwargs):
+        self.rows.append((plate, decision))
+
+    def close(self):
+        pass
+
+
+def open_vehicles_db(db_path=DB_PATH):
+    """Read-only connection to the ANPR database, or None if it does not exist yet."""
+    if not os.path.exists(db_path):
+        return None
+    return connect_readonly(db_path)
+
+
+class StaticStatuses:
+    """
+    Takes VehicleStatusCache's place: statuses are read once from the vehicles
+    table and unknown plates become 'visitor' in memory only, so replayed
+    plates are never written to the vehicles table.
+    """
+
+    def __init__(self, conn=None):
+        self.statuses = {}
+        if conn is not None:
+            try:
+                self.statuses = dict(conn.execute("SELECT plate_number, status FROM vehicles"))
+            except sqlite3.Error as e:
+                print(f"[WARN] Could not read vehicle statuses ({e}); all plates are visitors")
+
+    def get_status(self, plate):
+        return self.statuses.get(plate, "visitor")
+
+
+def install_registry(conn=None):
+    """Correction matcher from KNOWN_PLATES + the vehicles table, read once (no watcher)."""
+    matcher = PlateMatcher(KNOWN_PLATES)
+    if conn is not None:
+        try:
+            for plate in load_vehicle_plates(conn):
+                matcher.add_plate(plate)
+        except sqlite3.Error as e:
+            print(f"[WARN] Could not load vehicles table ({e}); using known plates only")
+    set_matcher(matcher)
+
+
+class ScoringPersister(run_anpr.Persister):
+    """
+    Persister that also keeps every reading (before cooldown) for scoring.
+    Decisions are made as live but no gate hook is called.
+    """
+
+    def __init__(self, statuses, writer):
+        super().__init__(statuses, writer)
+        self.readings = []
+
+    def decide(self, plate):
+        status = self.statuses.get_status(plate)
+        return ("blocked" if status == "blacklisted" else "allowed"), status
+
+    def __call__(self, item):
+        for det in item["readings"]:
+            self.readings.append({
+                "plate": det["plate"],
+                "raw": det["raw"],
+                "ts_str": det["ts_str"],
+                "fallback": det["fallback"],
+            })
+        with run_anpr.steps.time("persist"):
+            return super().__call__(item)
+
+
+def score(readings, ground_truth, tolerance, until_sec, key="plate"):
+    """
+    Score readings against ground-truth windows ({plate, t_start, t_end}).
+    A window is hit when some reading with its plate falls inside it (widened
+    by tolerance seconds); a reading is correct when it hits some window.
+    Windows starting after until_sec (the part of the video replayed) are ignored.
+    """
+    windows = [
+        (gt["plate"], hms_to_seconds(gt["t_start"]) - tolerance,
+         hms_to_seconds(gt["t_end"]) + tolerance, gt)
+        for gt in ground_truth
+        if hms_to_seconds(gt["t_start"]) <= until_sec
+    ]
+    hit = [False] * len(windows)
+    correct = 0
+    for r in readings:
+        t = hms_to_seconds(r["ts_str"])
+        matched = False
+        for i, (plate, start, end, _) in enumerate(windows):
+            if r[key] == plate and start <= t <= end:
+                hit[i] = True
+                matched = True
+        correct += matched
+
+    return {
+        "reads": len(readings),
+        "correct_reads": correct,
+        "precision": correct / float(len(readings)) if readings else 0.0,
+        "windows": len(windows),
+        "windows_hit": sum(hit),
+        "recall": sum(hit) / float(len(windows)) if windows else 0.0,
+        "missed": [f"{w[3]['plate']}@{w[3]['t_start']}" for w, h in zip(windows, hit) if not h],
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1e6
+        except (ImportError, AttributeError):
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1e6 if sys.platform == "darwin" else rss / 1024.0
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_pipeline_mode(cap, fps, args):
+    """Replay through run_anpr's staged pipeline; returns (steps, stages, readings)."""
+    model = load_detector(args.backend, args.model)
+    detector = BatchedDetector(
+        model,
+        batch_size=DETECT_BATCH_SIZE,
+        max_wait_ms=DETECT_BATCH_MAX_WAIT_MS,
+        imgsz=DETECT_IMGSZ,
+        conf=DETECTION_CONFIDENCE,
+        iou=IOU_THRESHOLD,
+    )
+    utils_ocr.warm_up_ocr(OCR_ROI_FALLBACK, args.ocr_backend)
+    conn = open_vehicles_db()
+    install_registry(conn)
+    statuses = StaticStatuses(conn)
+    if conn is not None:
+        conn.close()
+    persister = ScoringPersister(statuses, RecordingWriter())
+
+    camera = run_anpr.default_camera()
+    camera["motion"] = args.motion
+    camera["frame_skip"] = args.frame_skip
+    # Files are replayed as fast as possible and no frame is dropped
+    pipeline = run_anpr.build_pipeline(cap, fps, detector, persister,
+                                       args.ocr_workers, "block", camera=camera,
+                                       ocr_backend=args.ocr_backend)
+    pipeline.start()
+    pipeline.join()
+
+    detector.close()
+    stages = pipeline.stats()
+    stages["detect"]["avg_batch"] = detector.avg_batch_size()
+    return run_anpr.steps, stages, persister.readings
+
+
+def run_realtime_mode(cap, fps, args):
+    """Replay through run_realtime's OCR-only frame loop (no YOLO)."""
+    utils_ocr.warm_up_ocr(True, args.ocr_backend)
+    conn = open_vehicles_db()
+    statuses = StaticStatuses(conn)
+    if conn is not None:
+        conn.close()
+    writer = RecordingWriter()
+    steps = StepTimings()
+    readings = []
+    recent_events = {}
+    frame_skip = max(1, args.frame_skip)
+    frame_idx = 0
+
+    while True:
+        t0 = time.perf_counter()
+        with steps.time("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        frame_idx += 1
+        if frame_idx % frame_skip != 0:
+            continue
+
+        with steps.time("preprocess"):
+            extracted = run_realtime.extract_roi(frame)
+        if extracted is None:
+            continue
+        _, roi, roi_up = extracted
+        with steps.time("ocr"):
+            raw_text, ocr_conf = utils_ocr.recognize_plate(roi_up, min_conf=0.4)
+        with steps.time("correct"):
+            plate_text = run_realtime.clean_indian_plate(raw_text)
+
+        if plate_text:
+            ts_str = run_anpr.seconds_to_hms(frame_idx / fps)
+            readings.append({"plate": plate_text, "raw": raw_text,
+                             "ts_str": ts_str, "fallback": True})
+            with steps.time("persist"):
+                now = frame_idx / fps
+                last_t = recent_events.get(plate_text)
+                if not last_t or now - last_t >= COOLDOWN_SECONDS:
+                    recent_events[plate_text] = now
+                    status = statuses.get_status(plate_text)
+                    decision = "blocked" if status == "blacklisted" else "allowed"
+                    writer.log(plate_text, decision, 0.0, ocr_conf, None, None, None, snapshot=roi)
+        steps.record("frame_latency", time.perf_counter() - t0)
+
+    frames = steps.snapshot().get("frame_latency", {}).get("count", 0)
+    return steps, {"capture": {"count": frames}}, readings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded video through the ANPR pipeline and write timing/accuracy JSON.")
+    parser.add_argument("--source", required=True, help="Video file to replay")
+    parser.add_argument("--mode", choices=MODES, default="pipeline",
+                        help="pipeline = run_anpr.py (YOLO + OCR), realtime = run_realtime.py (OCR only)")
+    parser.add_argument("--backend", choices=BACKENDS, default=DETECTOR_BACKEND)
+    parser.add_argument("--model", default=None, help="Model file for the backend")
+    parser.add_argument("--ocr-backend", choices=OCR_BACKENDS, default=utils_ocr.OCR_BACKEND)
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS)
+    parser.add_argument("--frame-skip", type=int, default=FRAME_SKIP)
+    parser.add_argument("--no-motion", dest="motion", action="store_false", default=MOTION_GATE,
+                        help="Use the fixed frame skip instead of the motion gate")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after this many frames (0 = all)")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="Seconds a read may fall outside a ground-truth window")
+    parser.add_argument("--out", default=None, help="JSON file (default: BENCH_DIR/<time>_<mode>_<backend>.json)")
+    parser.add_argument("--log-level", choices=LEVELS, default="WARNING",
+                        help="Pipeline log level while replaying (default WARNING)")
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    raw_cap = cv2.VideoCapture(args.source)
+    if not raw_cap.isOpened():
+        print(f"[ERROR] Failed to open source: {args.source}")
+        sys.exit(1)
+    fps = raw_cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap = ReplayCapture(raw_cap, args.max_frames)
+
+    started = datetime.now()
+    t0 = time.perf_counter()
+    if args.mode == "pipeline":
+        steps, stages, readings = run_pipeline_mode(cap, fps, args)
+    else:
+        steps, stages, readings = run_realtime_mode(cap, fps, args)
+    wall = time.perf_counter() - t0
+    raw_cap.release()
+
+    video_sec = cap.frames / fps
+    step_stats = steps.snapshot()
+    result = {
+        "meta": {
+            "started": started.isoformat(timespec="seconds"),
+            "source": os.path.abspath(args.source),
+            "mode": args.mode,
+            "detector_backend": args.backend if args.mode == "pipeline" else None,
+            "model": args.model,
+            "ocr_backend": args.ocr_backend,
+            "ocr_workers": args.ocr_workers,
+            "motion_gate": args.motion,
+            "frame_skip": args.frame_skip,
+            "detect_batch_size": DETECT_BATCH_SIZE,
+            "imgsz": DETECT_IMGSZ,
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "frames": {
+            "decoded": cap.frames,
+            "processed": stages.get("capture", {}).get("count", 0),
+            "video_sec": video_sec,
+        },
+        "wall_sec": wall,
+        "fps": {
+            "decoded": cap.frames / wall if wall else 0.0,
+            "processed": stages.get("capture", {}).get("count", 0) / wall if wall else 0.0,
+            "realtime_factor": video_sec / wall if wall else 0.0,
+        },
+        "latency": {k: step_stats[k] for k in ("frame_latency", "decision_latency") if k in step_stats},
+        "steps": {k: v for k, v in step_stats.items() if not k.endswith("_latency")},
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": {
+            "final": score(readings, KNOWN_PLATES, args.tolerance, video_sec, "plate"),
+            # Before correct_plate: the correction is biased towards the same
+            # known plates, so this shows what detection + OCR manage alone
+            "raw": score(readings, KNOWN_PLATES, args.tolerance, video_sec, "raw"),
+        },
+        "readings": readings,
+    }
+
+    out_path = args.out
+    if out_path is None:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        name = f"{started:%Y%m%d_%H%M%S}_{args.mode}_{args.backend if args.mode == 'pipeline' else 'ocr'}.json"
+        out_path = os.path.join(BENCH_DIR, name)
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    acc = result["accuracy"]["final"]
+    print(f"[INFO] {cap.frames} frames in {wall:.1f}s: {result['fps']['decoded']:.1f} fps decoded, "
+          f"{result['fps']['processed']:.1f} fps processed, {result['fps']['realtime_factor']:.2f}x realtime")
+    for name, s in result["steps"].items():
+        print(f"  {name:<12} n={s['count']:<6} avg={s['avg_ms']:7.2f}ms p50={s['p50_ms']:7.2f}ms "
+              f"p95={s['p95_ms']:7.2f}ms p99={s['p99_ms']:7.2f}ms")
+    for name, s in result["latency"].items():
+        print(f"  {name:<16} p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms")
+    if result["peak_rss_mb"] is not None:
+        print(f"  peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"  plates: {acc['windows_hit']}/{acc['windows']} windows hit, "
+          f"{acc['correct_reads']}/{acc['reads']} reads correct")
+    print(f"[INFO] Results written to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
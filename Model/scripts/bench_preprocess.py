@@ -0,0 +1,147 @@
+# scripts/bench_preprocess.py
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import cv2
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from scripts.preprocess import RoiResizer
+from scripts.utils_ocr import _gray_resized
+from scripts.run_anpr import compute_roi
+
+IMGSZ = 640
+STRIDE = 32
+
+
+def pad_to_stride(img):
+    """What YOLO's letterbox still does after our resize (no resize of its own)."""
+    h, w = img.shape[:2]
+    dh = (STRIDE - h % STRIDE) % STRIDE
+    dw = (STRIDE - w % STRIDE) % STRIDE
+    return cv2.copyMakeBorder(img, 0, dh, 0, dw, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def letterbox(img):
+    """YOLO letterbox of an arbitrary-size image: resize long side to IMGSZ, pad to stride."""
+    h, w = img.shape[:2]
+    r = IMGSZ / float(max(h, w))
+    img = cv2.resize(img, (int(round(w * r)), int(round(h * r))), interpolation=cv2.INTER_LINEAR)
+    return pad_to_stride(img)
+
+
+def old_detect_prep(frame, box):
+    x1, y1, x2, y2 = box
+    roi = frame[y1:y2, x1:x2].copy()
+    roi_up = cv2.resize(roi, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
+    return letterbox(roi_up)
+
+
+def make_new_detect_prep():
+    resize = RoiResizer(IMGSZ)
+
+    def new_detect_prep(frame, box):
+        roi_in, _ = resize(frame, box)
+        return pad_to_stride(roi_in)
+    return new_detect_prep
+
+
+def old_ocr_prep(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    scale = 200.0 / max(h, w)
+    gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_LINEAR)
+    return cv2.GaussianBlur(gray, (3, 3), 0)
+
+
+def new_ocr_prep(crop):
+    h, w = crop.shape[:2]
+    scale = 200.0 / max(h, w)
+    gray = _gray_resized(crop, (int(w * scale), int(h * scale)))
+    cv2.GaussianBlur(gray, (3, 3), 0, dst=gray)
+    return gray
+
+
+def measure(fn, inputs, repeat):
+    """Return (ms per call, KiB allocated per call) over repeat passes of inputs."""
+    for args in inputs[:3]:
+        fn(*args)  # warm-up (first-call buffers, OpenCV init)
+
+    calls = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for args in inputs:
+            fn(*args)
+            calls += 1
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    allocated = 0
+    for args in inputs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        out = fn(*args)
+        allocated += tracemalloc.get_traced_memory()[1] - base
+        del out
+    tracemalloc.stop()
+
+    return elapsed * 1000.0 / calls, allocated / 1024.0 / len(inputs)
+
+
+def load_frames(source, count, width, height):
+    if source:
+        cap = cv2.VideoCapture(source)
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        if frames:
+            return frames
+        print(f"[WARN] Could not read {source}, using synthetic frames")
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ROI / OCR preprocessing (old vs new).")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Video file to take frames from (default: synthetic 1080p)")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, args.width, args.height)
+    H, W = frames[0].shape[:2]
+    box = compute_roi(H, W)
+    detect_inputs = [(f, box) for f in frames]
+
+    # Plate-sized crops from the middle of the ROI
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+    ocr_inputs = [(f[cy - 30:cy + 30, cx - 120:cx + 120],) for f in frames]
+
+    print(f"[INFO] {len(frames)} frames {W}x{H}, ROI {x2 - x1}x{y2 - y1}, repeat={args.repeat}")
+    rows = [
+        ("detect prep (old: copy + 2x cubic + letterbox)", old_detect_prep, detect_inputs),
+        ("detect prep (new: one resize into buffer)", make_new_detect_prep(), detect_inputs),
+        ("ocr prep (old)", old_ocr_prep, ocr_inputs),
+        ("ocr prep (new)", new_ocr_prep, ocr_inputs),
+    ]
+    for name, fn, inputs in rows:
+        ms, kib = measure(fn, inputs, args.repeat)
+        print(f"{name:<48} {ms:8.3f} ms/frame {kib:10.1f} KiB allocated/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# scripts/bulk_anpr.py
+
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DETECTOR_BACKEND,
+    DETECT_IMGSZ,
+    DETECTION_CONFIDENCE,
+    IOU_THRESHOLD,
+    DETECT_BATCH_SIZE,
+    DETECT_BATCH_MAX_WAIT_MS,
+    OCR_ROI_FALLBACK,
+    COOLDOWN_SECONDS,
+    CAMERA_ID,
+    CAMERA_MODE,
+    SNAPSHOT_DIR,
+    LOG_LEVEL,
+    BULK_SEGMENT_SEC,
+    BULK_OVERLAP_SEC,
+    BULK_WORKERS,
+    BULK_WORKER_THREADS,
+    BULK_VIDEO_EXTS,
+    RETENTION_DAYS,
+)
+from scripts import utils_ocr, run_anpr
+from scripts.run_anpr import hms_to_seconds, seconds_to_hms
+from scripts.capture import open_video
+from scripts.batch_infer import BatchedDetector
+from scripts.detector_backends import BACKENDS, load_detector
+from scripts.logging_setup import LEVELS, setup_logging
+from scripts.retention import cutoff_timestamp
+from registry import VehicleStatusCache, start_registry
+from log_writer import LogWriter
+
+# NVR / phone recordings usually carry their start time: 20250114_083000, 20250114-083000
+NAME_TIME = re.compile(r"(\d{8})[_-]?(\d{6})")
+
+log = logging.getLogger(__name__)
+
+# Per-process state of a pool worker (set by init_worker)
+_worker = {}
+
+
+class SegmentCapture:
+    """cv2.VideoCapture wrapper that ends after n_frames (0 = end of file)."""
+
+    def __init__(self, cap, n_frames=0):
+        self.cap = cap
+        self.n_frames = n_frames
+        self.frames = 0
+
+    def _done(self):
+        return self.n_frames and self.frames >= self.n_frames
+
+    def read(self):
+        if self._done():
+            return False, None
+        ret, frame = self.cap.read()
+        self.frames += ret
+        return ret, frame
+
+    def grab(self):
+        if self._done():
+            return False
+        ret = self.cap.grab()
+        self.frames += ret
+        return ret
+
+
+class SegmentCollector:
+    """Persist stage of a worker: keeps the readings for the parent to merge and log."""
+
+    def __init__(self):
+        self.readings = []
+
+    def __call__(self, item):
+        for det in item["readings"]:
+            self.readings.append({
+                "plate": det["plate"],
+                "raw": det["raw"],
+                "ts_str": det["ts_str"],
+                "det_conf": det["det_conf"],
+                "ocr_conf": det["ocr_conf"],
+                "quality": det.get("quality"),
+                "crop": det["crop"],
+                "fallback": det["fallback"],
+            })
+        return None
+
+
+def init_worker(backend, model_path, threads, log_level):
+    """
+    Pool initializer: every worker process loads its own detector and OCR
+    once. Inference is capped at threads per worker, so N workers use
+    about N x threads cores instead of all fighting over every core.
+    """
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)  # before torch is imported
+        cv2.setNumThreads(threads)
+    setup_logging(log_level)
+    _worker["model"] = load_detector(backend, model_path, threads=threads)
+    utils_ocr.warm_up_ocr(OCR_ROI_FALLBACK)
+    if threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    _worker["registry"] = start_registry()
+
+
+def process_segment(seg):
+    """
+    Run one segment through run_anpr's pipeline in this worker process.
+    Nothing is logged here: the readings go back to the parent, which
+    merges them across segments. Raises IOError if the file cannot be opened.
+    """
+    t0 = time.perf_counter()
+    cap = open_video(seg["path"])
+    if not cap.isOpened():
+        raise IOError(f"Cannot open {seg['path']}")
+    # Seeking (CAP_PROP_POS_FRAMES) lands on a keyframe with many codecs,
+    # shifting the segment's timestamps by up to a GOP. Decode from the start
+    # instead and drop every frame before the segment (grab: no conversion).
+    for _ in range(seg["start_frame"]):
+        if not cap.grab():
+            break
+    segment = SegmentCapture(cap, seg["n_frames"])
+
+    detector = BatchedDetector(
+        _worker["model"],
+        batch_size=DETECT_BATCH_SIZE,
+        max_wait_ms=DETECT_BATCH_MAX_WAIT_MS,
+        imgsz=DETECT_IMGSZ,
+        conf=DETECTION_CONFIDENCE,
+        iou=IOU_THRESHOLD,
+    )
+    collector = SegmentCollector()
+    # Nothing is live here, so no frame is ever dropped
+    pipeline = run_anpr.build_pipeline(segment, seg["fps"], detector, collector, 1, "block",
+                                       camera=seg["camera"], start_frame=seg["start_frame"])
+    pipeline.start()
+    pipeline.join()
+    detector.close()
+    cap.release()
+
+    return {
+        "readings": collector.readings,
+        "frames": segment.frames,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def list_videos(source):
+    """source itself, or every video file in the directory source (sorted by name)."""
+    if not os.path.isdir(source):
+        return [source]
+    return [os.path.join(source, name) for name in sorted(os.listdir(source))
+            if name.lower().endswith(BULK_VIDEO_EXTS)]
+
+
+def recording_start(path, duration_sec, start=None):
+    """
+    Wall-clock time of the first frame of path: start if given (ISO
+    string), else a YYYYmmdd_HHMMSS stamp in the file name, else the file's
+    modification time minus its duration (recorders write until the end).
+    """
+    if start:
+        return datetime.fromisoformat(start)
+    m = NAME_TIME.search(os.path.basename(path))
+    if m:
+        try:
+            return datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S")
+        except ValueError:
+            pass
+    log.warning("No start time in the name of %s; using its modification time", path)
+    return datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration_sec)
+
+
+def plan_segments(path, camera, segment_sec, overlap_sec, start=None):
+    """
+    Split one video into segments of segment_sec (each extended by
+    overlap_sec into the next, so a vehicle crossing a boundary is seen
+    whole at least once). Returns (segments, recording start, duration).
+    """
+    cap = open_video(path, decoder="opencv")
+    if not cap.isOpened():
+        log.error("Failed to open %s, skipped", path)
+        return [], None, 0.0
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    duration = total / fps
+    seg_frames = max(1, int(segment_sec * fps))
+    overlap_frames = int(overlap_sec * fps)
+    segments = []
+    if total <= 0:
+        # Unknown length (some streams/containers): one segment, read to the end
+        segments.append({"start_frame": 0, "n_frames": 0})
+    for start_frame in range(0, max(total, 0), seg_frames):
+        segments.append({
+            "start_frame": start_frame,
+            "n_frames": min(seg_frames + overlap_frames, total - start_frame),
+        })
+    for seg in segments:
+        seg.update({"path": path, "fps": fps, "camera": camera})
+    return segments, recording_start(path, duration, start), duration
+
+
+def merge_readings(readings, window):
+    """
+    Collapse reads of the same plate on the same camera within window
+    seconds of the first one (the segment overlap, or one vehicle read
+    twice) into one event at the first time, keeping the most confident read,
+    like the live Persister's cooldown. Returns the events in time order.
+    """
+    events = []
+    open_events = {}  # (camera_id, plate) -> event
+    for r in sorted(readings, key=lambda r: r["time"]):
+        key = (r["camera_id"], r["plate"])
+        event = open_events.get(key)
+        if event is not None and (r["time"] - event["time"]).total_seconds() < window:
+            if r["ocr_conf"] > event["reading"]["ocr_conf"]:
+                event["reading"] = r
+            event["reads"] += 1
+            continue
+        event = {"time": r["time"], "reading": r, "reads": 1}
+        open_events[key] = event
+        events.append(event)
+    return events
+
+
+def write_logs(events, camera, statuses, writer):
+    """Decide and log every event with its recording time (no gate hooks fire)."""
+    for event in events:
+        r = event["reading"]
+        plate = r["plate"]
+        decision = "blocked" if statuses.get_status(plate) == "blacklisted" else "allowed"
+        suffix = "_fallback" if r["fallback"] else ""
+        snapshot_name = f"{event['time'].strftime('%Y%m%d_%H%M%S')}_{plate}_{decision}{suffix}.jpg"
+        writer.log(plate, decision, r["det_conf"], r["ocr_conf"],
+                   os.path.join(SNAPSHOT_DIR, snapshot_name),
+                   camera["id"], camera["direction"], snapshot=r["crop"],
+                   timestamp=event["time"].isoformat(timespec="seconds"),
+                   quality=r["quality"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reprocess recorded video (a file or a folder of files) on a process pool.")
+    parser.add_argument("--source", required=True,
+                        help="Video file, or a folder of videos from one camera")
+    parser.add_argument("--start", default=None,
+                        help="Wall-clock time of the first frame, e.g. 2025-01-14T08:30:00 "
+                             "(single file; default: from the file name)")
+    parser.add_argument("--camera-id", default=CAMERA_ID)
+    parser.add_argument("--direction", choices=("entry", "exit"), default=CAMERA_MODE)
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS,
+                        help="Worker processes, each with its own model (0 = CPU cores)")
+    parser.add_argument("--threads", type=int, default=BULK_WORKER_THREADS,
+                        help="Inference threads per worker")
+    parser.add_argument("--segment-sec", type=float, default=BULK_SEGMENT_SEC)
+    parser.add_argument("--overlap-sec", type=float, default=BULK_OVERLAP_SEC)
+    parser.add_argument("--dedup-sec", type=float, default=COOLDOWN_SECONDS,
+                        help="Reads of one plate closer than this are one event")
+    parser.add_argument("--backend", choices=BACKENDS, default=DETECTOR_BACKEND)
+    parser.add_argument("--model", type=str, default=None)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only list the events; write no logs rows or snapshots")
+    parser.add_argument("--log-level", choices=LEVELS, default=LOG_LEVEL)
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    videos = list_videos(args.source)
+    if args.start and len(videos) > 1:
+        parser.error("--start only applies to a single video file")
+    if not videos:
+        log.error("No videos (%s) in %s", ', '.join(BULK_VIDEO_EXTS), args.source)
+        return
+
+    camera = run_anpr.default_camera()
+    camera.update({"id": args.camera_id, "direction": args.direction, "substream": None})
+
+    segments = []
+    starts = {}
+    total_sec = 0.0
+    for path in videos:
+        segs, start, duration = plan_segments(path, camera, args.segment_sec,
+                                              args.overlap_sec, args.start)
+        if segs:
+            segments += segs
+            starts[path] = start
+            total_sec += duration
+            log.info("%s: %s from %s, %s segment(s)", path, seconds_to_hms(duration), start, len(segs))
+    if not segments:
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+    workers = min(workers, len(segments))
+    log.info("Processing %s segment(s) of %s video on %s worker(s)",
+             len(segments), seconds_to_hms(total_sec), workers)
+
+    t0 = time.perf_counter()
+    readings = []
+    frames = 0
+    failed = 0
+    # spawn: workers must not inherit a forked copy of torch / OpenCV thread pools
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker,
+                             initargs=(args.backend, args.model, args.threads,
+                                       args.log_level)) as pool:
+        futures = {pool.submit(process_segment, seg): seg for seg in segments}
+        for done, fut in enumerate(as_completed(futures), 1):
+            seg = futures[fut]
+            where = f"{os.path.basename(seg['path'])}@{seconds_to_hms(seg['start_frame'] / seg['fps'])}"
+            try:
+                result = fut.result()
+            except Exception as e:
+                failed += 1
+                log.error("[%s/%s] %s failed: %s", done, len(segments), where, e)
+                continue
+            frames += result["frames"]
+            for r in result["readings"]:
+                r["camera_id"] = camera["id"]
+                r["time"] = starts[seg["path"]] + timedelta(seconds=hms_to_seconds(r["ts_str"]))
+            readings += result["readings"]
+            log.info("[%s/%s] %s: %s reads, %.1f fps", done, len(segments), where,
+                     len(result['readings']), result['frames'] / max(result['seconds'], 1e-9))
+
+    elapsed = time.perf_counter() - t0
+    events = merge_readings(readings, args.dedup_sec)
+    log.info("[STATS] %s frames in %.1fs (%.1f fps, %.1fx realtime); %s reads -> "
+             "%s events, %s failed segment(s)",
+             frames, elapsed, frames / max(elapsed, 1e-9), total_sec / max(elapsed, 1e-9),
+             len(readings), len(events), failed)
+
+    for event in events:
+        r = event["reading"]
+        log.info("[EVENT] %s %s (reads=%s, ocr_conf=%.2f)",
+                 event['time'].isoformat(timespec='seconds'), r['plate'], event['reads'],
+                 r['ocr_conf'])
+    cutoff = cutoff_timestamp(RETENTION_DAYS)
+    expired = sum(event["time"].isoformat(timespec="seconds") < cutoff for event in events)
+    if expired:
+        log.warning("%s event(s) are older than RETENTION_DAYS (%s days); the next "
+                    "retention run (scripts/retention.py) deletes them", expired, RETENTION_DAYS)
+    if args.dry_run or not events:
+        return
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    statuses = VehicleStatusCache().start()
+    writer = LogWriter().start()
+    write_logs(events, camera, statuses, writer)
+    writer.close()
+    statuses.stop()
+    log.info("[STATS] Logs: rows=%s batches=%s", writer.rows_written, writer.batches)
+
+
+if __name__ == "__main__":
+    main()
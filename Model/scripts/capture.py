@@ -0,0 +1,298 @@
+# scripts/capture.py
+
+import logging
+import threading
+from collections import deque
+
+import cv2
+
+from config import (
+    LIVE_BUFFER_SIZE,
+    RECONNECT_MIN_SEC,
+    RECONNECT_MAX_SEC,
+    CAPTURE_TIMEOUT_SEC,
+    VIDEO_DECODER,
+    VIDEO_HW_ACCEL,
+)
+from scripts.metrics import CAPTURE_DROPPED, CAPTURE_RECONNECTS
+
+log = logging.getLogger(__name__)
+
+LIVE_PREFIXES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://", "/dev/video")
+DECODERS = ("opencv", "pyav")
+
+
+def is_live_source(source):
+    """Camera index or network/device stream (as opposed to a video file)."""
+    if isinstance(source, int):
+        return True
+    source = str(source)
+    return source.isdigit() or source.lower().startswith(LIVE_PREFIXES)
+
+
+class PyAVCapture:
+    """
+    FFmpeg decoding through PyAV with the cv2.VideoCapture interface
+    (read / grab / retrieve / get / isOpened / release).
+
+    grab() decodes the next frame but leaves it in FFmpeg's YUV layout;
+    only retrieve() converts it to BGR, and with width set it converts
+    straight to that width (one swscale pass), which is far cheaper than
+    a full-size BGR frame plus cv2.resize.
+    """
+
+    def __init__(self, source, width=None, timeout_sec=CAPTURE_TIMEOUT_SEC):
+        import av
+        self._av = av
+        self.width = width
+        self._frame = None
+        self.container = None
+        options = {}
+        if str(source).lower().startswith("rtsp"):
+            options["rtsp_transport"] = "tcp"
+        try:
+            self.container = av.open(str(source), options=options, timeout=timeout_sec or None)
+        except av.error.FFmpegError as e:
+            log.warning("PyAV could not open %s: %s", source, e)
+            return
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # frame + slice threads
+        self._decoder = self.container.decode(self.stream)
+
+    def isOpened(self):
+        return self.container is not None
+
+    def grab(self):
+        if self.container is None:
+            return False
+        try:
+            self._frame = next(self._decoder)
+        except (StopIteration, self._av.error.FFmpegError):
+            self._frame = None
+            return False
+        return True
+
+    def retrieve(self):
+        frame = self._frame
+        if frame is None:
+            return False, None
+        if self.width and frame.width > self.width:
+            height = int(round(frame.height * self.width / float(frame.width))) // 2 * 2
+            frame = frame.reformat(width=self.width, height=height, format="bgr24",
+                                   interpolation="FAST_BILINEAR")
+            return True, frame.to_ndarray()
+        return True, frame.to_ndarray(format="bgr24")
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        if self.container is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0.0)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.stream.codec_context.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.stream.codec_context.height)
+        return 0.0
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def open_video(source, timeout_sec=CAPTURE_TIMEOUT_SEC, width=None, decoder=VIDEO_DECODER):
+    """
+    Open source with the configured decoder. For OpenCV: open/read
+    timeouts where the backend supports them (so a dead network stream
+    fails instead of blocking forever) and hardware decoding if enabled.
+    width only applies to pyav (frames converted to that width).
+    """
+    if decoder == "pyav" and not (isinstance(source, int) or str(source).isdigit()):
+        return PyAVCapture(source, width, timeout_sec)
+
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    params = []
+    open_prop = getattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC", None)
+    read_prop = getattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC", None)
+    if timeout_sec and not isinstance(source, int) and open_prop is not None:
+        params += [open_prop, int(timeout_sec * 1000), read_prop, int(timeout_sec * 1000)]
+    hw_prop = getattr(cv2, "CAP_PROP_HW_ACCELERATION", None)
+    if VIDEO_HW_ACCEL and not isinstance(source, int) and hw_prop is not None:
+        params += [hw_prop, cv2.VIDEO_ACCELERATION_ANY]
+    cap = cv2.VideoCapture(source, cv2.CAP_ANY, params) if params else cv2.VideoCapture(source)
+    # Ask the backend not to queue frames itself (ignored by most, helps V4L2/DirectShow)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class LatestFrameGrabber:
+    """
+    Decodes a live source on its own thread and keeps only the newest
+    buffer_size frames, so read() never hands out a frame that has been
+    waiting in the decoder while processing was busy. Frames that are
+    replaced before anyone reads them are counted in dropped.
+
+    With buffer_size 1 every frame is grabbed (decoded) but only converted
+    to BGR while a reader is waiting for it, so frames nobody will look at
+    never pay for the conversion.
+
+    When the stream fails, the grabber reopens it with exponential backoff
+    (RECONNECT_MIN_SEC .. RECONNECT_MAX_SEC); read() simply waits meanwhile.
+    It stands in for cv2.VideoCapture in the capture loops: read(), get(),
+    isOpened() and release().
+    """
+
+    def __init__(self, source, camera_id="cam", buffer_size=LIVE_BUFFER_SIZE,
+                 reconnect_min=RECONNECT_MIN_SEC, reconnect_max=RECONNECT_MAX_SEC,
+                 width=None):
+        self.source = source
+        self.camera_id = camera_id
+        self.width = width
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.fps = 0.0
+        self.decoded = 0      # frames decoded, including dropped ones
+        self.frame_seq = 0    # decoded count at the frame last returned by read()
+        self.dropped = 0
+        self.reconnects = 0
+        self._frames = deque(maxlen=max(1, int(buffer_size)))
+        self._lazy = self._frames.maxlen == 1
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._cap = None
+        self._opened = False
+        self._thread = None
+        self._dropped_metric = CAPTURE_DROPPED.labels(camera_id)
+        self._reconnect_metric = CAPTURE_RECONNECTS.labels(camera_id)
+
+    def _open(self):
+        cap = open_video(self.source, width=self.width)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        self._cap = cap
+        self.fps = self.fps or cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return True
+
+    def start(self):
+        """Open the source and start decoding; check isOpened() afterwards."""
+        self._opened = self._open()
+        if self._opened:
+            self._thread = threading.Thread(target=self._run, name=f"grab-{self.camera_id}",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        cap = self._cap
+        return cap.get(prop) if cap is not None else 0.0
+
+    def _reconnect(self):
+        backoff = self.reconnect_min
+        while not self._stop.is_set():
+            if self._stop.wait(backoff):
+                return False
+            self.reconnects += 1
+            self._reconnect_metric.inc()
+            if self._open():
+                log.info("[%s] Reconnected to %s", self.camera_id, self.source)
+                return True
+            log.warning("[%s] Reconnect failed, retrying in %.0fs",
+                        self.camera_id, min(backoff * 2, self.reconnect_max))
+            backoff = min(backoff * 2, self.reconnect_max)
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._cap.grab():
+                if self._stop.is_set():
+                    break
+                log.warning("[%s] Stream lost, reconnecting", self.camera_id)
+                self._cap.release()
+                self._cap = None
+                if not self._reconnect():
+                    break
+                continue
+
+            self.decoded += 1
+            if self._lazy and not self._waiting:
+                # Nobody is waiting: the next grab replaces it, so skip the BGR conversion
+                self.dropped += 1
+                self._dropped_metric.inc()
+                continue
+            ret, frame = self._cap.retrieve()
+            if not ret:
+                continue
+
+            with self._cond:
+                if len(self._frames) == self._frames.maxlen:
+                    self.dropped += 1
+                    self._dropped_metric.inc()
+                self._frames.append((self.decoded, frame))
+                self._cond.notify()
+
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def read(self):
+        """
+        Oldest frame still buffered (the newest one when buffer_size is 1),
+        waiting for the next one if none is. (False, None) once released.
+        """
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._frames:
+                    if self._stop.is_set() or self._thread is None or not self._thread.is_alive():
+                        return False, None
+                    self._cond.wait(0.5)
+                self.frame_seq, frame = self._frames.popleft()
+            finally:
+                self._waiting -= 1
+        return True, frame
+
+    def release(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            # The grab thread releases the capture itself once its read() returns
+            self._thread.join(timeout=CAPTURE_TIMEOUT_SEC + 1.0)
+        elif self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        if self.decoded:
+            log.info("[%s] Grabber: decoded %s, dropped %s stale frames, %s reconnect attempts",
+                     self.camera_id, self.decoded, self.dropped, self.reconnects)
+
+
+def open_source(source, camera_id="cam", width=None):
+    """
+    Open a camera/stream behind a LatestFrameGrabber, or a video file
+    directly (files are read in full, at whatever speed processing runs).
+    width: convert frames to this width (pyav decoder only).
+    Returns (cap, fps), or (None, 0.0) if it cannot be opened.
+    """
+    if is_live_source(source):
+        cap = LatestFrameGrabber(source, camera_id, width=width).start()
+    else:
+        cap = open_video(source, width=width)
+    if not cap.isOpened():
+        cap.release()
+        return None, 0.0
+    return cap, cap.get(cv2.CAP_PROP_FPS) or 30.0
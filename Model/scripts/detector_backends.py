@@ -0,0 +1,213 @@
+# scripts/detector_backends.py
+
+import os
+import logging
+
+import cv2
+import numpy as np
+
+from config import (
+    MODEL_PATH,
+    ONNX_MODEL_PATH,
+    OPENVINO_MODEL_PATH,
+    ONNX_PROVIDERS,
+    DETECTOR_THREADS,
+)
+from scripts.batch_infer import boxes_from_result
+
+BACKENDS = ("ultralytics", "onnxruntime", "openvino")
+PAD_VALUE = 114  # YOLO letterbox gray
+STRIDE = 32
+
+log = logging.getLogger(__name__)
+
+
+def letterbox_batch(images, imgsz, out=None, rect=False):
+    """
+    Pack BGR images into one float32 NCHW RGB blob.
+
+    Each image is scaled so its long side fits imgsz (ROIs from RoiResizer
+    already do, so this is only a copy) and placed at the top-left corner,
+    so model coords / ratio = image coords. The blob is imgsz x imgsz, or
+    with rect (models exported with dynamic H/W) only as large as the batch
+    needs, rounded up to the stride: a 640x396 ROI then costs 640x416, not
+    640x640. out is a blob from an earlier call, reused when the shape
+    matches. Returns (blob, ratios).
+    """
+    resized = []
+    ratios = []
+    for img in images:
+        h, w = img.shape[:2]
+        r = min(imgsz / float(h), imgsz / float(w))
+        if r != 1.0:
+            img = cv2.resize(img, (max(1, int(round(w * r))), max(1, int(round(h * r)))),
+                             interpolation=cv2.INTER_LINEAR)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        resized.append(img)
+        ratios.append(r)
+
+    if rect:
+        bh = -(-max(img.shape[0] for img in resized) // STRIDE) * STRIDE
+        bw = -(-max(img.shape[1] for img in resized) // STRIDE) * STRIDE
+    else:
+        bh = bw = imgsz
+    shape = (len(images), 3, bh, bw)
+    if out is None or out.shape != shape:
+        out = np.empty(shape, dtype=np.float32)
+    out.fill(PAD_VALUE / 255.0)
+
+    for i, img in enumerate(resized):
+        nh, nw = img.shape[:2]
+        # HWC BGR uint8 -> CHW RGB float in [0, 1]
+        np.multiply(img[:, :, ::-1].transpose(2, 0, 1), 1.0 / 255.0,
+                    out=out[i, :, :nh, :nw], casting="unsafe")
+    return out, ratios
+
+
+def postprocess(pred, ratio, conf, iou):
+    """
+    Decode one YOLOv8 output (4 + num_classes, N) into [(x1, y1, x2, y2, conf)]
+    in the original image coordinates, after class-agnostic NMS.
+    """
+    pred = pred.T
+    scores = pred[:, 4:].max(axis=1)
+    keep = scores >= conf
+    if not np.any(keep):
+        return []
+    pred = pred[keep]
+    scores = scores[keep]
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    xywh = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+    idx = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf, iou)
+    if len(idx) == 0:
+        return []
+
+    boxes = []
+    for i in np.asarray(idx).reshape(-1):
+        x, y, bw, bh = xywh[i] / ratio
+        boxes.append((float(x), float(y), float(x + bw), float(y + bh), float(scores[i])))
+    return boxes
+
+
+class UltralyticsDetector:
+    """The PyTorch checkpoint through ultralytics.YOLO (training-time default)."""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def detect_batch(self, images, imgsz, conf, iou):
+        results = self.model.predict(
+            images,
+            imgsz=imgsz,
+            conf=conf,
+            iou=iou,
+            verbose=False
+        )
+        return [boxes_from_result(r) for r in results]
+
+
+class _ExportedDetector:
+    """Shared pre/post-processing for exported (ONNX / OpenVINO IR) YOLOv8 models."""
+
+    def __init__(self):
+        self._blob = None
+        self.dynamic_batch = True
+        self.dynamic_shape = False
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def detect_batch(self, images, imgsz, conf, iou):
+        if not self.dynamic_batch and len(images) > 1:
+            out = []
+            for img in images:
+                out.extend(self.detect_batch([img], imgsz, conf, iou))
+            return out
+        self._blob, ratios = letterbox_batch(images, imgsz, self._blob, rect=self.dynamic_shape)
+        preds = self._infer(self._blob)
+        return [postprocess(preds[i], ratios[i], conf, iou) for i in range(len(images))]
+
+
+class OnnxRuntimeDetector(_ExportedDetector):
+    """ONNX model on ONNX Runtime; providers e.g. CPUExecutionProvider or OpenVINOExecutionProvider."""
+
+    name = "onnxruntime"
+
+    def __init__(self, model_path, providers=("CPUExecutionProvider",), threads=0):
+        super().__init__()
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        available = ort.get_available_providers()
+        providers = [p for p in providers if p in available] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(model_path, opts, providers=providers)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+        self.dynamic_shape = not all(isinstance(d, int) for d in inp.shape[2:])
+        log.info("ONNX Runtime providers: %s", self.session.get_providers())
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(_ExportedDetector):
+    """ONNX or OpenVINO IR (.xml) model compiled for the OpenVINO CPU plugin."""
+
+    name = "openvino"
+
+    def __init__(self, model_path, threads=0):
+        super().__init__()
+        import openvino as ov
+        core = ov.Core()
+        model = core.read_model(model_path)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+        shape = self.compiled.input(0).get_partial_shape()
+        self.dynamic_batch = shape[0].is_dynamic
+        self.dynamic_shape = shape[2].is_dynamic or shape[3].is_dynamic
+
+    def _infer(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+DEFAULT_MODEL_PATHS = {
+    "ultralytics": MODEL_PATH,
+    "onnxruntime": ONNX_MODEL_PATH,
+    "openvino": OPENVINO_MODEL_PATH,
+}
+
+
+def load_detector(backend, model_path=None, providers=ONNX_PROVIDERS, threads=DETECTOR_THREADS):
+    """
+    Build the detector for backend (one of BACKENDS). model_path is the
+    .pt file for ultralytics, the .onnx file for onnxruntime and the .onnx or
+    .xml file for openvino (default: the matching path from config.py).
+    Without a trained .pt, ultralytics falls back to the stock yolov8n.pt.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend} (choose from {BACKENDS})")
+    model_path = model_path or DEFAULT_MODEL_PATHS[backend]
+    if not os.path.exists(model_path):
+        if backend == "ultralytics":
+            model_path = "yolov8n.pt"
+        else:
+            raise FileNotFoundError(
+                f"{model_path} not found; run scripts/export_detector.py first")
+
+    log.info("Loading %s detector from: %s", backend, model_path)
+    if backend == "ultralytics":
+        return UltralyticsDetector(model_path)
+    if backend == "onnxruntime":
+        return OnnxRuntimeDetector(model_path, providers, threads)
+    return OpenVinoDetector(model_path, threads)
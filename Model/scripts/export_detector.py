@@ -0,0 +1,148 @@
+# scripts/export_detector.py
+
+import os
+import sys
+import glob
+import shutil
+import argparse
+
+import cv2
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DATA_YAML,
+    MODEL_PATH,
+    ONNX_MODEL_PATH,
+    ONNX_INT8_MODEL_PATH,
+    OPENVINO_MODEL_PATH,
+    DETECT_IMGSZ,
+)
+from scripts.detector_backends import letterbox_batch
+
+CALIB_IMAGES_DIR = os.path.join(os.path.dirname(DATA_YAML), "images", "val")
+# val split list written by scripts/prepare_dataset.py (used when present)
+CALIB_LIST = os.path.join(os.path.dirname(DATA_YAML), "val.txt")
+
+
+def calibration_paths(calib_dir):
+    """Images of calib_dir, or of the val.txt image list when calib_dir is the default and it exists."""
+    if calib_dir == CALIB_IMAGES_DIR and os.path.exists(CALIB_LIST):
+        base = os.path.dirname(CALIB_LIST)
+        with open(CALIB_LIST, "r", encoding="utf-8") as f:
+            return [os.path.join(base, line.strip()[2:]) if line.startswith("./") else line.strip()
+                    for line in f if line.strip()]
+    return sorted(glob.glob(os.path.join(calib_dir, "*.jpg")) +
+                  glob.glob(os.path.join(calib_dir, "*.png")))
+
+
+def export_onnx(weights, imgsz, out_path):
+    """Export the .pt checkpoint to ONNX with dynamic batch and H/W (for rect batches)."""
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True, opset=12)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    if os.path.abspath(exported) != os.path.abspath(out_path):
+        shutil.move(exported, out_path)
+    print(f"[INFO] ONNX model written to {out_path}")
+    return out_path
+
+
+def export_openvino(weights, imgsz, out_path, int8=False):
+    """Export to OpenVINO IR; int8 runs NNCF post-training quantization on DATA_YAML."""
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+    if int8:
+        kwargs.update(int8=True, data=DATA_YAML)
+    exported_dir = model.export(**kwargs)
+    out_dir = os.path.dirname(out_path)
+    if os.path.abspath(exported_dir) != os.path.abspath(out_dir):
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        shutil.move(exported_dir, out_dir)
+    print(f"[INFO] OpenVINO model written to {out_dir}")
+    return out_path
+
+
+class _CalibrationReader:
+    """Feeds preprocessed validation images to onnxruntime's static quantizer."""
+
+    def __init__(self, input_name, paths, imgsz):
+        self.input_name = input_name
+        self.paths = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.paths:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            blob, _ = letterbox_batch([img], self.imgsz)
+            return {self.input_name: blob.copy()}
+        return None
+
+
+def quantize_onnx(fp32_path, out_path, imgsz, calib_dir=CALIB_IMAGES_DIR, calib_count=200):
+    """
+    Static INT8 quantization (QDQ, per-channel weights) calibrated on real
+    plate images. Check detection accuracy on the val set before deploying:
+    INT8 trades a little mAP for speed.
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    paths = calibration_paths(calib_dir)[:calib_count]
+    if not paths:
+        raise FileNotFoundError(f"No calibration images in {calib_dir}")
+
+    prep_path = fp32_path.replace(".onnx", "-prep.onnx")
+    quant_pre_process(fp32_path, prep_path)
+    input_name = ort.InferenceSession(prep_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    quantize_static(
+        prep_path,
+        out_path,
+        _CalibrationReader(input_name, paths, imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    os.remove(prep_path)
+    print(f"[INFO] INT8 ONNX model written to {out_path} ({len(paths)} calibration images)")
+    return out_path
+
+
+def file_size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(f) for f in glob.glob(os.path.join(path, "*"))) / 1e6
+    return os.path.getsize(path) / 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the plate detector for ONNX Runtime / OpenVINO.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="Trained .pt checkpoint")
+    parser.add_argument("--imgsz", type=int, default=DETECT_IMGSZ)
+    parser.add_argument("--int8", action="store_true",
+                        help="Also write an INT8 model (calibrated on the val images)")
+    parser.add_argument("--openvino", action="store_true",
+                        help="Also write an OpenVINO IR model")
+    parser.add_argument("--calib-dir", default=CALIB_IMAGES_DIR)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        print(f"[ERROR] {args.weights} not found; train first (scripts/train_detector.py)")
+        sys.exit(1)
+
+    outputs = [args.weights, export_onnx(args.weights, args.imgsz, ONNX_MODEL_PATH)]
+    if args.int8:
+        outputs.append(quantize_onnx(ONNX_MODEL_PATH, ONNX_INT8_MODEL_PATH, args.imgsz, args.calib_dir))
+    if args.openvino:
+        outputs.append(os.path.dirname(export_openvino(args.weights, args.imgsz,
+                                                       OPENVINO_MODEL_PATH, args.int8)))
+
+    for path in outputs:
+        print(f"  {path}: {file_size_mb(path):.1f} MB")
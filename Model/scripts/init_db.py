@@ -10,12 +10,21 @@ ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from config import DB_PATH
+from datastore import migrate_logs, ensure_vehicles_version
 
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
 
+    # Must be set before the first table exists; lets retention.py give
+    # freed pages back with PRAGMA incremental_vacuum instead of a full VACUUM
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    # WAL is stored in the database file, so every later connection uses it:
+    # the dashboard and status cache can read while the log writer commits
+    c.execute("PRAGMA journal_mode=WAL")
+
     # Vehicles table
     c.execute("""
         CREATE TABLE IF NOT EXISTS vehicles (
@@ -37,11 +46,18 @@ def init_db():
             camera_id TEXT,
             detection_conf REAL,
             ocr_conf REAL,
+            quality REAL,                    -- crop quality score (scripts/quality.py)
             image_path TEXT,
             decision TEXT NOT NULL           -- allowed, blocked, manual
         );
     """)
 
+    migrate_logs(conn)
+    ensure_vehicles_version(conn)
+
+    # Retention deletes and dashboard queries both range over timestamp
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+
     conn.commit()
     conn.close()
     print(f"Database initialized at {DB_PATH}")
@@ -0,0 +1,20 @@
+# scripts/logging_setup.py
+
+import logging
+
+from config import LOG_LEVEL
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+def setup_logging(level=LOG_LEVEL):
+    """
+    Leveled console logging in the scripts' usual "[LEVEL] message" form.
+    DEBUG adds the per-frame / per-track lines; WARNING keeps only problems.
+    """
+    logging.addLevelName(logging.WARNING, "WARN")
+    logging.basicConfig(
+        level=getattr(logging, str(level).upper(), logging.INFO),
+        format="[%(levelname)s] %(message)s",
+        force=True,
+    )
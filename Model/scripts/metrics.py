@@ -0,0 +1,275 @@
+# scripts/metrics.py
+
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = logging.getLogger(__name__)
+
+
+def _format_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Value:
+    """One counter/gauge series. A function set with set_function is read at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._fn = None
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def get(self):
+        if self._fn is not None:
+            return float(self._fn())
+        with self._lock:
+            return self._value
+
+    def samples(self, name, labels):
+        yield name, labels, self.get()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            yield f"{name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, cumulative
+
+
+class Metric:
+    """
+    A named metric with optional labels. Without labels the metric itself
+    has the value methods (inc/set/observe); with labels, call
+    labels(*values) to get the series for those values (created on first use).
+    """
+
+    def __init__(self, kind, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+        if not self.labelnames:
+            self._default = self._new()
+            self._series[()] = self._default
+
+    def _new(self):
+        if self.kind == "histogram":
+            return _HistogramValue(self.buckets)
+        return _Value()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new())
+        return series
+
+    def remove(self, *values):
+        with self._lock:
+            self._series.pop(tuple(str(v) for v in values), None)
+
+    def _unlabelled(self):
+        if not self.labelnames:
+            return self._default
+        raise ValueError(f"{self.name} has labels {self.labelnames}; use labels()")
+
+    def inc(self, amount=1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._unlabelled().dec(amount)
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def set_function(self, fn):
+        self._unlabelled().set_function(fn)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            labels = tuple(zip(self.labelnames, key))
+            for name, sample_labels, v in value.samples(self.name, labels):
+                lines.append(f"{name}{_format_labels(sample_labels)} {_format_value(v)}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, kind, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, help_text, labelnames, **kwargs)
+            elif metric.kind != kind:
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get("counter", name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get("gauge", name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get("histogram", name, help_text, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # a failing gauge function must not break the scrape
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline metrics shared by run_anpr.py, anpr_daemon.py and run_realtime.py
+FRAMES_READ = REGISTRY.counter(
+    "anpr_frames_read_total", "Frames decoded from the source", ["camera"])
+FRAMES_SKIPPED = REGISTRY.counter(
+    "anpr_frames_skipped_total", "Frames dropped by the motion gate / frame skip", ["camera"])
+FRAMES_PROCESSED = REGISTRY.counter(
+    "anpr_frames_processed_total", "Frames sent on to detection (or OCR in run_realtime)", ["camera"])
+CAPTURE_DROPPED = REGISTRY.counter(
+    "anpr_capture_dropped_total", "Live frames replaced by a newer one before processing", ["camera"])
+CAPTURE_RECONNECTS = REGISTRY.counter(
+    "anpr_capture_reconnects_total", "Attempts to reopen a lost live stream", ["camera"])
+DETECTIONS = REGISTRY.counter(
+    "anpr_detections_total", "Plate boxes returned by the detector", ["camera"])
+OCR_CALLS = REGISTRY.counter(
+    "anpr_ocr_calls_total", "OCR recognizer calls (track = batched crops, fallback = whole ROI)", ["kind"])
+DECISIONS = REGISTRY.counter(
+    "anpr_decisions_total", "Gate decisions logged", ["decision"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "anpr_stage_seconds", "Time a pipeline stage spends on one item", ["stage"])
+STEP_SECONDS = REGISTRY.histogram(
+    "anpr_step_seconds", "Time of one step inside a stage (decode, preprocess, detect, ocr, correct)", ["step"])
+QUEUE_DEPTH = REGISTRY.gauge(
+    "anpr_queue_depth", "Items waiting in a pipeline queue", ["queue"])
+QUEUE_DROPPED = REGISTRY.counter(
+    "anpr_queue_dropped_total", "Items dropped by a full pipeline queue", ["queue"])
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "anpr_db_write_seconds", "Insert + commit of one batch of logs rows")
+DB_ROWS = REGISTRY.counter(
+    "anpr_db_rows_total", "Logs rows written")
+LOG_QUEUE_DEPTH = REGISTRY.gauge(
+    "anpr_log_queue_depth", "Logs rows waiting for the writer thread")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # no line per scrape
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Serve registry on http://host:port/metrics from a daemon thread.
+    Binds to localhost by default; returns the server (call shutdown() to stop).
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """start_metrics_server for the detector scripts: None when off (port 0) or the port is taken."""
+    if not port:
+        return None
+    try:
+        server = start_metrics_server(port, host)
+    except OSError as e:
+        log.warning("Metrics endpoint not started on %s:%s (%s)", host, port, e)
+        return None
+    log.info("Metrics on http://%s:%s/metrics", host, port)
+    return server
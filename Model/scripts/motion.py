@@ -0,0 +1,72 @@
+# scripts/motion.py
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap activity check that decides which frames are worth running YOLO on.
+
+    The ROI is shrunk to `width` pixels wide, converted to gray and compared
+    with a slowly updated background (running average). If more than
+    `min_area` of the pixels changed by `pixel_threshold` or more, the scene
+    is active: every `active_skip`-th frame is processed, and this continues
+    for `hold_sec` after the motion stops so the last frames of a passing
+    vehicle are not lost. An idle scene only gets a heartbeat frame every
+    `idle_skip` frames, which still ends open tracks and catches a vehicle
+    that was already standing there at startup.
+
+    A vehicle that stops fades into the background after roughly 1/bg_alpha
+    frames, so a parked car does not keep detection running.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_area=0.01, bg_alpha=0.05,
+                 hold_sec=1.0, idle_skip=15, active_skip=1):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.bg_alpha = bg_alpha
+        self.hold_sec = hold_sec
+        self.idle_skip = max(1, int(idle_skip))
+        self.active_skip = max(1, int(active_skip))
+
+        self.background = None
+        self.active_until = -1.0
+        self.since_processed = 0
+        self.frames = 0
+        self.processed = 0
+
+    def _small_gray(self, roi):
+        h, w = roi.shape[:2]
+        scale = self.width / float(w) if w > self.width else 1.0
+        small = cv2.resize(roi, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion_fraction(self, roi):
+        """Fraction of ROI pixels that differ from the background (0.0 on the first frame)."""
+        gray = self._small_gray(roi)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            return 0.0
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        changed = np.count_nonzero(diff >= self.pixel_threshold) / float(diff.size)
+        cv2.accumulateWeighted(gray, self.background, self.bg_alpha)
+        return changed
+
+    def should_process(self, roi, t):
+        """Update the gate with the ROI of the frame at stream time t; True if it should be detected."""
+        self.frames += 1
+        if self.motion_fraction(roi) >= self.min_area:
+            self.active_until = t + self.hold_sec
+
+        skip = self.active_skip if t <= self.active_until else self.idle_skip
+        self.since_processed += 1
+        if self.since_processed < skip:
+            return False
+        self.since_processed = 0
+        self.processed += 1
+        return True
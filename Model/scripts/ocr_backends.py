@@ -0,0 +1,100 @@
+# scripts/ocr_backends.py
+
+import cv2
+import numpy as np
+
+OCR_BACKENDS = ("easyocr", "crnn")
+
+# CTC classes: 0 is the blank, then the plate characters
+CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+BLANK = 0
+
+# Crops narrower than this (w/h) are treated as two-row plates (bikes/scooters)
+TWO_ROW_ASPECT = 2.5
+
+
+def split_two_row(img):
+    """Lay the halves of a two-row plate side by side so it reads as one line."""
+    h, w = img.shape[:2]
+    if w < TWO_ROW_ASPECT * h:
+        half = h // 2
+        img = np.hstack([img[:half], img[h - half:]])
+    return img
+
+
+def prepare_plate(img_bgr, height, width):
+    """
+    Plate crop -> float32 height x width image in [0, 1] for the CRNN.
+    Aspect ratio is kept; the right side is padded by repeating the last
+    column. Training (scripts/train_ocr.py) uses this same function.
+    """
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
+    gray = split_two_row(gray)
+    h, w = gray.shape
+    new_w = max(1, min(width, int(round(w * height / float(h)))))
+    gray = cv2.resize(gray, (new_w, height), interpolation=cv2.INTER_LINEAR)
+    if new_w < width:
+        gray = cv2.copyMakeBorder(gray, 0, 0, 0, width - new_w, cv2.BORDER_REPLICATE)
+    return gray.astype(np.float32) / 255.0
+
+
+def ctc_greedy_decode(logits):
+    """
+    Best-path CTC decoding of one (T, C) logit matrix. Returns (text, conf)
+    where conf is the mean probability of the emitted characters.
+    """
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs = e / e.sum(axis=1, keepdims=True)
+    best = probs.argmax(axis=1)
+
+    chars = []
+    confs = []
+    prev = BLANK
+    for t, k in enumerate(best):
+        if k != BLANK and k != prev:
+            chars.append(CHARSET[k - 1])
+            confs.append(probs[t, k])
+        prev = k
+    if not chars:
+        return "", 0.0
+    return "".join(chars), float(np.mean(confs))
+
+
+class CrnnRecognizer:
+    """
+    Compact CRNN/CTC plate reader (scripts/train_ocr.py) on ONNX Runtime.
+
+    YOLO has already cut out the plate, so there is no text detection step:
+    every crop is one fixed-size line and the whole batch is one session run.
+    """
+
+    def __init__(self, model_path, height=32, width=160,
+                 providers=("CPUExecutionProvider",), threads=0):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        available = ort.get_available_providers()
+        providers = [p for p in providers if p in available] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(model_path, opts, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.height = height
+        self.width = width
+
+    def read_batch(self, crops):
+        """Raw (text, conf) per crop, uncleaned; ("", 0.0) for empty crops."""
+        out = [("", 0.0)] * len(crops)
+        index = [i for i, c in enumerate(crops)
+                 if c is not None and c.size and min(c.shape[:2]) >= 4]
+        if not index:
+            return out
+
+        batch = np.empty((len(index), 1, self.height, self.width), dtype=np.float32)
+        for k, i in enumerate(index):
+            batch[k, 0] = prepare_plate(crops[i], self.height, self.width)
+
+        logits = self.session.run(None, {self.input_name: batch})[0]  # (N, T, C)
+        for k, i in enumerate(index):
+            out[i] = ctc_greedy_decode(logits[k])
+        return out
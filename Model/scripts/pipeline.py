@@ -0,0 +1,396 @@
+# scripts/pipeline.py
+
+import math
+import queue
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from scripts.metrics import QUEUE_DEPTH, QUEUE_DROPPED, STAGE_SECONDS, STEP_SECONDS
+
+log = logging.getLogger(__name__)
+
+# Drop policies for a full queue:
+#   block       -> producer waits (nothing lost, upstream slows down)
+#   drop_oldest -> evict the oldest queued item (keeps latency bounded)
+#   drop_newest -> discard the item being put
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Sentinel passed down the pipeline to shut stages down in order
+STOP = object()
+
+# Most recent latencies kept per stage for percentiles
+LATENCY_SAMPLES = 10000
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class StageQueue:
+    """
+    Bounded queue between two pipeline stages with a configurable drop policy.
+    """
+
+    def __init__(self, name, maxsize, drop_policy="drop_oldest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.name = name
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._q = queue.Queue(maxsize=max(1, int(maxsize)))
+        QUEUE_DEPTH.labels(name).set_function(self.depth)
+        QUEUE_DROPPED.labels(name).set_function(lambda: self.dropped)
+
+    def put(self, item, force=False):
+        """
+        Put an item according to the drop policy.
+        force=True always blocks (used for STOP so shutdown is never dropped).
+        Returns False if the item itself was dropped.
+        """
+        if force or self.drop_policy == "block":
+            self._q.put(item)
+            return True
+
+        while True:
+            try:
+                self._q.put_nowait(item)
+                return True
+            except queue.Full:
+                if self.drop_policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                try:
+                    old = self._q.get_nowait()
+                except queue.Empty:
+                    continue
+                if old is STOP:
+                    # Never evict the shutdown marker
+                    self._q.put(old)
+                    self.dropped += 1
+                    return False
+                self.dropped += 1
+
+    def get(self, timeout=None):
+        return self._q.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self._q.get_nowait()
+
+    def depth(self):
+        return self._q.qsize()
+
+
+class StageStats:
+    """
+    Thread-safe item count and latency counters for one stage, plus the
+    last LATENCY_SAMPLES latencies for p50/p95/p99. histogram (a metrics
+    series) also gets every latency, for /metrics.
+    """
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self._samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total_sec += seconds
+            if seconds > self.max_sec:
+                self.max_sec = seconds
+            self._samples.append(seconds)
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.total_sec / self.count if self.count else 0.0
+            samples = sorted(self._samples)
+            return {
+                "count": self.count,
+                "avg_ms": avg * 1000.0,
+                "max_ms": self.max_sec * 1000.0,
+                "p50_ms": percentile(samples, 50) * 1000.0,
+                "p95_ms": percentile(samples, 95) * 1000.0,
+                "p99_ms": percentile(samples, 99) * 1000.0,
+            }
+
+
+class StepTimings:
+    """
+    Named StageStats for steps inside stages (decode, preprocess, OCR, ...)
+    that the per-stage stats lump together. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, name):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats(STEP_SECONDS.labels(name))
+            return stats
+
+    def record(self, name, seconds):
+        self.get(name).record(seconds)
+
+    @contextmanager
+    def time(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._stats.items())
+        return {name: stats.snapshot() for name, stats in items}
+
+    def format(self):
+        return " | ".join(
+            f"{name}: n={s['count']} avg={s['avg_ms']:.1f}ms p95={s['p95_ms']:.1f}ms"
+            for name, s in self.snapshot().items()
+        )
+
+
+class Stage:
+    """
+    A pool of worker threads that take items from in_q, call fn(item) and
+    forward the result to out_q.
+
+    fn may return None (nothing forwarded), a single item, or a list of items.
+    setup/teardown run inside each worker thread, so per-thread resources such
+    as sqlite3 connections can be created and closed there. on_stop is called
+    by a worker when STOP arrives and may return items to flush downstream
+    (e.g. tracks still open at end of stream).
+
+    With ordered=True each item gets a sequence number as it is taken from
+    in_q and results are forwarded in that order, so several workers can wait
+    on a shared resource (e.g. the batched detector) without reordering
+    frames for a single-threaded stage downstream.
+    """
+
+    def __init__(self, name, fn, in_q, out_q=None, workers=1,
+                 setup=None, teardown=None, on_stop=None, ordered=False):
+        self.name = name
+        self.fn = fn
+        self.in_q = in_q
+        self.out_q = out_q
+        self.workers = max(1, int(workers))
+        self.setup = setup
+        self.teardown = teardown
+        self.on_stop = on_stop
+        self.ordered = ordered
+        self.stats = StageStats(STAGE_SECONDS.labels(name))
+        self._threads = []
+        self._alive = 0
+        self._lock = threading.Lock()
+        # ordered=True: sequence numbers taken/forwarded, results waiting their turn
+        self._get_lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._taken = 0
+        self._next = 0
+        self._waiting = {}
+
+    def start(self):
+        self._alive = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}",
+                                 daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _emit(self, out):
+        if self.out_q is None or out is None:
+            return
+        if isinstance(out, list):
+            for o in out:
+                self.out_q.put(o)
+        else:
+            self.out_q.put(out)
+
+    def _get(self):
+        """Take the next item, numbered in arrival order when ordered."""
+        if not self.ordered:
+            return self.in_q.get(), None
+        with self._get_lock:
+            seq = self._taken
+            self._taken += 1
+            return self.in_q.get(), seq
+
+    def _forward(self, seq, out):
+        """Emit out, or hold it until every earlier-numbered result has gone."""
+        if seq is None:
+            self._emit(out)
+            return
+        with self._emit_lock:
+            self._waiting[seq] = out
+            while self._next in self._waiting:
+                self._emit(self._waiting.pop(self._next))
+                self._next += 1
+
+    def _run(self):
+        if self.setup:
+            self.setup()
+        try:
+            while True:
+                item, seq = self._get()
+                if item is STOP:
+                    self._forward(seq, self.on_stop() if self.on_stop else None)
+                    # Let sibling workers see STOP too
+                    self.in_q.put(STOP, force=True)
+                    break
+
+                t0 = time.perf_counter()
+                try:
+                    out = self.fn(item)
+                except Exception:
+                    log.exception("Stage %s failed on an item", self.name)
+                    out = None
+                self.stats.record(time.perf_counter() - t0)
+                self._forward(seq, out)
+        finally:
+            if self.teardown:
+                self.teardown()
+            with self._lock:
+                self._alive -= 1
+                last = self._alive == 0
+            if last and self.out_q is not None:
+                self.out_q.put(STOP, force=True)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+
+class SourceStage:
+    """
+    Producer thread: iterates over source_fn() and pushes each item to out_q.
+    Stops early when stop() is called, then sends STOP downstream.
+    """
+
+    def __init__(self, name, source_fn, out_q):
+        self.name = name
+        self.source_fn = source_fn
+        self.out_q = out_q
+        self.stats = StageStats(STAGE_SECONDS.labels(name))
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        t = threading.Thread(target=self._run, name=self.name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _run(self):
+        try:
+            t0 = time.perf_counter()
+            for item in self.source_fn():
+                self.stats.record(time.perf_counter() - t0)
+                if self._stop.is_set():
+                    break
+                if item is not None:
+                    self.out_q.put(item)
+                t0 = time.perf_counter()
+        except Exception:
+            log.exception("Stage %s stopped", self.name)
+        finally:
+            self.out_q.put(STOP, force=True)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+
+def fair_merge(queues, poll_sec=0.005):
+    """
+    Round-robin generator over several StageQueues (one per camera).
+
+    Each pass takes at most one item from every queue, so a busy camera can
+    never starve the others. Finishes once every queue has delivered STOP.
+    """
+    active = list(queues)
+    while active:
+        got_any = False
+        for q in list(active):
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                continue
+            if item is STOP:
+                active.remove(q)
+                continue
+            got_any = True
+            yield item
+        if not got_any:
+            time.sleep(poll_sec)
+
+
+class Pipeline:
+    """
+    Chain of stages joined by StageQueues. Keeps references so per-stage
+    queue depth, drops and latency can be reported while it runs.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        # Start consumers first so the source never fills an unread queue
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            if isinstance(stage, SourceStage):
+                stage.stop()
+
+    def join(self, timeout=None):
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def is_alive(self):
+        return any(t.is_alive() for stage in self.stages for t in stage._threads)
+
+    def stats(self):
+        """Return {stage_name: {count, avg_ms, max_ms, queue_depth, dropped}}."""
+        out = {}
+        for stage in self.stages:
+            s = stage.stats.snapshot()
+            q = stage.out_q
+            s["queue_depth"] = q.depth() if q is not None else 0
+            s["dropped"] = q.dropped if q is not None else 0
+            out[stage.name] = s
+        return out
+
+    def format_stats(self):
+        parts = []
+        for name, s in self.stats().items():
+            parts.append(
+                f"{name}: n={s['count']} avg={s['avg_ms']:.1f}ms "
+                f"max={s['max_ms']:.1f}ms q={s['queue_depth']} drop={s['dropped']}"
+            )
+        return " | ".join(parts)
@@ -0,0 +1,364 @@
+# scripts/prepare_dataset.py
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DATASET_DIR,
+    DATASET_CLASSES,
+    DATASET_SPLIT,
+    DATASET_SEED,
+    DATASET_DUP_MAX_DISTANCE,
+    DATASET_WORKERS,
+    DATASET_IMAGE_EXTS,
+)
+
+SPLITS = ("train", "val", "test")
+
+# 64-bit dHash looked up as 4 x 16-bit blocks: hashes at most 3 bits apart
+# share at least one whole block, so near duplicates are found without
+# comparing every pair
+HASH_BLOCKS = 4
+
+# Slack for boxes touching the image border (rounding in labelling tools)
+BOUNDS_EPS = 1e-3
+
+
+def _walk(top, exts):
+    found = []
+    for dirpath, _, names in os.walk(top):
+        found += [os.path.join(dirpath, n) for n in names if n.lower().endswith(exts)]
+    return found
+
+
+def list_files(root, exts, workers=8):
+    """Every file under root ending in exts; top-level subfolders are walked on parallel threads."""
+    if not os.path.isdir(root):
+        return []
+    files, subdirs = [], []
+    for entry in os.scandir(root):
+        if entry.is_dir():
+            subdirs.append(entry.path)
+        elif entry.name.lower().endswith(exts):
+            files.append(entry.path)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(lambda d: _walk(d, exts), subdirs):
+            files += found
+    return sorted(files)
+
+
+def to_labels(path):
+    """Same rule as ultralytics: the last /images/ in the path becomes /labels/."""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    if sa in path:
+        path = sb.join(path.rsplit(sa, 1))
+    return path
+
+
+def label_path(image_path):
+    return os.path.splitext(to_labels(image_path))[0] + ".txt"
+
+
+def dhash(gray):
+    """64-bit difference hash: survives re-encoding, resizing and small brightness changes."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def check_labels(path, num_classes):
+    """
+    Validate one YOLO label file: class id then normalized cx cy w h (or a
+    polygon of x y pairs) per line. Returns (box count, error strings);
+    an empty file is a valid background image.
+    """
+    boxes, errors = 0, []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except (OSError, UnicodeDecodeError) as e:
+        return 0, [f"unreadable label file ({e})"]
+
+    for n, line in enumerate(lines, 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            cls = float(parts[0])
+            values = [float(v) for v in parts[1:]]
+        except ValueError:
+            errors.append(f"line {n}: not numeric")
+            continue
+        if not cls.is_integer() or not 0 <= cls < num_classes:
+            errors.append(f"line {n}: class {parts[0]} not in 0..{num_classes - 1}")
+        if len(values) < 4 or (len(values) > 4 and len(values) % 2):
+            errors.append(f"line {n}: {len(values)} coordinates")
+            continue
+        if any(not -BOUNDS_EPS <= v <= 1 + BOUNDS_EPS for v in values):
+            errors.append(f"line {n}: coordinates outside 0..1")
+            continue
+        if len(values) == 4:
+            cx, cy, w, h = values
+            if w <= 0 or h <= 0:
+                errors.append(f"line {n}: empty box")
+                continue
+            if (cx - w / 2 < -BOUNDS_EPS or cx + w / 2 > 1 + BOUNDS_EPS or
+                    cy - h / 2 < -BOUNDS_EPS or cy + h / 2 > 1 + BOUNDS_EPS):
+                errors.append(f"line {n}: box extends past the image")
+                continue
+        boxes += 1
+    return boxes, errors
+
+
+def scan(task):
+    """
+    Worker: stat + (unless the cache entry is still valid) decode one image
+    for its size and dHash, then check its label file.
+    task is (image path, label path, number of classes, cache entry or None).
+    """
+    path, label, num_classes, cached = task
+    out = {"path": path}
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        out["error"] = str(e)
+        return out
+
+    stamp = [st.st_mtime_ns, st.st_size]
+    if cached is None or cached[:2] != stamp:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            out["error"] = "unreadable image"
+            return out
+        h, w = gray.shape
+        cached = stamp + [w, h, dhash(gray)]
+    out["cache"] = cached
+    out["width"], out["height"], out["hash"] = cached[2:]
+
+    out["labelled"] = os.path.exists(label)
+    out["boxes"], out["label_errors"] = check_labels(label, num_classes) if out["labelled"] else (0, [])
+    return out
+
+
+def load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def find_duplicates(records, max_distance):
+    """
+    Map every near-duplicate image to the image it duplicates: dHashes at
+    most max_distance bits apart (0 = identical). records are sorted by
+    path, so the first image of each group is the one kept.
+    """
+    buckets = [defaultdict(list) for _ in range(HASH_BLOCKS)]
+    dup_of = {}
+    for r in records:
+        h = r["hash"]
+        keys = [(h >> (16 * b)) & 0xFFFF for b in range(HASH_BLOCKS)]
+        match = None
+        for b, key in enumerate(keys):
+            for kept in buckets[b][key]:
+                if bin(h ^ kept["hash"]).count("1") <= max_distance:
+                    match = kept
+                    break
+            if match is not None:
+                break
+        if match is not None:
+            dup_of[r["path"]] = match["path"]
+            continue
+        for b, key in enumerate(keys):
+            buckets[b][key].append(r)
+    return dup_of
+
+
+def assign_split(key, seed, ratios):
+    """
+    Split for one image from a seeded hash of its relative path: the same
+    seed always gives the same split, and adding images never moves old ones.
+    """
+    digest = hashlib.sha1(f"{seed}:{key}".encode("utf-8")).digest()
+    u = int.from_bytes(digest[:8], "big") / 2.0 ** 64
+    total = float(sum(ratios))
+    acc = 0.0
+    for name, ratio in zip(SPLITS, ratios):
+        acc += ratio / total
+        if u < acc:
+            return name
+    return SPLITS[-1]
+
+
+def list_entry(path, out_dir):
+    """Image path for a split list: ./relative when inside out_dir (ultralytics resolves those)."""
+    rel = os.path.relpath(path, out_dir)
+    if rel.startswith(".."):
+        return os.path.abspath(path)
+    return "./" + rel.replace(os.sep, "/")
+
+
+def write_outputs(out_dir, splits, manifest, classes):
+    """train/val/test.txt image lists, data.yaml pointing at them, manifest.json."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in SPLITS:
+        with open(os.path.join(out_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+            for r in splits[name]:
+                f.write(list_entry(r["path"], out_dir) + "\n")
+
+    with open(os.path.join(out_dir, "data.yaml"), "w", encoding="utf-8") as f:
+        f.write(f"path: {os.path.abspath(out_dir)}\n")
+        for name in SPLITS:
+            f.write(f"{name}: {name}.txt\n")
+        f.write("names:\n")
+        for i, name in enumerate(classes):
+            f.write(f"  {i}: {name}\n")
+
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def print_problems(title, items, limit=10):
+    if not items:
+        return
+    print(f"[WARN] {title}: {len(items)}")
+    for line in items[:limit]:
+        print(f"    {line}")
+    if len(items) > limit:
+        print(f"    ... {len(items) - limit} more (see manifest.json)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate a YOLO plate dataset, drop duplicates and write a seeded split manifest.")
+    parser.add_argument("--images", default=os.path.join(DATASET_DIR, "images"),
+                        help="Image tree (labels are found as ultralytics does: images/ -> labels/)")
+    parser.add_argument("--out", default=DATASET_DIR,
+                        help="Where train/val/test.txt, data.yaml and manifest.json go")
+    parser.add_argument("--split", type=float, nargs=3, default=DATASET_SPLIT,
+                        metavar=("TRAIN", "VAL", "TEST"))
+    parser.add_argument("--seed", type=int, default=DATASET_SEED)
+    parser.add_argument("--dup-distance", type=int, default=DATASET_DUP_MAX_DISTANCE,
+                        help=f"Max dHash bit difference for duplicates (0..{HASH_BLOCKS - 1}, -1 = keep all)")
+    parser.add_argument("--keep-unlabeled", action="store_true",
+                        help="Keep images without a label file as background images")
+    parser.add_argument("--workers", type=int, default=DATASET_WORKERS, help="0 = CPU cores")
+    parser.add_argument("--check-only", action="store_true",
+                        help="Only report problems (exit 1 if any label is invalid)")
+    args = parser.parse_args()
+
+    if args.dup_distance >= HASH_BLOCKS:
+        parser.error(f"--dup-distance must be below {HASH_BLOCKS}")
+    if min(args.split) < 0 or sum(args.split) <= 0:
+        parser.error("--split ratios must be >= 0 and not all 0")
+
+    workers = args.workers or os.cpu_count() or 1
+    root = os.path.abspath(args.images)
+    images = list_files(root, DATASET_IMAGE_EXTS, workers)
+    if not images:
+        print(f"[ERROR] No images ({', '.join(DATASET_IMAGE_EXTS)}) under {root}")
+        sys.exit(1)
+    print(f"[INFO] {len(images)} images under {root}")
+
+    # Image sizes and hashes are cached by path, mtime and size
+    cache_path = os.path.join(args.out, "image_cache.json")
+    cache = load_cache(cache_path)
+    rel = {p: os.path.relpath(p, root).replace(os.sep, "/") for p in images}
+    tasks = [(p, label_path(p), len(DATASET_CLASSES), cache.get(rel[p])) for p in images]
+    chunk = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(scan, tasks, chunksize=chunk))
+
+    new_cache = {}
+    unreadable, unlabeled, label_errors, valid = [], [], {}, []
+    for r in results:
+        key = rel[r["path"]]
+        if "error" in r:
+            unreadable.append(f"{key}: {r['error']}")
+            continue
+        new_cache[key] = r["cache"]
+        if r["label_errors"]:
+            label_errors[key] = r["label_errors"]
+        elif not r["labelled"] and not args.keep_unlabeled:
+            unlabeled.append(key)
+        else:
+            valid.append(r)
+    hits = sum(1 for t, r in zip(tasks, results) if t[3] is not None and t[3] == r.get("cache"))
+    print(f"[INFO] Scanned with {workers} workers ({hits} cached, {len(images) - hits} decoded)")
+
+    # Label files with no image (only for a separate labels/ tree)
+    orphans = []
+    label_root = to_labels(root + os.sep)
+    if os.path.normpath(label_root) != os.path.normpath(root):
+        expected = {os.path.normcase(label_path(p)) for p in images}
+        for p in list_files(label_root, (".txt",), workers):
+            if os.path.normcase(p) not in expected and os.path.basename(p) != "classes.txt":
+                orphans.append(os.path.relpath(p, label_root).replace(os.sep, "/"))
+
+    dup_of = find_duplicates(valid, args.dup_distance) if args.dup_distance >= 0 else {}
+    kept = [r for r in valid if r["path"] not in dup_of]
+
+    splits = {name: [] for name in SPLITS}
+    for r in kept:
+        splits[assign_split(rel[r["path"]], args.seed, args.split)].append(r)
+
+    print_problems("Unreadable images", unreadable)
+    print_problems("Images without a label file (use --keep-unlabeled for background)", unlabeled)
+    print_problems("Images with invalid labels (excluded)",
+                   [f"{k}: {'; '.join(v)}" for k, v in sorted(label_errors.items())])
+    print_problems("Label files without an image", orphans)
+    print_problems("Duplicate images (excluded)",
+                   [f"{rel[d]} = {rel[k]}" for d, k in sorted(dup_of.items())])
+    print("[INFO] " + ", ".join(f"{name}: {len(splits[name])} images / "
+                                f"{sum(r['boxes'] for r in splits[name])} boxes" for name in SPLITS))
+
+    if args.check_only:
+        sys.exit(1 if label_errors or unreadable else 0)
+
+    os.makedirs(args.out, exist_ok=True)
+    save_cache(cache_path, new_cache)
+    manifest = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "root": root,
+        "seed": args.seed,
+        "split": list(args.split),
+        "dup_distance": args.dup_distance,
+        "classes": list(DATASET_CLASSES),
+        "counts": {name: len(splits[name]) for name in SPLITS},
+        "images": {
+            name: [{"path": rel[r["path"]], "width": r["width"], "height": r["height"],
+                    "boxes": r["boxes"]} for r in splits[name]]
+            for name in SPLITS
+        },
+        "duplicates": {rel[d]: rel[k] for d, k in sorted(dup_of.items())},
+        "label_errors": label_errors,
+        "unlabeled": unlabeled,
+        "unreadable": unreadable,
+        "orphan_labels": orphans,
+    }
+    write_outputs(args.out, splits, manifest, DATASET_CLASSES)
+    print(f"[INFO] Split lists, data.yaml and manifest.json written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
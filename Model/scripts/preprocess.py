@@ -0,0 +1,44 @@
+# scripts/preprocess.py
+
+import threading
+
+import cv2
+import numpy as np
+
+
+class RoiResizer:
+    """
+    Resize a frame's ROI straight to the detector input size.
+
+    The ROI is read as a view of the frame (no crop copy) and resized once so
+    its long side is imgsz; YOLO's own letterbox then only pads to the stride
+    instead of resizing again. The output goes into a buffer owned by the
+    calling thread and reused while the ROI size stays the same, so a detect
+    worker allocates nothing per frame. The buffer is overwritten by that
+    thread's next call: use it (e.g. a blocking detector.predict) before then.
+    """
+
+    def __init__(self, imgsz=640):
+        self.imgsz = imgsz
+        self._local = threading.local()
+
+    def _buffer(self, shape):
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._local.buf = buf
+        return buf
+
+    def __call__(self, frame, roi_box):
+        """Return (resized ROI, scale); model coords / scale + ROI origin = frame coords."""
+        x1, y1, x2, y2 = roi_box
+        roi = frame[y1:y2, x1:x2]
+        h, w = roi.shape[:2]
+        scale = self.imgsz / float(max(h, w))
+        new_w = max(1, int(round(w * scale)))
+        new_h = max(1, int(round(h * scale)))
+
+        buf = self._buffer((new_h, new_w) + roi.shape[2:])
+        # Same interpolation YOLO's letterbox would use on the raw ROI
+        cv2.resize(roi, (new_w, new_h), dst=buf, interpolation=cv2.INTER_LINEAR)
+        return buf, scale
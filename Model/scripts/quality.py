@@ -0,0 +1,53 @@
+# scripts/quality.py
+
+import cv2
+import numpy as np
+
+NORM_HEIGHT = 48          # Crops are resized to this height before measuring sharpness
+SHARPNESS_REF = 300.0     # Laplacian variance that counts as fully sharp
+HEIGHT_REF = 40.0         # Crop height (px, original) that counts as large enough
+CONTRAST_REF = 50.0       # Gray-level std that counts as full contrast
+MAX_SKEW_DEG = 30.0       # Tilt at which the skew score reaches 0
+
+
+def skew_angle(gray):
+    """Tilt of the plate in degrees (-45..45), from the min-area box around its edges."""
+    edges = cv2.Canny(gray, 50, 150)
+    pts = cv2.findNonZero(edges)
+    if pts is None or len(pts) < 10:
+        return 0.0
+    angle = cv2.minAreaRect(pts)[2]
+    # OpenCV versions disagree on the angle range; fold it into -45..45
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return float(angle)
+
+
+def crop_quality(crop):
+    """
+    Fast quality estimate of a plate crop for choosing what to OCR.
+
+    Returns (score, parts): parts are sharpness (Laplacian variance at a
+    fixed height), size (crop height), contrast (gray std) and skew, each
+    scaled to [0, 1]; score is their geometric mean, so one bad factor
+    (motion blur, a tiny far-away plate) pulls the whole crop down.
+    """
+    h, w = crop.shape[:2]
+    if h < 2 or w < 2:
+        return 0.0, {"sharpness": 0.0, "size": 0.0, "contrast": 0.0, "skew": 0.0}
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    scale = NORM_HEIGHT / float(h)
+    norm = cv2.resize(gray, (max(1, int(w * scale)), NORM_HEIGHT),
+                      interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+    parts = {
+        "sharpness": min(1.0, cv2.Laplacian(norm, cv2.CV_64F).var() / SHARPNESS_REF),
+        "size": min(1.0, h / HEIGHT_REF),
+        "contrast": min(1.0, float(norm.std()) / CONTRAST_REF),
+        "skew": max(0.0, 1.0 - abs(skew_angle(norm)) / MAX_SKEW_DEG),
+    }
+    score = float(np.prod(list(parts.values()))) ** (1.0 / len(parts))
+    return score, parts
@@ -0,0 +1,216 @@
+# scripts/retention.py
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    DB_PATH,
+    SNAPSHOT_DIR,
+    SQLITE_SYNCHRONOUS,
+    RETENTION_DAYS,
+    RETENTION_CHUNK_ROWS,
+    RETENTION_CHUNK_PAUSE,
+    RETENTION_VACUUM_PAGES,
+    RETENTION_INTERVAL_SEC,
+)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def connect(db_path=DB_PATH):
+    # Autocommit mode: every transaction below is opened explicitly and kept short
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    return conn
+
+
+def ensure_index(conn):
+    """The chunked deletes walk logs in timestamp order, so they need this index."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+
+
+def cutoff_timestamp(days, now=None):
+    """ISO timestamp (same format as logs.timestamp) before which rows expire."""
+    now = now or datetime.now()
+    return (now - timedelta(days=days)).isoformat(timespec='seconds')
+
+
+def _in_snapshot_dir(path, snapshot_dir):
+    root = os.path.realpath(snapshot_dir)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+
+def remove_snapshot(path, snapshot_dir=SNAPSHOT_DIR):
+    """Delete one snapshot file; paths outside snapshot_dir are never touched."""
+    if not path or not _in_snapshot_dir(path, snapshot_dir):
+        return False
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        print(f"[WARN] Could not remove snapshot {path}: {e}")
+        return False
+
+
+def purge_logs(conn, cutoff, chunk_rows=RETENTION_CHUNK_ROWS,
+               pause=RETENTION_CHUNK_PAUSE, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Delete logs rows older than cutoff, chunk_rows per transaction.
+
+    Each chunk takes the write lock with BEGIN IMMEDIATE, deletes by primary
+    key and commits, so the live log writer waits at most one chunk. Snapshot
+    files are removed after their rows are committed. Returns (rows, files).
+    """
+    rows = 0
+    files = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            chunk = conn.execute(
+                "SELECT id, image_path FROM logs WHERE timestamp < ? "
+                "ORDER BY timestamp LIMIT ?", (cutoff, chunk_rows)).fetchall()
+            if chunk:
+                conn.executemany("DELETE FROM logs WHERE id = ?",
+                                 [(row_id,) for row_id, _ in chunk])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        if not chunk:
+            break
+        rows += len(chunk)
+        for _, image_path in chunk:
+            files += remove_snapshot(image_path, snapshot_dir)
+        if len(chunk) < chunk_rows:
+            break
+        time.sleep(pause)
+    return rows, files
+
+
+def sweep_snapshots(cutoff_epoch, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Remove snapshot files last written before cutoff_epoch. Their rows are
+    older still (a row is queued before its snapshot is written), so they
+    were purged already; this catches files whose row never made it.
+    """
+    removed = 0
+    if not os.path.isdir(snapshot_dir):
+        return removed
+    with os.scandir(snapshot_dir) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.lower().endswith(".jpg"):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff_epoch:
+                    removed += remove_snapshot(entry.path, snapshot_dir)
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def incremental_vacuum(conn, pages=RETENTION_VACUUM_PAGES,
+                       pause=RETENTION_CHUNK_PAUSE):
+    """
+    Give free pages back to the filesystem, `pages` at a time. Needs
+    auto_vacuum=INCREMENTAL (set by init_db.py or --convert); returns the
+    number of pages released, or None if the database is not set up for it.
+    """
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != AUTO_VACUUM_INCREMENTAL:
+        return None
+
+    released = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            break
+        step = min(free, pages)
+        conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+        released += step
+        time.sleep(pause)
+    return released
+
+
+def convert_to_incremental(conn):
+    """
+    One-off switch of an existing database to auto_vacuum=INCREMENTAL.
+    This runs a full VACUUM (exclusive lock, rewrites the file), so stop the
+    detector first.
+    """
+    conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+    conn.execute("VACUUM")
+
+
+def run_retention(db_path=DB_PATH, days=RETENTION_DAYS, snapshot_dir=SNAPSHOT_DIR,
+                  chunk_rows=RETENTION_CHUNK_ROWS, dry_run=False):
+    cutoff = cutoff_timestamp(days)
+    conn = connect(db_path)
+    try:
+        ensure_index(conn)
+
+        if dry_run:
+            n = conn.execute("SELECT COUNT(*) FROM logs WHERE timestamp < ?",
+                             (cutoff,)).fetchone()[0]
+            print(f"[INFO] Dry run: {n} log rows older than {cutoff} would be deleted")
+            return
+
+        t0 = time.time()
+        rows, files = purge_logs(conn, cutoff, chunk_rows, snapshot_dir=snapshot_dir)
+        cutoff_epoch = datetime.fromisoformat(cutoff).timestamp()
+        files += sweep_snapshots(cutoff_epoch, snapshot_dir)
+        print(f"[INFO] Retention: deleted {rows} log rows and {files} snapshots "
+              f"older than {cutoff} in {time.time() - t0:.1f}s")
+
+        released = incremental_vacuum(conn)
+        if released is None:
+            print("[WARN] auto_vacuum is not INCREMENTAL; freed pages are reused but "
+                  "the file will not shrink (run once with --convert while the detector is stopped)")
+        elif released:
+            print(f"[INFO] Incremental vacuum released {released} pages")
+
+        # Refresh planner statistics for the timestamp index, then fold the
+        # WAL back into the main file without waiting on readers
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete expired logs and snapshots, then compact the database.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS,
+                        help="Keep this many days of logs (default RETENTION_DAYS)")
+    parser.add_argument("--chunk", type=int, default=RETENTION_CHUNK_ROWS,
+                        help="Rows deleted per transaction")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only count the rows that would be deleted")
+    parser.add_argument("--loop", action="store_true",
+                        help="Keep running every RETENTION_INTERVAL_SEC seconds")
+    parser.add_argument("--convert", action="store_true",
+                        help="Switch an existing database to incremental vacuum (full VACUUM, stop the detector first)")
+    args = parser.parse_args()
+
+    if args.convert:
+        conn = connect()
+        try:
+            convert_to_incremental(conn)
+            print(f"[INFO] {DB_PATH} now uses auto_vacuum=INCREMENTAL")
+        finally:
+            conn.close()
+
+    while True:
+        run_retention(days=args.days, chunk_rows=args.chunk, dry_run=args.dry_run)
+        if not args.loop:
+            break
+        time.sleep(RETENTION_INTERVAL_SEC)
@@ -4,18 +4,19 @@ import os
 import sys
 import time
 from datetime import datetime
-import sqlite3
 import argparse
+import logging
+import queue
+from functools import partial
 
 import cv2
-from ultralytics import YOLO
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from config import (
-    DB_PATH,
-    MODEL_PATH,
+    DETECTOR_BACKEND,
+    DETECT_IMGSZ,
     DETECTION_CONFIDENCE,
     IOU_THRESHOLD,
     FRAME_SKIP,
@@ -23,11 +24,68 @@ from config import (
     CAMERA_ID,
     CAMERA_MODE,
     SNAPSHOT_DIR,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_DROP_POLICY,
+    OCR_WORKERS,
+    STATS_INTERVAL,
+    TRACK_IOU_THRESHOLD,
+    TRACK_MAX_CENTROID_DIST,
+    TRACK_MAX_AGE,
+    TRACK_MAX_DURATION,
+    TRACK_MIN_HITS,
+    TRACK_OCR_TOP_K,
+    QUALITY_MIN_SCORE,
+    OCR_ROI_FALLBACK,
+    OCR_ROI_FALLBACK_INTERVAL,
+    LOG_LEVEL,
+    METRICS_HOST,
+    METRICS_PORT,
+    DETECT_BATCH_SIZE,
+    DETECT_BATCH_MAX_WAIT_MS,
+    DETECT_TIMEOUT_SEC,
+    MOTION_GATE,
+    MOTION_DECODE_WIDTH,
+    CAMERA_SUBSTREAM,
+    MOTION_WIDTH,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA,
+    MOTION_BG_ALPHA,
+    MOTION_HOLD_SEC,
+    MOTION_IDLE_SKIP,
+    MOTION_ACTIVE_SKIP,
     trigger_gate_open,
     trigger_gate_block,
 )
-from scripts.utils_ocr import recognize_plate
+from scripts.utils_ocr import recognize_plate, recognize_plates_batch, warm_up_ocr
+from scripts.batch_infer import BatchedDetector
+from scripts.detector_backends import BACKENDS, load_detector
+from scripts.tracker import PlateTracker, fuse_readings
+from scripts.motion import MotionGate
+from scripts.quality import crop_quality
+from scripts.preprocess import RoiResizer
+from scripts.capture import LatestFrameGrabber, is_live_source, open_source
+from scripts.pipeline import (
+    DROP_POLICIES,
+    STOP,
+    Pipeline,
+    SourceStage,
+    Stage,
+    StageQueue,
+    StepTimings,
+)
+from scripts.metrics import (
+    DECISIONS,
+    DETECTIONS,
+    FRAMES_PROCESSED,
+    FRAMES_READ,
+    FRAMES_SKIPPED,
+    OCR_CALLS,
+    serve_metrics,
+)
+from scripts.logging_setup import LEVELS, setup_logging
 from correction import correct_plate
+from registry import VehicleStatusCache, start_registry
+from log_writer import LogWriter
 
 
 # ROI tuned for bottom-center plates (you can tweak based on actual video)
@@ -36,39 +94,12 @@ ROI_BOTTOM = 0.95
 ROI_LEFT = 0.25
 ROI_RIGHT = 0.75
 
-UPSCALE_FACTOR = 2.0
 SHOW_WINDOW = False  # keep False if cv2.imshow causes issues
 
+# Timings of the steps inside stages, reported with the stage stats
+steps = StepTimings()
 
-def connect_db():
-    return sqlite3.connect(DB_PATH)
-
-
-def get_vehicle_status(conn, plate):
-    c = conn.cursor()
-    c.execute("SELECT status FROM vehicles WHERE plate_number=?", (plate,))
-    row = c.fetchone()
-    if row:
-        return row[0]
-    else:
-        c.execute(
-            "INSERT INTO vehicles (plate_number, status) VALUES (?, ?)",
-            (plate, "visitor")
-        )
-        conn.commit()
-        return "visitor"
-
-
-def insert_log(conn, plate, decision, detection_conf, ocr_conf, image_path):
-    c = conn.cursor()
-    timestamp = datetime.now().isoformat(timespec='seconds')
-    c.execute("""
-        INSERT INTO logs (plate_number, timestamp, direction, camera_id,
-                          detection_conf, ocr_conf, image_path, decision)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (plate, timestamp, CAMERA_MODE, CAMERA_ID,
-          detection_conf, ocr_conf, image_path, decision))
-    conn.commit()
+log = logging.getLogger(__name__)
 
 
 def seconds_to_hms(sec: float) -> str:
@@ -80,232 +111,587 @@ def seconds_to_hms(sec: float) -> str:
     return f"{h:02d}:{m:02d}:{s2:02d}"
 
 
+def hms_to_seconds(hms: str) -> float:
+    """Inverse of seconds_to_hms."""
+    h, m, s = hms.split(":")
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def default_camera():
+    """Camera settings for the single-camera script, taken from config.py."""
+    return {
+        "id": CAMERA_ID,
+        "direction": CAMERA_MODE,
+        "roi": (ROI_TOP, ROI_BOTTOM, ROI_LEFT, ROI_RIGHT),
+        "frame_skip": FRAME_SKIP,
+        "motion": MOTION_GATE,
+        "substream": CAMERA_SUBSTREAM,
+    }
+
+
+def open_camera(source, camera):
+    """
+    Open a camera's main stream and, for a live camera with the motion gate
+    and a "substream" URL, its low-res substream for motion detection.
+    Returns (cap, fps, motion_cap, motion_fps); cap is None on failure.
+    """
+    cap, fps = open_source(source, camera["id"])
+    motion_cap, motion_fps = None, None
+    substream = camera.get("substream")
+    if (isinstance(cap, LatestFrameGrabber) and substream
+            and camera.get("motion", MOTION_GATE)):
+        motion_cap, motion_fps = open_source(substream, f"{camera['id']}:sub",
+                                             width=MOTION_DECODE_WIDTH)
+        if motion_cap is None:
+            log.warning("[%s] Substream %s failed, gating on the main stream", camera['id'], substream)
+        else:
+            log.info("[%s] Motion gate on substream %s (%.2f fps)", camera['id'], substream, motion_fps)
+    return cap, fps, motion_cap, motion_fps
+
+
+def make_motion_gate():
+    return MotionGate(
+        width=MOTION_WIDTH,
+        pixel_threshold=MOTION_PIXEL_THRESHOLD,
+        min_area=MOTION_MIN_AREA,
+        bg_alpha=MOTION_BG_ALPHA,
+        hold_sec=MOTION_HOLD_SEC,
+        idle_skip=MOTION_IDLE_SKIP,
+        active_skip=MOTION_ACTIVE_SKIP,
+    )
+
+
+def compute_roi(H, W, roi=None):
+    """
+    Return clamped (x1, y1, x2, y2) of the detection ROI for a HxW frame.
+    roi is (top, bottom, left, right) as fractions of the frame.
+    """
+    top, bottom, left, right = roi or (ROI_TOP, ROI_BOTTOM, ROI_LEFT, ROI_RIGHT)
+    y1_roi = max(0, min(H - 1, int(H * top)))
+    y2_roi = max(0, min(H, int(H * bottom)))
+    x1_roi = max(0, min(W - 1, int(W * left)))
+    x2_roi = max(0, min(W, int(W * right)))
+    return x1_roi, y1_roi, x2_roi, y2_roi
+
+
+def make_capture(cap, fps, display_q, camera=None, motion_cap=None, motion_fps=None,
+                 start_frame=0):
+    """
+    Capture stage: read frames, keep those worth detecting, emit frame items.
+    With the motion gate on (default) that is every frame while something
+    moves in the ROI and a heartbeat frame otherwise; cameras with
+    "motion": False use their fixed frame_skip instead, and a video file
+    then only grabs (decodes without converting to BGR) the skipped frames.
+
+    motion_cap is the camera's low-res substream: the gate runs on its
+    frames and cap (a LatestFrameGrabber on the main stream) is only read
+    for frames that go on to detection.
+
+    start_frame is the stream position of cap's first frame (a video
+    segment), so frame numbers and timestamps stay relative to the file.
+    """
+    camera = camera or default_camera()
+    frame_skip = max(1, int(camera.get("frame_skip", FRAME_SKIP)))
+    gate = make_motion_gate() if camera.get("motion", MOTION_GATE) else None
+    if gate is None:
+        motion_cap = None
+    live = isinstance(cap, LatestFrameGrabber)
+    gate_cap = motion_cap or cap
+    gate_fps = (motion_fps or fps) if motion_cap is not None else fps
+    frames_read = FRAMES_READ.labels(camera["id"])
+    frames_skipped = FRAMES_SKIPPED.labels(camera["id"])
+    frames_processed = FRAMES_PROCESSED.labels(camera["id"])
+
+    def capture():
+        frame_idx = start_frame
+        reads = 0
+        first_frame = True
+        while True:
+            if gate is None and not live and (frame_idx + 1) % frame_skip != 0:
+                with steps.time("grab"):
+                    ret = cap.grab()
+                if ret:
+                    frame_idx += 1
+                    frames_read.inc()
+                    frames_skipped.inc()
+                    continue
+            else:
+                with steps.time("decode"):
+                    ret, frame = gate_cap.read()
+            if not ret:
+                log.info("[%s] End of video or cannot read frame.", camera["id"])
+                if gate is not None and gate.frames:
+                    log.info("[%s] Motion gate: detected %d/%d frames",
+                             camera["id"], gate.processed, gate.frames)
+                return
+
+            # A grabber numbers frames as decoded, so dropped ones still count
+            if isinstance(gate_cap, LatestFrameGrabber):
+                frame_idx = gate_cap.frame_seq
+            else:
+                frame_idx += 1
+            reads += 1
+            frames_read.inc()
+            if first_frame:
+                log.info("[%s] First frame size: %s", camera["id"], frame.shape)
+                first_frame = False
+
+            current_time_sec = frame_idx / gate_fps
+
+            # Skip frames to save compute
+            if gate is not None:
+                H, W = frame.shape[:2]
+                x1_roi, y1_roi, x2_roi, y2_roi = compute_roi(H, W, camera.get("roi"))
+                keep = gate.should_process(frame[y1_roi:y2_roi, x1_roi:x2_roi],
+                                           current_time_sec)
+            else:
+                # Files only get here on every frame_skip-th frame; live frames are counted as read
+                keep = reads % frame_skip == 0 if live else True
+            if not keep:
+                frames_skipped.inc()
+                if display_q is not None:
+                    display_q.put(frame)
+                continue
+
+            if motion_cap is not None:
+                # Motion seen on the substream: fetch the newest main-stream frame
+                with steps.time("decode"):
+                    ret, frame = cap.read()
+                if not ret:
+                    log.info("[%s] Main stream ended.", camera["id"])
+                    return
+
+            frames_processed.inc()
+            yield {
+                "camera": camera,
+                "frame_idx": frame_idx,
+                "ts_str": seconds_to_hms(current_time_sec),
+                "stream_sec": current_time_sec,
+                "captured_at": time.time(),
+                "frame": frame,
+            }
+    return capture
+
+
+def make_detect(detector):
+    """Detection stage: ROI resized to the model input + batched YOLO, boxes mapped to full frame."""
+    resize = RoiResizer(detector.imgsz)
+
+    def detect(item):
+        frame = item["frame"]
+        H, W, _ = frame.shape
+        x1_roi, y1_roi, x2_roi, y2_roi = compute_roi(H, W, item["camera"].get("roi"))
+        if x2_roi <= x1_roi or y2_roi <= y1_roi:
+            return None
+
+        # One resize from the frame view into this worker's reusable buffer;
+        # predict() blocks until YOLO has copied it, so the buffer is free after
+        # (a timed-out request's stale result is discarded)
+        with steps.time("preprocess"):
+            roi_in, scale = resize(frame, (x1_roi, y1_roi, x2_roi, y2_roi))
+        # Includes the wait for the batch to fill
+        with steps.time("detect"):
+            boxes = detector.predict(roi_in, DETECT_TIMEOUT_SEC)
+
+        detections = []
+        for x1u, y1u, x2u, y2u, det_conf in boxes:
+            # Map back to full frame
+            x1 = int(x1u / scale + x1_roi)
+            y1 = int(y1u / scale + y1_roi)
+            x2 = int(x2u / scale + x1_roi)
+            y2 = int(y2u / scale + y1_roi)
+
+            x1 = max(0, min(W - 1, x1))
+            y1 = max(0, min(H - 1, y1))
+            x2 = max(0, min(W - 1, x2))
+            y2 = max(0, min(H - 1, y2))
+
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            detections.append({"box": (x1, y1, x2, y2), "det_conf": det_conf})
+
+        DETECTIONS.labels(item["camera"]["id"]).inc(len(detections))
+        item["roi_box"] = (x1_roi, y1_roi, x2_roi, y2_roi)
+        item["detections"] = detections
+        return item
+    return detect
+
+
+class Tracker:
+    """
+    Track stage (single thread): links YOLO boxes into per-camera vehicle
+    tracks and emits one item per finished track carrying its best crops.
+    Frames where YOLO found nothing are passed on for the whole-ROI fallback
+    (when OCR_ROI_FALLBACK is on), at most once per OCR_ROI_FALLBACK_INTERVAL
+    per camera and only while no track is open, so a whole-ROI OCR never
+    runs on every frame.
+    """
+
+    def __init__(self, display_q=None):
+        self.display_q = display_q
+        self.trackers = {}  # camera_id -> PlateTracker
+        self.cameras = {}   # camera_id -> camera settings
+        self.last_fallback = {}  # camera_id -> stream_sec of the last fallback item
+
+    def _tracker(self, camera_id):
+        tr = self.trackers.get(camera_id)
+        if tr is None:
+            tr = PlateTracker(
+                iou_threshold=TRACK_IOU_THRESHOLD,
+                max_centroid_dist=TRACK_MAX_CENTROID_DIST,
+                max_age=TRACK_MAX_AGE,
+                max_duration=TRACK_MAX_DURATION,
+                min_hits=TRACK_MIN_HITS,
+                top_k=TRACK_OCR_TOP_K,
+                min_score=QUALITY_MIN_SCORE,
+            )
+            self.trackers[camera_id] = tr
+        return tr
+
+    @staticmethod
+    def _track_item(camera, tr, captured_at):
+        return {
+            "kind": "track",
+            "camera": camera,
+            "track_id": tr.id,
+            "captured_at": captured_at,
+            "det_conf": tr.best_det_conf,
+            "candidates": tr.candidates,
+        }
+
+    def __call__(self, item):
+        frame = item["frame"]
+        camera = item["camera"]
+        out = []
+
+        detections = []
+        for det in item["detections"]:
+            x1, y1, x2, y2 = det["box"]
+            crop = frame[y1:y2, x1:x2]
+            det["crop"] = crop
+            # Rank crops by sharpness/size/contrast/skew; poor ones are never OCR'd
+            det["score"], _ = crop_quality(crop)
+            detections.append(det)
+
+        # Capture -> tracked: how far detection lags behind the camera
+        steps.record("frame_latency", time.time() - item["captured_at"])
+
+        self.cameras[camera["id"]] = camera
+        tracker = self._tracker(camera["id"])
+        for tr in tracker.update(item["stream_sec"], detections, item["ts_str"]):
+            out.append(self._track_item(camera, tr, item["captured_at"]))
+
+        last = self.last_fallback.get(camera["id"])
+        if (not detections and OCR_ROI_FALLBACK and not tracker.tracks and
+                (last is None or item["stream_sec"] - last >= OCR_ROI_FALLBACK_INTERVAL)):
+            self.last_fallback[camera["id"]] = item["stream_sec"]
+            x1, y1, x2, y2 = item["roi_box"]
+            out.append({
+                "kind": "fallback",
+                "camera": camera,
+                "frame_idx": item["frame_idx"],
+                "ts_str": item["ts_str"],
+                "captured_at": item["captured_at"],
+                "roi": frame[y1:y2, x1:x2],
+            })
+
+        if self.display_q is not None:
+            display_frame = frame.copy()
+            for tr in tracker.tracks:
+                x1, y1, x2, y2 = tr.box
+                color = (0, 255, 0) if tr.emitted else (0, 255, 255)
+                cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
+                cv2.putText(display_frame, f"#{tr.id}", (x1, y1 - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            self.display_q.put(display_frame)
+
+        # Release the frame so queued items don't pin full-resolution buffers
+        item["frame"] = None
+        return out
+
+    def flush(self):
+        """End of stream: decide every track that is still open."""
+        out = []
+        for camera_id, tracker in self.trackers.items():
+            for tr in tracker.flush():
+                out.append(self._track_item(self.cameras[camera_id], tr, time.time()))
+        return out
+
+
+def ocr(item, ocr_backend=None):
+    """
+    OCR stage: read a finished track's best crops in one batched call and
+    fuse them, or run the whole-ROI fallback for a frame without boxes.
+    ocr_backend picks the crop recognizer (default OCR_BACKEND).
+    """
+    readings = []
+
+    if item["kind"] == "track":
+        candidates = item["candidates"]
+        if not candidates:
+            log.debug("Track %s: no crop above quality %s, skipped",
+                      item["track_id"], QUALITY_MIN_SCORE)
+            return None
+        crops = [c[1] for c in candidates]
+        OCR_CALLS.labels("track").inc()
+        with steps.time("ocr"):
+            texts = recognize_plates_batch(crops, min_conf=0.4, backend=ocr_backend)
+        raw_plate_text, ocr_conf = fuse_readings(texts)
+
+        # Time-window bias uses when the best crop was seen
+        ts_str = candidates[0][3]
+        with steps.time("correct"):
+            final_plate = correct_plate(raw_plate_text, ts_str)
+        if final_plate:
+            log.info("[DETECT] Track %s (%s) → READS: %s, FUSED: %s, FINAL: %s, "
+                     "det_conf=%.2f, ocr_conf=%.2f, quality=%.2f",
+                     item["track_id"], ts_str, [t for t, _ in texts], raw_plate_text,
+                     final_plate, item["det_conf"], ocr_conf, candidates[0][0])
+            readings.append({
+                "plate": final_plate,
+                "raw": raw_plate_text,
+                "ts_str": ts_str,
+                "det_conf": item["det_conf"],
+                "ocr_conf": ocr_conf,
+                "quality": candidates[0][0],
+                "crop": candidates[0][1],
+                "fallback": False,
+            })
+
+    # Optional fallback: if YOLO finds nothing, try OCR on whole ROI
+    elif item["kind"] == "fallback":
+        ts_str = item["ts_str"]
+        # recognize_plate scales the ROI to its OCR size itself
+        OCR_CALLS.labels("fallback").inc()
+        with steps.time("ocr"):
+            raw_plate_text, ocr_conf = recognize_plate(item["roi"], min_conf=0.5)
+        with steps.time("correct"):
+            final_plate = correct_plate(raw_plate_text, ts_str)
+        if final_plate:
+            log.info("[FALLBACK] Frame %s (%s) → RAW: %s, FINAL: %s, ocr_conf=%.2f",
+                     item["frame_idx"], ts_str, raw_plate_text, final_plate, ocr_conf)
+            readings.append({
+                "plate": final_plate,
+                "raw": raw_plate_text,
+                "ts_str": ts_str,
+                "det_conf": 0.0,
+                "ocr_conf": ocr_conf,
+                "crop": item["roi"],
+                "fallback": True,
+            })
+
+    if not readings:
+        return None
+    return {
+        "camera": item["camera"],
+        "captured_at": item["captured_at"],
+        "readings": readings,
+    }
+
+
+class Persister:
+    """
+    Persist stage (single thread): cooldown, gate decision, snapshot, log.
+    Vehicle status comes from the in-memory VehicleStatusCache and the
+    snapshot + logs row are handed to the LogWriter, so the gate decision
+    never waits on the disk.
+    """
+
+    def __init__(self, statuses, writer):
+        self.statuses = statuses
+        self.writer = writer
+        self.recent_events = {}  # (camera_id, plate) -> last_detection_time
+
+    def decide(self, plate):
+        """Gate decision for plate; opens or blocks the gate. Returns (decision, status)."""
+        status = self.statuses.get_status(plate)
+        if status == "blacklisted":
+            trigger_gate_block(plate)
+            return "blocked", status
+        trigger_gate_open(plate)
+        return "allowed", status
+
+    def __call__(self, item):
+        camera = item["camera"]
+        # Use capture time so out-of-order OCR results keep cooldown correct
+        now = item["captured_at"]
+
+        for det in item["readings"]:
+            final_plate = det["plate"]
+            fallback = det["fallback"]
+
+            # Cooldown to avoid spam (tracks split by an occlusion, fallback reads)
+            key = (camera["id"], final_plate)
+            last_t = self.recent_events.get(key)
+            if last_t and (now - last_t < COOLDOWN_SECONDS):
+                continue
+
+            self.recent_events[key] = now
+
+            decision, status = self.decide(final_plate)
+            DECISIONS.labels(decision).inc()
+            log.info("[DECISION] [%s] Plate %s -> %s (status=%s)",
+                     camera["id"], final_plate, decision, status)
+
+            # Snapshot
+            ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+            suffix = "_fallback" if fallback else ""
+            snapshot_name = f"{ts_str}_{final_plate}_{decision}{suffix}.jpg"
+            snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
+
+            # Snapshot is encoded and the row inserted by the writer thread
+            self.writer.log(final_plate, decision, det["det_conf"],
+                            det["ocr_conf"], snapshot_path,
+                            camera["id"], camera["direction"],
+                            snapshot=det["crop"], quality=det.get("quality"))
+
+        # Capture of the frame that closed the track -> gate decision
+        steps.record("decision_latency", time.time() - item["captured_at"])
+        return None
+
+
+def build_pipeline(cap, fps, detector, persister, ocr_workers, drop_policy,
+                   display_q=None, camera=None, motion_cap=None, motion_fps=None,
+                   start_frame=0, ocr_backend=None):
+    """Wire capture -> detect -> track -> OCR -> persist for one source."""
+    frame_q = StageQueue("frames", PIPELINE_QUEUE_SIZE, drop_policy)
+    det_q = StageQueue("detections", PIPELINE_QUEUE_SIZE, drop_policy)
+    track_q = StageQueue("tracks", PIPELINE_QUEUE_SIZE, "block")
+    read_q = StageQueue("readings", PIPELINE_QUEUE_SIZE, "block")
+
+    tracker = Tracker(display_q)
+    pipeline = Pipeline()
+    pipeline.add(SourceStage("capture", make_capture(cap, fps, display_q, camera,
+                                                     motion_cap, motion_fps, start_frame),
+                                 frame_q))
+    # One detect worker per batch slot so enough ROIs are in flight to fill a batch
+    # Workers wait on the batched detector in parallel; ordered keeps each
+    # camera's frames in capture order for the tracker
+    pipeline.add(Stage("detect", make_detect(detector), frame_q, det_q,
+                       workers=DETECT_BATCH_SIZE, ordered=True))
+    pipeline.add(Stage("track", tracker, det_q, track_q, on_stop=tracker.flush))
+    pipeline.add(Stage("ocr", partial(ocr, ocr_backend=ocr_backend), track_q, read_q,
+                       workers=ocr_workers))
+    pipeline.add(Stage("persist", persister, read_q))
+    return pipeline
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run ANPR with YOLO + OCR + correction.")
     parser.add_argument("--source", type=str, default="0",
                         help="Video file path or camera index (default 0)")
+    parser.add_argument("--drop-policy", choices=DROP_POLICIES, default=None,
+                        help="Full-queue policy (default: block for files, "
+                             "PIPELINE_DROP_POLICY for cameras)")
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS,
+                        help="Number of OCR worker threads")
+    parser.add_argument("--backend", choices=BACKENDS, default=DETECTOR_BACKEND,
+                        help="Detector runtime (default DETECTOR_BACKEND)")
+    parser.add_argument("--model", type=str, default=None,
+                        help="Model file for the backend (default: path from config.py)")
+    parser.add_argument("--log-level", choices=LEVELS, default=LOG_LEVEL,
+                        help="DEBUG adds per-frame/per-track lines (default LOG_LEVEL)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics on this port (0 = off)")
+    parser.add_argument("--substream", type=str, default=CAMERA_SUBSTREAM,
+                        help="Low-res stream of the same camera for the motion gate")
     args = parser.parse_args()
+    setup_logging(args.log_level)
 
     source = args.source
-    if source.isdigit():
-        source = int(source)
-
-    print(f"[INFO] Opening source: {source}")
-    cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        print(f"[ERROR] Failed to open source: {source}")
+    camera = default_camera()
+    camera["substream"] = args.substream
+
+    # Files can be read as fast as we like, so never drop their frames;
+    # a live camera must not fall behind, so shed load instead.
+    drop_policy = args.drop_policy
+    if drop_policy is None:
+        drop_policy = PIPELINE_DROP_POLICY if is_live_source(source) else "block"
+
+    # Live sources decode on a grabber thread that keeps only the newest frame
+    log.info("Opening source: %s", source)
+    cap, fps, motion_cap, motion_fps = open_camera(source, camera)
+    if cap is None:
+        log.error("Failed to open source: %s", source)
         return
     else:
-        print("[INFO] Source opened successfully.")
-
-    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-    print(f"[INFO] FPS detected: {fps:.2f}")
-
-    # Load YOLOv8n model
-    model_path = MODEL_PATH if os.path.exists(MODEL_PATH) else "yolov8n.pt"
-    print(f"[INFO] Loading YOLO model from: {model_path}")
-    model = YOLO(model_path)
-
-    conn = connect_db()
-    print(f"[INFO] Connected to DB at {DB_PATH}")
+        log.info("Source opened successfully.")
+
+    log.info("FPS detected: %.2f", fps)
+
+    # Plate detector: PyTorch checkpoint or an exported ONNX / OpenVINO model
+    model = load_detector(args.backend, args.model)
+    detector = BatchedDetector(
+        model,
+        batch_size=DETECT_BATCH_SIZE,
+        max_wait_ms=DETECT_BATCH_MAX_WAIT_MS,
+        imgsz=DETECT_IMGSZ,
+        conf=DETECTION_CONFIDENCE,
+        iou=IOU_THRESHOLD,
+    )
+    # Fails here on an unknown OCR_BACKEND instead of on the first track
+    warm_up_ocr(OCR_ROI_FALLBACK)
 
     os.makedirs(SNAPSHOT_DIR, exist_ok=True)
-    print(f"[INFO] Snapshots directory: {SNAPSHOT_DIR}")
-
-    frame_idx = 0
-    recent_events = {}  # plate -> last_detection_time
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("[INFO] End of video or cannot read frame.")
-            break
-
-        frame_idx += 1
-
-        if frame_idx == 1:
-            print(f"[INFO] First frame size: {frame.shape}")
-
-        # Timestamp of this frame
-        current_time_sec = frame_idx / fps
-        current_ts_str = seconds_to_hms(current_time_sec)
-
-        # Skip frames to save compute
-        if frame_idx % FRAME_SKIP != 0:
-            if SHOW_WINDOW:
-                cv2.imshow("ANPR", frame)
+    log.info("Snapshots directory: %s", SNAPSHOT_DIR)
+
+    # Correction index from known plates + vehicles table, kept live
+    registry = start_registry()
+    statuses = VehicleStatusCache().start()
+    writer = LogWriter().start()
+
+    # Display runs on the main thread (HighGUI is not thread-safe)
+    display_q = StageQueue("display", 2, "drop_oldest") if SHOW_WINDOW else None
+
+    pipeline = build_pipeline(cap, fps, detector, Persister(statuses, writer),
+                              args.ocr_workers, drop_policy, display_q, camera,
+                              motion_cap, motion_fps)
+
+    metrics_server = serve_metrics(args.metrics_port, METRICS_HOST)
+    log.info("Pipeline started (ocr_workers=%s, drop_policy=%s)", args.ocr_workers, drop_policy)
+    pipeline.start()
+
+    last_stats = time.time()
+    try:
+        while pipeline.is_alive():
+            if display_q is not None:
+                try:
+                    frame = display_q.get(timeout=0.05)
+                except queue.Empty:
+                    frame = None
+                if frame is not None and frame is not STOP:
+                    cv2.imshow("ANPR", frame)
                 if cv2.waitKey(1) & 0xFF == 27:
-                    break
-            continue
-
-        H, W, _ = frame.shape
-
-        # Compute ROI
-        y1_roi = int(H * ROI_TOP)
-        y2_roi = int(H * ROI_BOTTOM)
-        x1_roi = int(W * ROI_LEFT)
-        x2_roi = int(W * ROI_RIGHT)
-
-        # Clamp
-        y1_roi = max(0, min(H - 1, y1_roi))
-        y2_roi = max(0, min(H, y2_roi))
-        x1_roi = max(0, min(W - 1, x1_roi))
-        x2_roi = max(0, min(W, x2_roi))
-
-        roi = frame[y1_roi:y2_roi, x1_roi:x2_roi].copy()
-        if roi.size == 0:
-            continue
-
-        roi_up = cv2.resize(
-            roi,
-            None,
-            fx=UPSCALE_FACTOR,
-            fy=UPSCALE_FACTOR,
-            interpolation=cv2.INTER_CUBIC
-        )
-
-        # YOLO detection on upscaled ROI
-        results = model.predict(
-            roi_up,
-            imgsz=640,
-            conf=DETECTION_CONFIDENCE,
-            iou=IOU_THRESHOLD,
-            verbose=False
-        )
-
-        display_frame = frame.copy()
-        now = time.time()
-        det_count = 0
-        any_detected_this_frame = False
-
-        for r in results:
-            boxes = r.boxes
-            if boxes is None or len(boxes) == 0:
-                continue
-
-            for box in boxes:
-                det_count += 1
-
-                x1u, y1u, x2u, y2u = box.xyxy[0].tolist()
-                det_conf = float(box.conf[0])
-
-                # Map back to full frame
-                x1 = int(x1u / UPSCALE_FACTOR + x1_roi)
-                y1 = int(y1u / UPSCALE_FACTOR + y1_roi)
-                x2 = int(x2u / UPSCALE_FACTOR + x1_roi)
-                y2 = int(y2u / UPSCALE_FACTOR + y1_roi)
-
-                x1 = max(0, min(W - 1, x1))
-                y1 = max(0, min(H - 1, y1))
-                x2 = max(0, min(W - 1, x2))
-                y2 = max(0, min(H - 1, y2))
-
-                if x2 <= x1 or y2 <= y1:
-                    continue
-
-                plate_crop = frame[y1:y2, x1:x2]
-
-                # OCR on YOLO crop
-                raw_plate_text, ocr_conf = recognize_plate(plate_crop, min_conf=0.4)
-                # Use correction engine with timestamp
-                final_plate = correct_plate(raw_plate_text, current_ts_str)
-
-                if not final_plate:
-                    # Draw yellow box for unreadable
-                    cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
-                    cv2.putText(display_frame, f"NO READ {det_conf:.2f}",
-                                (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                                (0, 255, 255), 2)
-                    continue
-
-                any_detected_this_frame = True
-                print(f"[DETECT] Frame {frame_idx} ({current_ts_str}) → RAW: {raw_plate_text}, FINAL: {final_plate}, det_conf={det_conf:.2f}, ocr_conf={ocr_conf:.2f}")
-
-                # Cooldown to avoid spam
-                last_t = recent_events.get(final_plate)
-                if last_t and (now - last_t < COOLDOWN_SECONDS):
-                    cv2.rectangle(display_frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
-                    cv2.putText(display_frame, f"{final_plate} (cooldown)",
-                                (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                                (255, 255, 0), 2)
-                    continue
-
-                recent_events[final_plate] = now
-
-                # Decision logic
-                status = get_vehicle_status(conn, final_plate)
-                if status == "blacklisted":
-                    decision = "blocked"
-                    trigger_gate_block(final_plate)
-                    color = (0, 0, 255)
-                else:
-                    decision = "allowed"
-                    trigger_gate_open(final_plate)
-                    color = (0, 255, 0)
-
-                print(f"[DECISION] Plate {final_plate} -> {decision} (status={status})")
-
-                # Snapshot
-                ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-                snapshot_name = f"{ts_str}_{final_plate}_{decision}.jpg"
-                snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
-                cv2.imwrite(snapshot_path, plate_crop)
-
-                # Log
-                insert_log(conn, final_plate, decision, det_conf, ocr_conf, snapshot_path)
-
-                # Draw rect
-                cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(display_frame, f"{final_plate} {decision}",
-                            (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
-                            color, 2)
-
-        # Optional fallback: if YOLO finds nothing, try OCR on whole ROI
-        if det_count == 0:
-            raw_plate_text, ocr_conf = recognize_plate(roi_up, min_conf=0.5)
-            final_plate = correct_plate(raw_plate_text, current_ts_str)
-            if final_plate:
-                any_detected_this_frame = True
-                print(f"[FALLBACK] Frame {frame_idx} ({current_ts_str}) → RAW: {raw_plate_text}, FINAL: {final_plate}, ocr_conf={ocr_conf:.2f}")
-
-                last_t = recent_events.get(final_plate)
-                if not last_t or (now - last_t >= COOLDOWN_SECONDS):
-                    recent_events[final_plate] = now
-
-                    status = get_vehicle_status(conn, final_plate)
-                    if status == "blacklisted":
-                        decision = "blocked"
-                        trigger_gate_block(final_plate)
-                        color = (0, 0, 255)
-                    else:
-                        decision = "allowed"
-                        trigger_gate_open(final_plate)
-                        color = (0, 255, 0)
-
-                    ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    snapshot_name = f"{ts_str}_{final_plate}_{decision}_fallback.jpg"
-                    snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
-                    cv2.imwrite(snapshot_path, roi)
-
-                    insert_log(conn, final_plate, decision, 0.0, ocr_conf, snapshot_path)
-
-                    # Draw text near ROI
-                    cx = (x1_roi + x2_roi) // 2
-                    cy = (y1_roi + y2_roi) // 2
-                    cv2.putText(display_frame, f"{final_plate} {decision} (FB)",
-                                (max(0, cx - 100), max(0, cy - 10)),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-        if SHOW_WINDOW:
-            cv2.imshow("ANPR", display_frame)
-            if cv2.waitKey(1) & 0xFF == 27:
-                break
+                    pipeline.stop()
+            else:
+                time.sleep(0.2)
+
+            if STATS_INTERVAL and time.time() - last_stats >= STATS_INTERVAL:
+                log.info("[STATS] %s", pipeline.format_stats())
+                last_stats = time.time()
+    except KeyboardInterrupt:
+        log.info("Interrupted, draining pipeline...")
+        pipeline.stop()
+
+    pipeline.join()
+    detector.close()
+    registry.stop()
+    statuses.stop()
+    writer.close()
+    log.info("[STATS] %s", pipeline.format_stats())
+    log.info("[STATS] Steps: %s", steps.format())
+    log.info("[STATS] Logs: rows=%s batches=%s", writer.rows_written, writer.batches)
+    log.info("[STATS] YOLO batches=%s avg_batch=%.2f", detector.batches, detector.avg_batch_size())
 
     cap.release()
-    conn.close()
+    if motion_cap is not None:
+        motion_cap.release()
     if SHOW_WINDOW:
         cv2.destroyAllWindows()
-    print("[INFO] Processing finished.")
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    log.info("Processing finished.")
 
 
 if __name__ == "__main__":
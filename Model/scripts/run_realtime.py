@@ -4,8 +4,8 @@ import os
 import sys
 import time
 from datetime import datetime
-import sqlite3
 import argparse
+import logging
 import re
 
 import cv2
@@ -15,17 +15,31 @@ ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from config import (
-    DB_PATH,
     MODEL_PATH,                 # kept for future YOLO reuse, not used now
     FRAME_SKIP,
     COOLDOWN_SECONDS,
     CAMERA_ID,
     CAMERA_MODE,
     SNAPSHOT_DIR,
+    LOG_LEVEL,
+    METRICS_HOST,
+    METRICS_PORT,
     trigger_gate_open,
     trigger_gate_block,
 )
 from scripts.utils_ocr import recognize_plate
+from scripts.metrics import (
+    DECISIONS,
+    FRAMES_PROCESSED,
+    FRAMES_READ,
+    FRAMES_SKIPPED,
+    OCR_CALLS,
+    serve_metrics,
+)
+from scripts.logging_setup import LEVELS, setup_logging
+from scripts.capture import open_source
+from registry import VehicleStatusCache
+from log_writer import LogWriter
 
 # ------------------------
 # ROI + UPSCALE PARAMETERS
@@ -40,37 +54,7 @@ UPSCALE_FACTOR = 3.0     # enlarge ROI before OCR
 SHOW_WINDOW = False      # set True ONLY if cv2.imshow works for you
 # ------------------------
 
-
-def connect_db():
-    return sqlite3.connect(DB_PATH)
-
-
-def get_vehicle_status(conn, plate):
-    c = conn.cursor()
-    c.execute("SELECT status FROM vehicles WHERE plate_number=?", (plate,))
-    row = c.fetchone()
-    if row:
-        return row[0]
-    else:
-        # Unknown plate -> visitor by default
-        c.execute(
-            "INSERT INTO vehicles (plate_number, status) VALUES (?, ?)",
-            (plate, "visitor")
-        )
-        conn.commit()
-        return "visitor"
-
-
-def insert_log(conn, plate, decision, detection_conf, ocr_conf, image_path):
-    c = conn.cursor()
-    timestamp = datetime.now().isoformat(timespec='seconds')
-    c.execute("""
-        INSERT INTO logs (plate_number, timestamp, direction, camera_id,
-                          detection_conf, ocr_conf, image_path, decision)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (plate, timestamp, CAMERA_MODE, CAMERA_ID,
-          detection_conf, ocr_conf, image_path, decision))
-    conn.commit()
+log = logging.getLogger(__name__)
 
 
 def clean_indian_plate(text: str):
@@ -103,103 +87,130 @@ def clean_indian_plate(text: str):
     return None
 
 
+def extract_roi(frame):
+    """
+    Cut the plate ROI out of a frame and upscale it for OCR.
+    Returns (roi_box, roi, roi_up), or None when the ROI is empty.
+    """
+    H, W, _ = frame.shape
+    y1_roi = int(H * ROI_TOP)
+    y2_roi = int(H * ROI_BOTTOM)
+    x1_roi = int(W * ROI_LEFT)
+    x2_roi = int(W * ROI_RIGHT)
+
+    # Safety clamp
+    y1_roi = max(0, min(H - 1, y1_roi))
+    y2_roi = max(0, min(H, y2_roi))
+    x1_roi = max(0, min(W - 1, x1_roi))
+    x2_roi = max(0, min(W, x2_roi))
+
+    roi = frame[y1_roi:y2_roi, x1_roi:x2_roi].copy()
+    if roi.size == 0:
+        return None
+
+    # Upscale ROI
+    roi_up = cv2.resize(
+        roi,
+        None,
+        fx=UPSCALE_FACTOR,
+        fy=UPSCALE_FACTOR,
+        interpolation=cv2.INTER_CUBIC
+    )
+    return (x1_roi, y1_roi, x2_roi, y2_roi), roi, roi_up
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run OCR-only ANPR on video or camera.")
     parser.add_argument("--source", type=str, default="0",
                         help="Video file path or camera index (default 0)")
+    parser.add_argument("--log-level", choices=LEVELS, default=LOG_LEVEL,
+                        help="DEBUG adds per-frame lines (default LOG_LEVEL)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics on this port (0 = off)")
     args = parser.parse_args()
+    setup_logging(args.log_level)
 
     # Open source
     source = args.source
-    if source.isdigit():
-        source = int(source)
 
-    print(f"[INFO] Opening source: {source}")
-    cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        print(f"[ERROR] Failed to open source: {source}")
+    # Live sources decode on a grabber thread that keeps only the newest frame
+    log.info("Opening source: %s", source)
+    cap, _ = open_source(source, CAMERA_ID)
+    if cap is None:
+        log.error("Failed to open source: %s", source)
         return
     else:
-        print("[INFO] Source opened successfully.")
+        log.info("Source opened successfully.")
+
+    # Snapshots and logs rows are written in batches off the frame loop
+    writer = LogWriter().start()
 
-    conn = connect_db()
-    print(f"[INFO] Connected to DB at {DB_PATH}")
+    # Gate decisions read statuses from memory; visitors are written behind
+    statuses = VehicleStatusCache().start()
 
     frame_idx = 0
     recent_events = {}  # plate -> last_detection_time
 
     os.makedirs(SNAPSHOT_DIR, exist_ok=True)
-    print(f"[INFO] Snapshots will be saved to {SNAPSHOT_DIR}")
+    log.info("Snapshots will be saved to %s", SNAPSHOT_DIR)
+    metrics_server = serve_metrics(args.metrics_port, METRICS_HOST)
+    frames_read = FRAMES_READ.labels(CAMERA_ID)
+    frames_skipped = FRAMES_SKIPPED.labels(CAMERA_ID)
+    frames_processed = FRAMES_PROCESSED.labels(CAMERA_ID)
+    ocr_calls = OCR_CALLS.labels("fallback")
 
     while True:
         ret, frame = cap.read()
         if not ret:
-            print("[INFO] End of video or cannot read frame.")
+            log.info("End of video or cannot read frame.")
             break
 
         frame_idx += 1
+        frames_read.inc()
 
         if frame_idx == 1:
-            print(f"[INFO] First frame size: {frame.shape}")
+            log.info("First frame size: %s", frame.shape)
 
         # Skip frames for speed
         if frame_idx % FRAME_SKIP != 0:
+            frames_skipped.inc()
             if SHOW_WINDOW:
                 cv2.imshow("ANPR", frame)
                 if cv2.waitKey(1) & 0xFF == 27:
                     break
             continue
 
-        print(f"[DEBUG] Processing frame {frame_idx}")
+        frames_processed.inc()
+        log.debug("Processing frame %d", frame_idx)
 
-        H, W, _ = frame.shape
-        y1_roi = int(H * ROI_TOP)
-        y2_roi = int(H * ROI_BOTTOM)
-        x1_roi = int(W * ROI_LEFT)
-        x2_roi = int(W * ROI_RIGHT)
-
-        # Safety clamp
-        y1_roi = max(0, min(H - 1, y1_roi))
-        y2_roi = max(0, min(H, y2_roi))
-        x1_roi = max(0, min(W - 1, x1_roi))
-        x2_roi = max(0, min(W, x2_roi))
-
-        roi = frame[y1_roi:y2_roi, x1_roi:x2_roi].copy()
-        print(f"[DEBUG] ROI shape: {roi.shape}")
-
-        if roi.size == 0:
-            print("[WARN] ROI empty, skipping frame.")
+        extracted = extract_roi(frame)
+        if extracted is None:
+            log.warning("ROI empty, skipping frame.")
             continue
-
-        # Upscale ROI
-        roi_up = cv2.resize(
-            roi,
-            None,
-            fx=UPSCALE_FACTOR,
-            fy=UPSCALE_FACTOR,
-            interpolation=cv2.INTER_CUBIC
-        )
-        print(f"[DEBUG] Upscaled ROI shape: {roi_up.shape}")
+        (x1_roi, y1_roi, x2_roi, y2_roi), roi, roi_up = extracted
+        log.debug("ROI shape: %s, upscaled: %s", roi.shape, roi_up.shape)
 
         # OCR on ROI
+        ocr_calls.inc()
         raw_text, ocr_conf = recognize_plate(roi_up, min_conf=0.4)
-        print(f"[DEBUG] Raw OCR: {raw_text}, conf: {ocr_conf:.2f}")
+        log.debug("Raw OCR: %s, conf: %.2f", raw_text, ocr_conf)
 
         plate_text = clean_indian_plate(raw_text)
         if not plate_text:
-            print(f"[DEBUG] Frame {frame_idx}: no valid plate after cleaning.")
+            log.debug("Frame %d: no valid plate after cleaning.", frame_idx)
             if SHOW_WINDOW:
                 cv2.imshow("ANPR", frame)
                 if cv2.waitKey(1) & 0xFF == 27:
                     break
             continue
 
-        print(f"[DETECT] Frame {frame_idx} → RAW: {raw_text}, CLEAN: {plate_text}, ocr_conf: {ocr_conf:.2f}")
+        log.info("[DETECT] Frame %d → RAW: %s, CLEAN: %s, ocr_conf: %.2f",
+                 frame_idx, raw_text, plate_text, ocr_conf)
 
         now = time.time()
         last_t = recent_events.get(plate_text)
         if last_t and (now - last_t < COOLDOWN_SECONDS):
-            print(f"[INFO] Plate {plate_text} in cooldown, skipping log.")
+            log.debug("Plate %s in cooldown, skipping log.", plate_text)
             if SHOW_WINDOW:
                 cv2.imshow("ANPR", frame)
                 if cv2.waitKey(1) & 0xFF == 27:
@@ -209,7 +220,7 @@ def main():
         recent_events[plate_text] = now
 
         # DECISION LOGIC
-        status = get_vehicle_status(conn, plate_text)
+        status = statuses.get_status(plate_text)
         if status == "blacklisted":
             decision = "blocked"
             trigger_gate_block(plate_text)
@@ -217,16 +228,17 @@ def main():
             decision = "allowed"
             trigger_gate_open(plate_text)
 
-        print(f"[DECISION] Plate {plate_text} -> {decision} (status={status})")
+        DECISIONS.labels(decision).inc()
+        log.info("[DECISION] Plate %s -> %s (status=%s)", plate_text, decision, status)
 
         # Save snapshot of ROI
         ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
         snapshot_name = f"{ts_str}_{plate_text}_{decision}_ocr_only.jpg"
         snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
-        cv2.imwrite(snapshot_path, roi)
 
         # Log to DB (detection_conf = 0.0 since no YOLO)
-        insert_log(conn, plate_text, decision, 0.0, ocr_conf, snapshot_path)
+        writer.log(plate_text, decision, 0.0, ocr_conf, snapshot_path,
+                   CAMERA_ID, CAMERA_MODE, snapshot=roi)
 
         # Optional: show frame
         if SHOW_WINDOW:
@@ -242,10 +254,13 @@ def main():
                 break
 
     cap.release()
-    conn.close()
+    statuses.stop()
+    writer.close()
     if SHOW_WINDOW:
         cv2.destroyAllWindows()
-    print("[INFO] Processing finished.")
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    log.info("Processing finished.")
 
 
 if __name__ == "__main__":
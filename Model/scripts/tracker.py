@@ -0,0 +1,198 @@
+# scripts/tracker.py
+
+import itertools
+from collections import Counter, defaultdict
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1 = max(a[0], b[0])
+    iy1 = max(a[1], b[1])
+    ix2 = min(a[2], b[2])
+    iy2 = min(a[3], b[3])
+    iw = max(0, ix2 - ix1)
+    ih = max(0, iy2 - iy1)
+    inter = iw * ih
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def centroid_distance(a, b):
+    """Centroid distance between two boxes, relative to the diagonal of a."""
+    ax = (a[0] + a[2]) / 2.0
+    ay = (a[1] + a[3]) / 2.0
+    bx = (b[0] + b[2]) / 2.0
+    by = (b[1] + b[3]) / 2.0
+    diag = ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5 or 1.0
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / diag
+
+
+class Track:
+    """One vehicle plate followed across frames, with its best crops for OCR."""
+
+    def __init__(self, track_id, box, t, top_k, min_score=0.0):
+        self.id = track_id
+        self.box = box
+        self.first_seen = t
+        self.last_seen = t
+        self.hits = 0
+        self.top_k = top_k
+        self.min_score = min_score
+        self.best_det_conf = 0.0
+        self.candidates = []  # [(score, crop, det_conf, ts_str)] best first
+        self.emitted = False
+
+    def add(self, box, t, crop, det_conf, ts_str, score):
+        self.box = box
+        self.last_seen = t
+        self.hits += 1
+        self.best_det_conf = max(self.best_det_conf, det_conf)
+
+        if self.emitted or score < self.min_score:
+            return
+        if len(self.candidates) < self.top_k or score > self.candidates[-1][0]:
+            # Copy so the candidate doesn't keep the whole frame alive
+            self.candidates.append((score, crop.copy(), det_conf, ts_str))
+            self.candidates.sort(key=lambda c: c[0], reverse=True)
+            del self.candidates[self.top_k:]
+
+
+class PlateTracker:
+    """
+    Lightweight IoU/centroid tracker linking YOLO plate boxes across frames.
+
+    update() returns tracks that are ready for one OCR + decision:
+      - tracks not seen for max_age seconds (vehicle has left), or
+      - tracks alive for max_duration seconds (vehicle waiting at the gate),
+        so the barrier does not wait for the vehicle to leave the ROI.
+    Each track is returned at most once. Crops scoring below min_score still
+    extend the track but are never kept as OCR candidates.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_dist=1.0, max_age=1.0,
+                 max_duration=3.0, min_hits=2, top_k=3, min_score=0.0):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_dist = max_centroid_dist
+        self.max_age = max_age
+        self.max_duration = max_duration
+        self.min_hits = min_hits
+        self.top_k = top_k
+        self.min_score = min_score
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def _match(self, detections):
+        """Greedy IoU matching, then centroid distance for the leftovers."""
+        pairs = []
+        for ti, tr in enumerate(self.tracks):
+            for di, det in enumerate(detections):
+                score = iou(tr.box, det["box"])
+                if score >= self.iou_threshold:
+                    pairs.append((score, ti, di))
+        pairs.sort(reverse=True)
+
+        matched_t = set()
+        matched_d = set()
+        matches = []
+        for _, ti, di in pairs:
+            if ti in matched_t or di in matched_d:
+                continue
+            matched_t.add(ti)
+            matched_d.add(di)
+            matches.append((ti, di))
+
+        for di, det in enumerate(detections):
+            if di in matched_d:
+                continue
+            best = None
+            for ti, tr in enumerate(self.tracks):
+                if ti in matched_t:
+                    continue
+                d = centroid_distance(tr.box, det["box"])
+                if d <= self.max_centroid_dist and (best is None or d < best[0]):
+                    best = (d, ti)
+            if best is not None:
+                matched_t.add(best[1])
+                matched_d.add(di)
+                matches.append((best[1], di))
+
+        unmatched = [di for di in range(len(detections)) if di not in matched_d]
+        return matches, unmatched
+
+    def update(self, t, detections, ts_str=""):
+        """
+        detections: [{"box", "det_conf", "crop", "score"}] for one frame at
+        stream time t (seconds). Returns the list of tracks ready to decide.
+        """
+        matches, unmatched = self._match(detections)
+        for ti, di in matches:
+            det = detections[di]
+            self.tracks[ti].add(det["box"], t, det["crop"], det["det_conf"],
+                                ts_str, det["score"])
+        for di in unmatched:
+            det = detections[di]
+            tr = Track(next(self._ids), det["box"], t, self.top_k, self.min_score)
+            tr.add(det["box"], t, det["crop"], det["det_conf"], ts_str, det["score"])
+            self.tracks.append(tr)
+
+        ready = []
+        alive = []
+        for tr in self.tracks:
+            gone = t - tr.last_seen > self.max_age
+            if not tr.emitted and tr.hits >= self.min_hits and (
+                    gone or t - tr.first_seen >= self.max_duration):
+                tr.emitted = True
+                ready.append(tr)
+            if not gone:
+                alive.append(tr)
+        self.tracks = alive
+        return ready
+
+    def flush(self):
+        """End all tracks (end of stream); returns those not yet decided."""
+        ready = [tr for tr in self.tracks
+                 if not tr.emitted and tr.hits >= self.min_hits]
+        for tr in ready:
+            tr.emitted = True
+        self.tracks = []
+        return ready
+
+
+def fuse_readings(readings):
+    """
+    Fuse several OCR readings of the same plate by character-level voting.
+
+    readings: [(text, conf)], text already cleaned (A-Z0-9) or None.
+    The most common length (weighted by confidence) wins, then each position
+    is voted on by the readings of that length. Returns (text, conf) where
+    conf is the mean winning vote share weighted by confidence, or (None, 0.0).
+    """
+    readings = [(t, c) for t, c in readings if t]
+    if not readings:
+        return None, 0.0
+    if len(readings) == 1:
+        return readings[0]
+
+    length_votes = Counter()
+    for t, c in readings:
+        length_votes[len(t)] += c
+    length = length_votes.most_common(1)[0][0]
+    same_len = [(t, c) for t, c in readings if len(t) == length]
+
+    total = sum(c for _, c in same_len) or 1.0
+    chars = []
+    confs = []
+    for pos in range(length):
+        votes = defaultdict(float)
+        for t, c in same_len:
+            votes[t[pos]] += c
+        ch, w = max(votes.items(), key=lambda kv: kv[1])
+        chars.append(ch)
+        confs.append(w / total)
+
+    # Scale vote agreement by how confident the contributing readings were
+    mean_conf = total / len(same_len)
+    return "".join(chars), mean_conf * sum(confs) / len(confs)
@@ -1,36 +1,148 @@
 import os
 import sys
+import shutil
+import argparse
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
-from ultralytics import YOLO
-from config import DATA_YAML, MODEL_PATH
+from config import (
+    DATA_YAML,
+    MODEL_PATH,
+    ONNX_MODEL_PATH,
+    ONNX_INT8_MODEL_PATH,
+    OPENVINO_MODEL_PATH,
+    DETECTOR_BACKEND,
+    DETECT_IMGSZ,
+    TRAIN_BASE_WEIGHTS,
+    TRAIN_RUNS_DIR,
+    TRAIN_RUN_NAME,
+    TRAIN_EPOCHS,
+    TRAIN_PATIENCE,
+    TRAIN_BATCH,
+    TRAIN_CACHE,
+    TRAIN_WORKERS,
+    TRAIN_DEVICE,
+)
+from scripts.export_detector import export_onnx, export_openvino, quantize_onnx, file_size_mb
+
+CACHE_MODES = ("ram", "disk", "none")
+EXPORTS = ("onnx", "int8", "openvino")
+
+# Formats the configured DETECTOR_BACKEND loads (ultralytics runs the .pt itself)
+BACKEND_EXPORTS = {
+    "ultralytics": [],
+    "onnxruntime": ["onnx"],
+    "openvino": ["openvino"],
+}
+
+
+def last_checkpoint(runs_dir=TRAIN_RUNS_DIR, name=TRAIN_RUN_NAME):
+    return os.path.join(runs_dir, name, "weights", "last.pt")
 
-def train():
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
 
-    # Start from YOLOv8n base model
-    model = YOLO("yolov8n.pt")  # downloaded automatically by ultralytics
-
-    model.train(
-        data=DATA_YAML,
-        epochs=15,
-        imgsz=640,
-        batch=8,
-        name="anpr-plates",
-        exist_ok=True
-    )
-
-    # Get best weights
-    runs_dir = os.path.join(ROOT_DIR, "runs", "detect", "anpr-plates")
-    best_ckpt = os.path.join(runs_dir, "weights", "best.pt")
-    if os.path.exists(best_ckpt):
-        import shutil
-        shutil.copy(best_ckpt, MODEL_PATH)
-        print(f"Copied best model to {MODEL_PATH}")
+def train(weights, data, epochs, batch, imgsz, cache, workers, patience, device,
+          hours=None, freeze=None, resume=None):
+    """
+    Train (or resume) the plate detector; returns the run's best.pt.
+    Every epoch writes weights/last.pt, so an interrupted run can be resumed.
+    """
+    from ultralytics import YOLO
+
+    if resume:
+        # ultralytics restores the run's own arguments from the checkpoint
+        print(f"[INFO] Resuming from {resume}")
+        model = YOLO(resume)
+        model.train(resume=True)
     else:
-        print("Training done, but couldn't find best.pt")
+        print(f"[INFO] Training from {weights}")
+        model = YOLO(weights)
+        model.train(
+            data=data,
+            epochs=epochs,
+            time=hours,              # hours; overrides epochs when set
+            patience=patience,       # early stop when val mAP stops improving
+            batch=batch,
+            imgsz=imgsz,
+            cache=False if cache == "none" else cache,
+            workers=workers,
+            device=device,
+            freeze=freeze,
+            project=TRAIN_RUNS_DIR,
+            name=TRAIN_RUN_NAME,
+            exist_ok=True,
+        )
+
+    best_ckpt = os.path.join(str(model.trainer.save_dir), "weights", "best.pt")
+    if not os.path.exists(best_ckpt):
+        print(f"[ERROR] Training done, but {best_ckpt} is missing")
+        sys.exit(1)
+    return best_ckpt
+
+
+def export(weights, imgsz, formats):
+    """Write the inference models the detector backends load (paths from config.py)."""
+    outputs = []
+    if "onnx" in formats or "int8" in formats:
+        outputs.append(export_onnx(weights, imgsz, ONNX_MODEL_PATH))
+    if "int8" in formats:
+        outputs.append(quantize_onnx(ONNX_MODEL_PATH, ONNX_INT8_MODEL_PATH, imgsz))
+    if "openvino" in formats:
+        outputs.append(os.path.dirname(export_openvino(weights, imgsz, OPENVINO_MODEL_PATH)))
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the YOLO plate detector and export it.")
+    parser.add_argument("--data", default=DATA_YAML,
+                        help="Dataset yaml (scripts/prepare_dataset.py writes it)")
+    parser.add_argument("--weights", default=None,
+                        help=f"Start weights (default: {os.path.basename(MODEL_PATH)} if trained "
+                             f"before, else {TRAIN_BASE_WEIGHTS})")
+    parser.add_argument("--resume", nargs="?", const=last_checkpoint(), default=None,
+                        help="Continue an interrupted run (default: its weights/last.pt)")
+    parser.add_argument("--epochs", type=int, default=TRAIN_EPOCHS)
+    parser.add_argument("--hours", type=float, default=None,
+                        help="Train for this long instead of --epochs")
+    parser.add_argument("--patience", type=int, default=TRAIN_PATIENCE,
+                        help="Stop after this many epochs without improvement")
+    parser.add_argument("--batch", type=int, default=TRAIN_BATCH)
+    parser.add_argument("--imgsz", type=int, default=DETECT_IMGSZ)
+    parser.add_argument("--cache", choices=CACHE_MODES, default=TRAIN_CACHE,
+                        help="Keep decoded images in RAM or as .npy files on disk between epochs")
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS,
+                        help="Dataloader worker processes")
+    parser.add_argument("--freeze", type=int, default=None,
+                        help="Freeze the first N layers (10 = backbone) to fine-tune faster")
+    parser.add_argument("--device", default=TRAIN_DEVICE)
+    parser.add_argument("--export", nargs="*", choices=EXPORTS, default=None,
+                        help=f"Models to write after training (default for "
+                             f"{DETECTOR_BACKEND}: {BACKEND_EXPORTS[DETECTOR_BACKEND] or 'none'})")
+    args = parser.parse_args()
+
+    if args.resume:
+        if not os.path.exists(args.resume):
+            print(f"[ERROR] No checkpoint at {args.resume}")
+            sys.exit(1)
+    elif not os.path.exists(args.data):
+        print(f"[ERROR] {args.data} not found; run scripts/prepare_dataset.py first")
+        sys.exit(1)
+
+    # Fine-tuning the current plate model converges in far fewer epochs than
+    # starting again from the COCO weights
+    weights = args.weights or (MODEL_PATH if os.path.exists(MODEL_PATH) else TRAIN_BASE_WEIGHTS)
+    best_ckpt = train(weights, args.data, args.epochs, args.batch, args.imgsz, args.cache,
+                      args.workers, args.patience, args.device, args.hours, args.freeze,
+                      args.resume)
+
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    shutil.copy(best_ckpt, MODEL_PATH)
+    print(f"[INFO] Copied best model to {MODEL_PATH}")
+
+    formats = BACKEND_EXPORTS[DETECTOR_BACKEND] if args.export is None else args.export
+    for path in [MODEL_PATH] + export(MODEL_PATH, args.imgsz, formats):
+        print(f"  {path}: {file_size_mb(path):.1f} MB")
+
 
 if __name__ == "__main__":
-    train()
+    main()
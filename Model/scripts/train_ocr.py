@@ -0,0 +1,287 @@
+# scripts/train_ocr.py
+
+import os
+import re
+import sys
+import csv
+import glob
+import time
+import random
+import argparse
+
+import cv2
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from config import (
+    SNAPSHOT_DIR,
+    CRNN_DATA_DIR,
+    CRNN_MODEL_PATH,
+    CRNN_IMG_HEIGHT,
+    CRNN_IMG_WIDTH,
+)
+from scripts.ocr_backends import CHARSET, prepare_plate, ctc_greedy_decode
+
+# {YYYYmmdd}_{HHMMSS}_{PLATE}_{decision}.jpg written by run_anpr's Persister;
+# "_fallback" / "_ocr_only" snapshots are whole ROIs and do not match
+SNAPSHOT_NAME = re.compile(r"^\d{8}_\d{6}_([A-Z0-9]+)_(allowed|blocked)\.jpg$")
+
+
+def load_labels(data_dir):
+    """(image path, plate) pairs from data_dir/labels.csv (columns: filename,plate)."""
+    path = os.path.join(data_dir, "labels.csv")
+    samples = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            plate = row["plate"].strip().upper()
+            if plate and all(c in CHARSET for c in plate):
+                samples.append((os.path.join(data_dir, row["filename"]), plate))
+    return samples
+
+
+def load_snapshots(snapshot_dir):
+    """
+    (image path, plate) pairs from plate-crop snapshots, labelled by the plate
+    in the file name. Those labels are past OCR reads, so review them (or copy
+    the good ones into labels.csv) before trusting them. Whole-ROI fallback
+    snapshots are skipped: they are not plate crops.
+    """
+    samples = []
+    for path in sorted(glob.glob(os.path.join(snapshot_dir, "*.jpg"))):
+        m = SNAPSHOT_NAME.match(os.path.basename(path))
+        if m:
+            samples.append((path, m.group(1)))
+    return samples
+
+
+def split_samples(samples, val_frac, seed=0):
+    samples = list(samples)
+    random.Random(seed).shuffle(samples)
+    n_val = max(1, int(len(samples) * val_frac))
+    return samples[n_val:], samples[:n_val]
+
+
+def augment(img, rng):
+    """Light photometric/geometric jitter: small rotation, scale, blur, contrast."""
+    h, w = img.shape[:2]
+    angle = rng.uniform(-4, 4)
+    scale = rng.uniform(0.9, 1.05)
+    M = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, scale)
+    img = cv2.warpAffine(img, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
+    if rng.random() < 0.3:
+        img = cv2.GaussianBlur(img, (3, 3), 0)
+    alpha = rng.uniform(0.7, 1.3)
+    beta = rng.uniform(-30, 30)
+    return cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+
+
+def encode(plate):
+    return [CHARSET.index(c) + 1 for c in plate]  # 0 is the CTC blank
+
+
+def build_model(num_classes):
+    import torch.nn as nn
+
+    def block(cin, cout, pool):
+        layers = [nn.Conv2d(cin, cout, 3, padding=1, bias=False),
+                  nn.BatchNorm2d(cout), nn.ReLU(inplace=True)]
+        if pool:
+            layers.append(nn.MaxPool2d(pool))
+        return layers
+
+    class PlateCRNN(nn.Module):
+        """
+        32 x W gray line -> (N, W/4, num_classes) logits. About 0.9M parameters:
+        four conv stages squeeze the height to 1, a BiGRU reads the columns.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.cnn = nn.Sequential(
+                *block(1, 32, 2),          # 16 x W/2
+                *block(32, 64, 2),         # 8 x W/4
+                *block(64, 128, None),
+                *block(128, 128, (2, 1)),  # 4 x W/4
+                *block(128, 192, (2, 1)),  # 2 x W/4
+                *block(192, 192, (2, 1)),  # 1 x W/4
+            )
+            self.rnn = nn.GRU(192, 128, bidirectional=True, batch_first=True)
+            self.fc = nn.Linear(256, num_classes)
+
+        def forward(self, x):
+            f = self.cnn(x).squeeze(2).permute(0, 2, 1)  # (N, T, C)
+            f, _ = self.rnn(f)
+            return self.fc(f)
+
+    return PlateCRNN()
+
+
+def make_batches(samples, images, batch_size, rng=None):
+    """Yield (float32 NCHW batch, targets list) with optional augmentation."""
+    order = list(range(len(samples)))
+    if rng is not None:
+        rng.shuffle(order)
+    for s in range(0, len(order), batch_size):
+        idx = order[s:s + batch_size]
+        batch = np.empty((len(idx), 1, CRNN_IMG_HEIGHT, CRNN_IMG_WIDTH), dtype=np.float32)
+        targets = []
+        for k, i in enumerate(idx):
+            img = images[i]
+            if rng is not None:
+                img = augment(img, rng)
+            batch[k, 0] = prepare_plate(img, CRNN_IMG_HEIGHT, CRNN_IMG_WIDTH)
+            targets.append(encode(samples[i][1]))
+        yield batch, targets
+
+
+def read_images(samples):
+    kept, images = [], []
+    for path, plate in samples:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"[WARN] Could not read {path}, skipped")
+            continue
+        kept.append((path, plate))
+        images.append(img)
+    return kept, images
+
+
+def train(samples, val_samples, epochs, batch_size, lr, device):
+    import torch
+    import torch.nn as nn
+
+    train_set, train_imgs = read_images(samples)
+    val_set, val_imgs = read_images(val_samples)
+    print(f"[INFO] Training on {len(train_set)} crops, validating on {len(val_set)}")
+
+    model = build_model(len(CHARSET) + 1).to(device)
+    opt = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-4)
+    steps = epochs * (-(-len(train_set) // batch_size))
+    sched = torch.optim.lr_scheduler.OneCycleLR(opt, max_lr=lr, total_steps=max(1, steps))
+    ctc = nn.CTCLoss(blank=0, zero_infinity=True)
+    rng = np.random.default_rng(0)
+
+    best_acc = -1.0
+    best_state = None
+    for epoch in range(1, epochs + 1):
+        model.train()
+        total = 0.0
+        for batch, targets in make_batches(train_set, train_imgs, batch_size, rng):
+            x = torch.from_numpy(batch).to(device)
+            log_probs = model(x).log_softmax(2).permute(1, 0, 2)  # (T, N, C) for CTCLoss
+            flat = torch.tensor([c for t in targets for c in t], dtype=torch.long)
+            target_lens = torch.tensor([len(t) for t in targets], dtype=torch.long)
+            input_lens = torch.full((len(targets),), log_probs.size(0), dtype=torch.long)
+            loss = ctc(log_probs, flat, input_lens, target_lens)
+
+            opt.zero_grad()
+            loss.backward()
+            nn.utils.clip_grad_norm_(model.parameters(), 5.0)
+            opt.step()
+            sched.step()
+            total += loss.item() * len(targets)
+
+        acc = evaluate_torch(model, val_set, val_imgs, batch_size, device)
+        print(f"[INFO] Epoch {epoch}/{epochs} loss={total / len(train_set):.4f} val_acc={acc:.3f}")
+        if acc > best_acc:
+            best_acc = acc
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+
+    model.load_state_dict(best_state)
+    print(f"[INFO] Best val accuracy: {best_acc:.3f}")
+    return model, val_set, val_imgs
+
+
+def evaluate_torch(model, samples, images, batch_size, device):
+    import torch
+    model.eval()
+    correct = 0
+    with torch.no_grad():
+        for s, (batch, _) in enumerate(make_batches(samples, images, batch_size)):
+            logits = model(torch.from_numpy(batch).to(device)).cpu().numpy()
+            for k in range(len(logits)):
+                text, _ = ctc_greedy_decode(logits[k])
+                correct += text == samples[s * batch_size + k][1]
+    return correct / float(max(1, len(samples)))
+
+
+def export_onnx(model, out_path):
+    """Export with a dynamic batch axis so one session run reads every crop of a track."""
+    import torch
+    model = model.cpu().eval()
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    dummy = torch.zeros(1, 1, CRNN_IMG_HEIGHT, CRNN_IMG_WIDTH)
+    torch.onnx.export(
+        model, dummy, out_path,
+        input_names=["image"], output_names=["logits"],
+        dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=13,
+    )
+    print(f"[INFO] CRNN model written to {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+
+
+def benchmark(name, read_fn, samples, images, batch_size):
+    """Exact-match accuracy and ms per crop of read_fn(list of crops) -> [text]."""
+    read_fn(images[:batch_size])  # warm-up
+    correct = 0
+    t0 = time.perf_counter()
+    for s in range(0, len(images), batch_size):
+        texts = read_fn(images[s:s + batch_size])
+        correct += sum(t == samples[s + k][1] for k, t in enumerate(texts))
+    ms = (time.perf_counter() - t0) * 1000.0 / max(1, len(images))
+    acc = correct / float(max(1, len(images)))
+    print(f"{name:<28} acc={acc:.3f}  {ms:7.2f} ms/crop")
+
+
+def compare(val_set, val_imgs, model_path, batch_size):
+    """Exported CRNN on ONNX Runtime vs EasyOCR, on the same validation crops."""
+    from scripts.ocr_backends import CrnnRecognizer
+    from scripts.utils_ocr import clean_plate, _recognize_easyocr
+
+    crnn = CrnnRecognizer(model_path, CRNN_IMG_HEIGHT, CRNN_IMG_WIDTH)
+    benchmark("crnn (onnxruntime)",
+              lambda crops: [clean_plate(t) for t, _ in crnn.read_batch(crops)],
+              val_set, val_imgs, batch_size)
+    benchmark("easyocr",
+              lambda crops: [t for t, _ in _recognize_easyocr(crops, 0.0)],
+              val_set, val_imgs, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the CRNN plate recognizer and export it to ONNX.")
+    parser.add_argument("--data", default=CRNN_DATA_DIR,
+                        help="Folder with plate crops and labels.csv (filename,plate)")
+    parser.add_argument("--from-snapshots", action="store_true",
+                        help=f"Also use crops in {SNAPSHOT_DIR}, labelled by file name")
+    parser.add_argument("--epochs", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=2e-3)
+    parser.add_argument("--val-frac", type=float, default=0.1)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--out", default=CRNN_MODEL_PATH)
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare the exported model with EasyOCR on the val crops")
+    args = parser.parse_args()
+
+    samples = []
+    if os.path.exists(os.path.join(args.data, "labels.csv")):
+        samples += load_labels(args.data)
+    if args.from_snapshots:
+        samples += load_snapshots(SNAPSHOT_DIR)
+    if len(samples) < 10:
+        print(f"[ERROR] Only {len(samples)} labelled crops; add {args.data}/labels.csv "
+              f"or use --from-snapshots")
+        sys.exit(1)
+
+    train_samples, val_samples = split_samples(samples, args.val_frac)
+    model, val_set, val_imgs = train(train_samples, val_samples, args.epochs,
+                                     args.batch, args.lr, args.device)
+    export_onnx(model, args.out)
+    if args.compare:
+        compare(val_set, val_imgs, args.out, args.batch)
+
+
+if __name__ == "__main__":
+    main()
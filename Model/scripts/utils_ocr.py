@@ -1,19 +1,65 @@
 # scripts/utils_ocr.py
 
-import easyocr
 import re
+import math
 import numpy as np
 import cv2
 
+from config import (
+    OCR_BACKEND,
+    CRNN_MODEL_PATH,
+    CRNN_IMG_HEIGHT,
+    CRNN_IMG_WIDTH,
+    ONNX_PROVIDERS,
+    DETECTOR_THREADS,
+)
+from scripts.ocr_backends import OCR_BACKENDS
+
 _reader = None
+_plate_reader = None
+
+# Characters that can appear on an Indian plate; restricts the recognizer
+PLATE_ALLOWLIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+# Height every crop is normalised to before batching (EasyOCR recognizer input)
+BATCH_LINE_HEIGHT = 64
+BATCH_MAX_WIDTH = 512
 
 def get_ocr_reader():
     global _reader
     if _reader is None:
+        # Imported here so the crnn backend can run without torch
+        import easyocr
         # English only is fine for Indian plates
         _reader = easyocr.Reader(['en'], gpu=False)
     return _reader
 
+def get_plate_reader():
+    """The CRNN plate recognizer (OCR_BACKEND = "crnn"), loaded once."""
+    global _plate_reader
+    if _plate_reader is None:
+        from scripts.ocr_backends import CrnnRecognizer
+        _plate_reader = CrnnRecognizer(CRNN_MODEL_PATH, CRNN_IMG_HEIGHT, CRNN_IMG_WIDTH,
+                                       ONNX_PROVIDERS, DETECTOR_THREADS)
+    return _plate_reader
+
+def get_crop_recognizer(backend=None):
+    """
+    (load, read) for a crop OCR backend (default OCR_BACKEND) from
+    CROP_RECOGNIZERS; raises ValueError for a name not in OCR_BACKENDS.
+    """
+    backend = backend or OCR_BACKEND
+    if backend not in CROP_RECOGNIZERS:
+        raise ValueError(f"Unknown OCR backend: {backend} (choose from {OCR_BACKENDS})")
+    return CROP_RECOGNIZERS[backend]
+
+def warm_up_ocr(fallback=True, backend=None):
+    """Load the crop recognizer up front (and EasyOCR if the ROI fallback needs it)."""
+    load, _ = get_crop_recognizer(backend)
+    load()
+    if fallback:
+        get_ocr_reader()
+
 def clean_plate(text: str):
     """
     Basic cleanup + Indian plate heuristics.
@@ -38,6 +84,22 @@ def clean_plate(text: str):
 
     return None
 
+def _gray_resized(img, size):
+    """
+    Grayscale + resize to size (w, h) with one intermediate image. Inputs
+    that shrink a lot (whole ROIs) are resized first so only the small image
+    is converted; everything else is converted first so the resize works on
+    one channel.
+    """
+    h, w = img.shape[:2]
+    if img.ndim == 2:
+        return cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+    if 3 * size[0] * size[1] < w * h:
+        small = cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_LINEAR)
+
 def recognize_plate(img_bgr, min_conf=0.5):
     """
     Run OCR on plate crop (BGR image).
@@ -46,14 +108,12 @@ def recognize_plate(img_bgr, min_conf=0.5):
     reader = get_ocr_reader()
 
     # Pre-process: grayscale, resize, threshold
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
+    h, w = img_bgr.shape[:2]
     scale = 200.0 / max(h, w)
-    new_size = (int(w * scale), int(h * scale))
-    gray = cv2.resize(gray, new_size, interpolation=cv2.INTER_LINEAR)
+    gray = _gray_resized(img_bgr, (int(w * scale), int(h * scale)))
 
-    # Slight blur + adaptive threshold
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    # Slight blur + adaptive threshold (in place, no extra buffer)
+    cv2.GaussianBlur(gray, (3, 3), 0, dst=gray)
     # Binarize (optional – EasyOCR can handle grayscale, but this helps sometimes)
     # _, gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
@@ -82,3 +142,91 @@ def recognize_plate(img_bgr, min_conf=0.5):
         return None, avg_conf
 
     return cleaned, avg_conf
+
+def _prepare_line(img_bgr):
+    """
+    Grayscale + resize a plate crop to BATCH_LINE_HEIGHT, keeping aspect ratio.
+    """
+    h, w = img_bgr.shape[:2]
+    new_w = int(round(w * BATCH_LINE_HEIGHT / float(h)))
+    new_w = max(BATCH_LINE_HEIGHT // 2, min(BATCH_MAX_WIDTH, new_w))
+    gray = _gray_resized(img_bgr, (new_w, BATCH_LINE_HEIGHT))
+    cv2.GaussianBlur(gray, (3, 3), 0, dst=gray)
+    return gray
+
+def recognize_plates_batch(crops, min_conf=0.5, backend=None):
+    """
+    Run OCR on many YOLO plate crops (BGR) in one recognizer call.
+
+    YOLO has already located the plate, so the CRAFT text detector is skipped:
+    every crop is normalised to one text line and all lines go to EasyOCR's
+    get_text() together, i.e. one recognizer forward pass for the whole
+    batch. (reader.recognize() would run the recognizer once per box on CPU.)
+    Crops may come from one frame or from several frames.
+
+    With backend (default OCR_BACKEND) "crnn" the compact plate recognizer
+    reads them instead.
+
+    Returns a list aligned with crops: (clean_text or None, conf or 0.0).
+    """
+    _, read = get_crop_recognizer(backend)
+    return read(crops, min_conf)
+
+def _recognize_easyocr(crops, min_conf):
+    out = [(None, 0.0)] * len(crops)
+    image_list = []
+    index = []
+    for i, crop in enumerate(crops):
+        if crop is None or crop.size == 0 or min(crop.shape[:2]) < 4:
+            continue
+        line = _prepare_line(crop)
+        h, w = line.shape
+        # The (box, line image) pairs EasyOCR's get_image_list() cuts from a frame
+        image_list.append(([[0, 0], [w, 0], [w, h], [0, h]], line))
+        index.append(i)
+
+    if not image_list:
+        return out
+
+    from easyocr.recognition import get_text
+
+    reader = get_ocr_reader()
+    max_width = max(line.shape[1] for _, line in image_list)
+    result = get_text(
+        reader.character,
+        BATCH_LINE_HEIGHT,
+        int(math.ceil(max_width / float(BATCH_LINE_HEIGHT))) * BATCH_LINE_HEIGHT,
+        reader.recognizer,
+        reader.converter,
+        image_list,
+        ignore_char="".join(set(reader.character) - set(PLATE_ALLOWLIST)),
+        batch_size=len(image_list),
+        workers=0,
+        device=reader.device,
+    )
+
+    # get_text keeps the order of image_list
+    for i, (_, t, conf) in zip(index, result):
+        t = t.strip()
+        conf = float(conf)
+        if not t or conf < min_conf:
+            out[i] = (None, conf)
+            continue
+        out[i] = (clean_plate(t), conf)
+
+    return out
+
+def _recognize_crnn(crops, min_conf):
+    out = []
+    for t, conf in get_plate_reader().read_batch(crops):
+        if not t or conf < min_conf:
+            out.append((None, conf))
+        else:
+            out.append((clean_plate(t), conf))
+    return out
+
+# Crop OCR backends by name (OCR_BACKENDS): (load the model, read a crop batch)
+CROP_RECOGNIZERS = {
+    "easyocr": (get_ocr_reader, _recognize_easyocr),
+    "crnn": (get_plate_reader, _recognize_crnn),
+}
@@ -1,59 +1,146 @@
-from flask import Flask, render_template, request, redirect, url_for
-import sqlite3
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
+import os
+import sys
+import json
+import math
+import threading
+
+# Read the detector's database (Model/db/anpr.db) through the shared data layer
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Model')
+sys.path.append(MODEL_DIR)
+
+from datastore import (
+    ConnectionPool,
+    LogFeed,
+    ensure_indexes,
+    fetch_log_page,
+    fetch_vehicle_page,
+    latest_log_id,
+    page_size,
+    parse_cursor,
+    parse_log_cursor,
+    parse_filters,
+    remove_from_blacklist,
+    set_vehicle_status,
+)
+from scripts.init_db import init_db
 
 app = Flask(__name__)
 
-def init_db():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS plates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            plate_number TEXT UNIQUE,
-            entry_time TEXT,
-            exit_time TEXT,
-            status TEXT
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS blacklisted (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            plate_number TEXT UNIQUE
-        )
-    """)
-    conn.commit()
-    conn.close()
+readers = ConnectionPool(readonly=True)
+writers = ConnectionPool(readonly=False, size=2)
+
+SSE_HEARTBEAT_SEC = 15   # Comment line that keeps idle event streams open
+POLL_TIMEOUT_SEC = 25    # Max wait of one long-poll request
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_feed():
+    # Started on first use so it runs in the serving process (not the reloader)
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = LogFeed().start()
+        return _feed
+
+def prepare_db():
+    init_db()  # Detector schema (vehicles, logs) if it does not exist yet
+    with writers.connection() as conn:
+        ensure_indexes(conn)
 
 @app.route('/')
 def dashboard():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM plates")
-    logs = cursor.fetchall()
-    cursor.execute("SELECT * FROM blacklisted")
-    blacklisted = cursor.fetchall()
-    conn.close()
-    return render_template('dashboard.html', logs=logs, blacklisted=blacklisted)
+    filters = parse_filters(request.args)
+    limit = page_size(request.args.get('limit'))
+    with readers.connection() as conn:
+        logs, next_logs = fetch_log_page(conn, filters, parse_log_cursor(request.args.get('after')), limit)
+        blacklisted, next_blacklisted = fetch_vehicle_page(conn, 'blacklisted', parse_cursor(request.args.get('bl_after')), limit)
+        # The live feed follows ids; the page is in time order, so its first row need not be the newest id
+        last_id = latest_log_id(conn)
+
+    # Cursor links keep the current filters and the other table's position
+    older_logs_url = None
+    if next_logs is not None:
+        older_logs_url = url_for('dashboard', after=next_logs, bl_after=request.args.get('bl_after'), **filters)
+    older_blacklist_url = None
+    if next_blacklisted is not None:
+        older_blacklist_url = url_for('dashboard', after=request.args.get('after'), bl_after=next_blacklisted, **filters)
+
+    # Live updates only make sense on the unfiltered newest page
+    live = not filters and request.args.get('after') is None
+
+    return render_template('dashboard.html', logs=logs, blacklisted=blacklisted, filters=filters,
+                           older_logs_url=older_logs_url, older_blacklist_url=older_blacklist_url,
+                           live=live, last_id=last_id, page_limit=limit)
+
+@app.route('/api/logs')
+def api_logs():
+    filters = parse_filters(request.args)
+    with readers.connection() as conn:
+        rows, next_cursor = fetch_log_page(conn, filters, parse_log_cursor(request.args.get('after')),
+                                           page_size(request.args.get('limit')))
+    return jsonify(items=[dict(row) for row in rows], next=next_cursor)
+
+@app.route('/api/logs/poll')
+def api_logs_poll():
+    # Long-poll: returns as soon as there are logs newer than `after`
+    feed = get_feed()
+    after = parse_cursor(request.args.get('after'))
+    if after is None:
+        after = feed.last_id
+    try:
+        timeout = float(request.args.get('timeout', POLL_TIMEOUT_SEC))
+    except ValueError:
+        timeout = math.nan
+    if not math.isfinite(timeout):
+        return jsonify(error='timeout must be a number of seconds'), 400
+    timeout = max(0.0, min(timeout, POLL_TIMEOUT_SEC))
+    items = feed.wait(after, timeout)
+    return jsonify(items=items, last=items[-1]['id'] if items else after)
+
+@app.route('/api/events')
+def api_events():
+    # Server-Sent Events; browsers resend Last-Event-ID when they reconnect
+    feed = get_feed()
+    after = parse_cursor(request.headers.get('Last-Event-ID') or request.args.get('after'))
+    if after is None:
+        after = feed.last_id
+
+    def stream(after):
+        yield 'retry: 3000\n\n'
+        while True:
+            items = feed.wait(after, SSE_HEARTBEAT_SEC)
+            if not items:
+                yield ': keep-alive\n\n'
+                continue
+            for item in items:
+                yield f"id: {item['id']}\nevent: log\ndata: {json.dumps(item)}\n\n"
+            after = items[-1]['id']
+
+    return Response(stream_with_context(stream(after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/blacklist')
+def api_blacklist():
+    with readers.connection() as conn:
+        rows, next_cursor = fetch_vehicle_page(conn, 'blacklisted', parse_cursor(request.args.get('after')),
+                                               page_size(request.args.get('limit')))
+    return jsonify(items=[dict(row) for row in rows], next=next_cursor)
 
 @app.route('/blacklist', methods=['POST'])
 def blacklist():
-    plate_number = request.form['plate_number']
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO blacklisted (plate_number) VALUES (?)", (plate_number,))
-    conn.commit()
-    conn.close()
+    plate_number = request.form['plate_number'].strip().upper()
+    with writers.connection() as conn:
+        set_vehicle_status(conn, plate_number, 'blacklisted')
     return redirect(url_for('dashboard'))
 
 @app.route('/remove_blacklist/<plate_number>')
 def remove_blacklist(plate_number):
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM blacklisted WHERE plate_number = ?", (plate_number,))
-    conn.commit()
-    conn.close()
+    with writers.connection() as conn:
+        remove_from_blacklist(conn, plate_number.upper())
     return redirect(url_for('dashboard'))
 
 if __name__ == '__main__':
-    init_db()  # Ensures database tables exist
+    prepare_db()  # Ensures database tables and indexes exist
     app.run(debug=True)